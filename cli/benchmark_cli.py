@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+
+import argparse
+
+from constants import HNSW_EF_CONSTRUCTION, HNSW_M, PQ_SUBSPACES
+from lib.benchmark import (
+    analyzer_benchmark_command,
+    batch_benchmark_command,
+    bm25_benchmark_command,
+    build_benchmark_command,
+    cache_benchmark_command,
+    hnsw_benchmark_command,
+    ivfpq_benchmark_command,
+    precision_benchmark_command,
+    impact_benchmark_command,
+    memory_benchmark_command,
+    vector_benchmark_command,
+    wand_benchmark_command,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Search Benchmark CLI")
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+
+    bm25_parser = subparsers.add_parser(
+        "bm25", help="Measure BM25 query latency as the corpus grows"
+    )
+    bm25_parser.add_argument(
+        "--sizes", nargs="+", type=int, default=[500, 1000, 2000, 4000], help="Corpus sizes to index"
+    )
+    bm25_parser.add_argument(
+        "--queries", type=int, default=20, help="Number of sampled queries, default: 20"
+    )
+    bm25_parser.add_argument(
+        "--repeats", type=int, default=3, help="Timing repeats per size, default: 3"
+    )
+
+    wand_parser = subparsers.add_parser(
+        "wand", help="Compare the reference Block-Max WAND with exhaustive BM25 on long queries"
+    )
+    wand_parser.add_argument(
+        "--terms", nargs="+", type=int, default=[2, 4, 8, 16], help="Query lengths in terms"
+    )
+    wand_parser.add_argument(
+        "--limit", type=int, default=10, help="Top-k to retrieve, default: 10"
+    )
+    wand_parser.add_argument(
+        "--queries", type=int, default=20, help="Number of sampled queries, default: 20"
+    )
+    wand_parser.add_argument(
+        "--repeats", type=int, default=3, help="Timing repeats per query length, default: 3"
+    )
+
+    build_parser = subparsers.add_parser(
+        "build", help="Compare serial and multi-process inverted index builds"
+    )
+    build_parser.add_argument(
+        "--workers", nargs="+", type=int, default=[1, 2, 4], help="Worker counts to time"
+    )
+
+    analyzer_parser = subparsers.add_parser(
+        "analyzer", help="Measure text analysis throughput in tokens per second"
+    )
+    analyzer_parser.add_argument(
+        "--docs", type=int, default=1000, help="Number of movies to analyze, default: 1000"
+    )
+
+    batch_parser = subparsers.add_parser(
+        "batch", help="Compare looped bm25_search with batched bm25_search_many"
+    )
+    batch_parser.add_argument(
+        "--queries", type=int, default=500, help="Number of sampled queries, default: 500"
+    )
+    batch_parser.add_argument(
+        "--limit", type=int, default=10, help="Top-k per query, default: 10"
+    )
+
+    impact_parser = subparsers.add_parser(
+        "impact", help="Compare quantized impact-ordered search with exact term-at-a-time BM25"
+    )
+    impact_parser.add_argument(
+        "--terms", type=int, nargs="+", default=[1, 2, 4, 8], help="Query lengths to test"
+    )
+    impact_parser.add_argument(
+        "--limit", type=int, default=10, help="Top-k per query, default: 10"
+    )
+    impact_parser.add_argument(
+        "--queries", type=int, default=50, help="Queries per query length, default: 50"
+    )
+    impact_parser.add_argument(
+        "--repeats", type=int, default=3, help="Timing repeats per query, default: 3"
+    )
+
+    memory_parser = subparsers.add_parser(
+        "memory", help="Compare postings memory: Python sets and Counters vs binary formats"
+    )
+    memory_parser.add_argument(
+        "--queries", type=int, default=200, help="Queries for the latency column, default: 200"
+    )
+
+    cache_parser = subparsers.add_parser(
+        "cache", help="Replay a Zipf-skewed query stream with and without the result cache"
+    )
+    cache_parser.add_argument(
+        "--distinct", type=int, default=200, help="Distinct queries in the pool, default: 200"
+    )
+    cache_parser.add_argument(
+        "--stream", type=int, default=5000, help="Queries replayed, default: 5000"
+    )
+    cache_parser.add_argument(
+        "--skew", type=float, default=1.0, help="Zipf exponent of query popularity, default: 1.0"
+    )
+    cache_parser.add_argument(
+        "--limit", type=int, default=10, help="Top-k per query, default: 10"
+    )
+
+    vector_parser = subparsers.add_parser(
+        "vectors", help="Compare the looped cosine scan with matrix-product semantic scoring"
+    )
+    vector_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="Number of vectors"
+    )
+    vector_parser.add_argument(
+        "--dim", type=int, default=384, help="Embedding dimensions, default: 384"
+    )
+    vector_parser.add_argument(
+        "--limit", type=int, default=10, help="Top-k per query, default: 10"
+    )
+    vector_parser.add_argument(
+        "--queries", type=int, default=20, help="Queries per size, default: 20"
+    )
+    vector_parser.add_argument(
+        "--loop-queries", type=int, default=3, help="Queries timed with the Python loop, default: 3"
+    )
+
+    hnsw_parser = subparsers.add_parser(
+        "hnsw", help="Recall@k and latency of HNSW search against the exact scan"
+    )
+    hnsw_parser.add_argument(
+        "--ef", type=int, nargs="+", default=[16, 32, 64, 128], help="ef_search values to test"
+    )
+    hnsw_parser.add_argument(
+        "--vectors", type=int, default=20_000, help="Synthetic vectors to index, default: 20000"
+    )
+    hnsw_parser.add_argument(
+        "--dim", type=int, default=384, help="Synthetic vector dimensions, default: 384"
+    )
+    hnsw_parser.add_argument(
+        "--embeddings", type=str, help="Index this .npy file (e.g. cache/chunk_embeddings.npy) instead"
+    )
+    hnsw_parser.add_argument(
+        "--m", type=int, default=HNSW_M, help=f"Neighbours per node, default: {HNSW_M}"
+    )
+    hnsw_parser.add_argument(
+        "--ef-construction",
+        type=int,
+        default=HNSW_EF_CONSTRUCTION,
+        help=f"Candidate list size while building, default: {HNSW_EF_CONSTRUCTION}",
+    )
+    hnsw_parser.add_argument(
+        "--limit", type=int, default=10, help="k for recall@k, default: 10"
+    )
+    hnsw_parser.add_argument(
+        "--queries", type=int, default=100, help="Held-out query vectors, default: 100"
+    )
+
+    ivfpq_parser = subparsers.add_parser(
+        "ivfpq", help="Recall@k, latency and memory of IVF-PQ search against the exact scan"
+    )
+    ivfpq_parser.add_argument(
+        "--nprobe", type=int, nargs="+", default=[4, 8, 16, 32], help="nprobe values to test"
+    )
+    ivfpq_parser.add_argument(
+        "--rerank", type=int, nargs="+", default=[0, 100], help="Exact re-rank depths to test (0: none)"
+    )
+    ivfpq_parser.add_argument(
+        "--vectors", type=int, default=20_000, help="Synthetic vectors to index, default: 20000"
+    )
+    ivfpq_parser.add_argument(
+        "--dim", type=int, default=384, help="Synthetic vector dimensions, default: 384"
+    )
+    ivfpq_parser.add_argument(
+        "--embeddings", type=str, help="Index this .npy file (e.g. cache/chunk_embeddings.npy) instead"
+    )
+    ivfpq_parser.add_argument(
+        "--nlist", type=int, default=None, help="Coarse lists, default: about 4 * sqrt(vectors)"
+    )
+    ivfpq_parser.add_argument(
+        "--subspaces", type=int, default=PQ_SUBSPACES, help=f"PQ subspaces, default: {PQ_SUBSPACES}"
+    )
+    ivfpq_parser.add_argument(
+        "--limit", type=int, default=10, help="k for recall@k, default: 10"
+    )
+    ivfpq_parser.add_argument(
+        "--queries", type=int, default=100, help="Held-out query vectors, default: 100"
+    )
+
+    precision_parser = subparsers.add_parser(
+        "precision", help="Recall@k, latency and memory of int8 and binary scans with float32 rescoring"
+    )
+    precision_parser.add_argument(
+        "--rescore", type=int, nargs="+", default=[10, 100, 200, 500], help="Rescore depths to test"
+    )
+    precision_parser.add_argument(
+        "--vectors", type=int, default=100_000, help="Synthetic vectors to scan, default: 100000"
+    )
+    precision_parser.add_argument(
+        "--dim", type=int, default=384, help="Synthetic vector dimensions, default: 384"
+    )
+    precision_parser.add_argument(
+        "--embeddings", type=str, help="Scan this .npy file (e.g. cache/chunk_embeddings.npy) instead"
+    )
+    precision_parser.add_argument(
+        "--limit", type=int, default=10, help="k for recall@k, default: 10"
+    )
+    precision_parser.add_argument(
+        "--queries", type=int, default=100, help="Held-out query vectors, default: 100"
+    )
+
+    args = parser.parse_args()
+
+    match args.command:
+        case "bm25":
+            rows = bm25_benchmark_command(args.sizes, args.queries, args.repeats)
+            print(f"{'docs':>8} {'postings/q':>11} {'taat ms':>9} {'exhaustive ms':>14} {'max diff':>9}")
+            for row in rows:
+                exhaustive = f"{row['exhaustive_ms']:.3f}" if row["exhaustive_ms"] is not None else "-"
+                max_diff = f"{row['max_diff']:.3f}" if row["max_diff"] is not None else "-"
+                print(
+                    f"{row['docs']:>8} {row['postings_per_query']:>11.1f} "
+                    f"{row['taat_ms']:>9.3f} {exhaustive:>14} {max_diff:>9}"
+                )
+        case "wand":
+            rows = wand_benchmark_command(args.terms, args.limit, args.queries, args.repeats)
+            print(
+                f"{'terms':>6} {'taat ms':>9} {'bmw ms':>9} {'bmw/taat':>9} "
+                f"{'matched/q':>10} {'scored/q':>9} {'mismatches':>11}"
+            )
+            for row in rows:
+                ratio = row["bmw_ms"] / row["taat_ms"] if row["taat_ms"] else 0.0
+                print(
+                    f"{row['terms']:>6} {row['taat_ms']:>9.3f} {row['bmw_ms']:>9.3f} {ratio:>8.2f}x "
+                    f"{row['matched_per_query']:>10.1f} {row['evaluated_per_query']:>9.1f} {row['mismatches']:>11}"
+                )
+        case "build":
+            rows = build_benchmark_command(args.workers)
+            print(f"{'workers':>8} {'seconds':>9} {'speedup':>8} {'identical':>10}")
+            for row in rows:
+                print(
+                    f"{row['workers']:>8} {row['seconds']:>9.2f} {row['speedup']:>7.2f}x "
+                    f"{str(row['identical']):>10}"
+                )
+        case "analyzer":
+            rows = analyzer_benchmark_command(args.docs)
+            print(f"{'pipeline':<32} {'tokens/sec':>12} {'identical':>10}")
+            for row in rows:
+                print(f"{row['pipeline']:<32} {row['tokens_per_sec']:>12.0f} {str(row['identical']):>10}")
+        case "batch":
+            row = batch_benchmark_command(args.queries, args.limit)
+            print(f"Queries:             {row['queries']}")
+            print(f"Impact matrix build: {row['matrix_seconds']:.3f}s")
+            print(f"Looped bm25_search:  {row['loop_qps']:.1f} queries/sec")
+            print(f"bm25_search_many:    {row['batch_qps']:.1f} queries/sec")
+            print(f"Identical results:   {row['identical']}")
+        case "impact":
+            rows = impact_benchmark_command(args.terms, args.limit, args.queries, args.repeats)
+            print(
+                f"{'terms':>6} {'taat ms':>9} {'impact ms':>10} {'impact/taat':>12} "
+                f"{'overlap@k':>10} {'postings':>9} {'early stop':>11} {'within bound':>13}"
+            )
+            for row in rows:
+                ratio = row["impact_ms"] / row["taat_ms"] if row["taat_ms"] else 0.0
+                print(
+                    f"{row['terms']:>6} {row['taat_ms']:>9.3f} {row['impact_ms']:>10.3f} {ratio:>11.2f}x "
+                    f"{row['overlap']:>10.3f} {row['postings_processed']:>8.1%} {row['early_stop_rate']:>10.1%} "
+                    f"{str(row['within_bound']):>13}"
+                )
+        case "memory":
+            rows = memory_benchmark_command(args.queries)
+            print(f"{'postings representation':<28} {'bytes':>12} {'bytes/posting':>14} {'taat ms':>9}")
+            for row in rows:
+                query_ms = f"{row['query_ms']:.3f}" if row["query_ms"] is not None else "-"
+                print(
+                    f"{row['representation']:<28} {row['bytes']:>12,} "
+                    f"{row['bytes_per_posting']:>14.2f} {query_ms:>9}"
+                )
+        case "cache":
+            row = cache_benchmark_command(args.distinct, args.stream, args.skew, args.limit)
+            print(f"Queries:             {row['queries']} ({row['distinct']} distinct)")
+            print(f"Uncached:            {row['uncached_qps']:.1f} queries/sec")
+            print(f"Cached:              {row['cached_qps']:.1f} queries/sec")
+            print(f"Speedup:             {row['cached_qps'] / row['uncached_qps']:.2f}x")
+            print(f"Hit rate:            {row['hit_rate']:.1%} ({row['hits']} hits, {row['misses']} misses)")
+            print(f"Evictions:           {row['evictions']}")
+            print(f"Identical results:   {row['identical']}")
+            print(f"After rebuild:       {row['invalidations']} invalidation(s), {row['size_after_rebuild']} entries")
+            print(f"Rebuild = fresh:     {row['rebuild_matches_fresh']}")
+        case "vectors":
+            rows = vector_benchmark_command(args.sizes, args.dim, args.limit, args.queries, args.loop_queries)
+            print(
+                f"{'vectors':>9} {'loop ms':>10} {'matmul ms':>10} {'batch ms':>9} "
+                f"{'speedup':>8} {'identical':>10}"
+            )
+            for row in rows:
+                speedup = row["loop_ms"] / row["matmul_ms"] if row["matmul_ms"] else 0.0
+                print(
+                    f"{row['vectors']:>9} {row['loop_ms']:>10.2f} {row['matmul_ms']:>10.3f} "
+                    f"{row['batch_ms']:>9.3f} {speedup:>7.0f}x {str(row['identical']):>10}"
+                )
+        case "hnsw":
+            report = hnsw_benchmark_command(
+                args.ef, args.vectors, args.dim, args.embeddings, args.m, args.ef_construction, args.limit, args.queries
+            )
+            print(f"Vectors:    {report['vectors']}")
+            print(f"Build:      {report['build_seconds']:.1f}s")
+            print(f"Exact scan: {report['exact_ms']:.3f} ms/query")
+            print(f"{'ef_search':>10} {f'recall@{args.limit}':>10} {'hnsw ms':>9} {'speedup':>8}")
+            for row in report["rows"]:
+                speedup = report["exact_ms"] / row["hnsw_ms"] if row["hnsw_ms"] else 0.0
+                print(f"{row['ef_search']:>10} {row['recall']:>10.3f} {row['hnsw_ms']:>9.3f} {speedup:>7.2f}x")
+        case "ivfpq":
+            report = ivfpq_benchmark_command(
+                args.nprobe,
+                args.rerank,
+                args.vectors,
+                args.dim,
+                args.embeddings,
+                args.nlist,
+                args.subspaces,
+                args.limit,
+                args.queries,
+            )
+            memory = report["memory"]
+            print(f"Vectors:    {memory['vectors']} in {report['nlist']} lists")
+            print(f"Train:      {report['train_seconds']:.1f}s")
+            print(
+                f"Memory:     {memory['bytes_per_vector']} B/vector "
+                f"({memory['amortized_bytes_per_vector']:.1f} with centroids and codebooks) "
+                f"vs {memory['float32_bytes_per_vector']} B float32"
+            )
+            print(f"Exact scan: {report['exact_ms']:.3f} ms/query")
+            print(f"{'nprobe':>7} {'rerank':>7} {f'recall@{args.limit}':>10} {'ivfpq ms':>9} {'speedup':>8}")
+            for row in report["rows"]:
+                speedup = report["exact_ms"] / row["ivfpq_ms"] if row["ivfpq_ms"] else 0.0
+                print(
+                    f"{row['nprobe']:>7} {row['rerank']:>7} {row['recall']:>10.3f} "
+                    f"{row['ivfpq_ms']:>9.3f} {speedup:>7.2f}x"
+                )
+        case "precision":
+            rows = precision_benchmark_command(
+                args.rescore, args.vectors, args.dim, args.embeddings, args.limit, args.queries
+            )
+            print(f"{'precision':>9} {'rescore':>8} {f'recall@{args.limit}':>10} {'ms':>8} {'B/vector':>9}")
+            for row in rows:
+                print(
+                    f"{row['precision']:>9} {row['rescore']:>8} {row['recall']:>10.3f} "
+                    f"{row['ms']:>8.3f} {row['bytes_per_vector']:>9.1f}"
+                )
+        case _:
+            parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
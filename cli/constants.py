@@ -7,6 +7,9 @@ SEARCH_MULTIPLIER = 5
 
 BM25_K1 = 1.5
 BM25_B = 0.75
+BM25_BLOCK_SIZE = 64
+BM25_BATCH_MAX_CELLS = 50_000_000
+IMPACT_LEVELS = 255
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(__file__))
 DATA_PATH = os.path.join(PROJECT_ROOT, "data", "movies.json")
@@ -14,12 +17,50 @@ GOLDEN_DATASET_PATH = os.path.join(PROJECT_ROOT, "data", "golden_dataset.json")
 STOPWORDS_PATH = os.path.join(PROJECT_ROOT, "data", "stopwords.txt")
 
 CACHE_PATH = os.path.join(PROJECT_ROOT, "cache")
-INDEX_CACHE_PATH = os.path.join(CACHE_PATH, "index.pkl")
-DOCMAP_CACHE_PATH = os.path.join(CACHE_PATH, "docmap.pkl")
-TFREQ_CACHE_PATH = os.path.join(CACHE_PATH, "term_frequencies.pkl")
-DOC_LENGTHS_CACHE_PATH = os.path.join(CACHE_PATH, "doc_lengths.pkl")
+INDEX_CACHE_PATH = os.path.join(CACHE_PATH, "index.json")
+INDEX_SEGMENTS_PATH = os.path.join(CACHE_PATH, "segments")
+IMPACTS_CACHE_PATH = os.path.join(CACHE_PATH, "impacts.bin")
+INDEX_MAX_SEGMENTS = 10
+INDEX_POSITIONS = True
+INDEX_FIELDS = ("title", "description")
+BM25F_WEIGHTS = {"title": 2.0, "description": 1.0}
+BM25F_B = {"title": 0.75, "description": 0.75}
+INDEX_COMPRESS_POSTINGS = False
+POSTINGS_BLOCK_SIZE = 128
+PROXIMITY_WINDOW = 10
+AUTOCOMPLETE_LIMIT = 10
+FUZZY_MAX_EXPANSIONS = 50
+BUILD_SHARDS_PER_WORKER = 4
+DOCSTORE_CACHE_PATH = os.path.join(CACHE_PATH, "docstore.bin")
+MOVIE_DOCSTORE_CACHE_PATH = os.path.join(CACHE_PATH, "movie_docstore.bin")
 MOVIE_EMBEDDINGS_CACHE_PATH = os.path.join(CACHE_PATH, "movie_embeddings.npy")
 CHUNK_EMBEDDINGS_CACHE_PATH = os.path.join(CACHE_PATH, "chunk_embeddings.npy")
-CHUNK_METADATA_CACHE_PATH = os.path.join(CACHE_PATH, "chunk_metadata.json")
+CHUNK_METADATA_CACHE_PATH = os.path.join(CACHE_PATH, "chunk_metadata.npz")
+CHUNK_MAX_SENTENCES = 4
+CHUNK_OVERLAP_SENTENCES = 1
+MOVIE_HNSW_CACHE_PATH = os.path.join(CACHE_PATH, "movie_hnsw.npz")
+CHUNK_HNSW_CACHE_PATH = os.path.join(CACHE_PATH, "chunk_hnsw.npz")
+VECTOR_INDEXES = ("exact", "hnsw")
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 100
+HNSW_EF_SEARCH = 64
+CHUNK_IVFPQ_CACHE_PATH = os.path.join(CACHE_PATH, "chunk_ivfpq.npz")
+CHUNK_VECTOR_INDEXES = VECTOR_INDEXES + ("ivfpq",)
+PQ_SUBSPACES = 48
+IVF_NPROBE = 16
+IVF_RERANK = 100
+IVF_TRAIN_SAMPLE = 50_000
+EMBEDDING_PRECISIONS = ("float32", "int8", "binary")
+QUANTIZED_RESCORE = 200
+SEMANTIC_BATCH_MAX_CELLS = 50_000_000
+EMBED_BUCKET_SIZE = 1024
+EMBED_TOKEN_BUDGET = 16384
+EMBED_MAX_BATCH_SIZE = 256
 
 DEFAULT_SEARCH_LIMIT = 5
+STEM_CACHE_SIZE = 65536
+RESULT_CACHE_SIZE = 1024
+RESULT_CACHE_TTL = 300.0
+QUERY_EMBEDDING_CACHE_SIZE = 4096
+QUERY_EMBEDDING_CACHE_PATH = os.path.join(CACHE_PATH, "query_embeddings")
+QUERY_EMBEDDING_DISK_CACHE_SIZE = 20_000
@@ -5,6 +5,7 @@ import os
 import time
 from dotenv import load_dotenv
 from lib.hybrid_search import normalize_command, weighted_search_command, rrf_search_command
+from lib.query_embedding_cache import shared_query_cache
 from google import genai
 from search_enhancement import enhance_query
 from reranking import rerank
@@ -13,6 +14,11 @@ from lib.evaluation import llm_judge_evaluate
 def main() -> None:
 
     parser = argparse.ArgumentParser(description="Hybrid Search CLI")
+    parser.add_argument(
+        "--disk-query-cache",
+        action="store_true",
+        help="Also cache query embeddings on disk, shared across runs",
+    )
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
     normalize_parser = subparsers.add_parser(
@@ -34,6 +40,9 @@ def main() -> None:
     weighted_search_parser.add_argument(
         "--limit", type=int, required=False, default=5, help="The limit to the results"
     )
+    weighted_search_parser.add_argument(
+        "--filter", type=str, required=False, help="Boolean query (AND / OR / NOT) results must match"
+    )
 
     rrf_search_parser = subparsers.add_parser(
         "rrf-search", help="Get the search results with RRF ranking search"
@@ -60,6 +69,9 @@ def main() -> None:
         required=False,
         choices=["individual", "batch", "cross_encoder"]
     )
+    rrf_search_parser.add_argument(
+        "--filter", type=str, required=False, help="Boolean query (AND / OR / NOT) results must match"
+    )
     rrf_search_parser.add_argument(
         "--evaluate",
         help="Evaluate the search results",
@@ -69,6 +81,8 @@ def main() -> None:
 
 
     args = parser.parse_args()
+    if args.disk_query_cache:
+        shared_query_cache.enable_disk()
 
     match args.command:
         case "normalize":
@@ -76,14 +90,14 @@ def main() -> None:
             for score in normalized_scores:
                 print(f"* {score:.4f}")
         case "weighted-search":
-            ws = weighted_search_command(args.query, args.alpha, args.limit)
+            ws = weighted_search_command(args.query, args.alpha, args.limit, args.filter)
             for i, res in enumerate(ws, 1):
                 print(f"{i}. {res['title']}")
                 print(f"\tHybrid Score: {res['metadata']['hybrid_score']:.4f}")
                 print(f"\tBM25: {res['metadata']['kw_score']:.4f}, Semantic: {res['metadata']['sm_score']:.4f}")
                 print(f"\t{res['document'][:100]}...")
         case "rrf-search":
-            result = rrf_search_command(args.query, args.enhance, args.rerank_method, args.k, args.limit)
+            result = rrf_search_command(args.query, args.enhance, args.rerank_method, args.k, args.limit, args.filter)
             if args.enhance:
                 print(f"Enhanced query ({args.enhance}): '{args.query}' -> '{result["enhanced_query"]}'\n")
 
@@ -3,17 +3,40 @@
 import argparse
 
 from lib.inverted_index import (
+    add_command,
     bm25_idf_command,
+    boolean_search_command,
     bm25_search_command,
     bm25_tf_command,
+    bm25f_search_command,
     build_command,
+    complete_command,
+    delete_command,
+    fuzzy_search_command,
     idf_command,
+    merge_command,
+    phrase_search_command,
+    proximity_search_command,
     search_command,
     tf_command,
     tfidf_command,
     InvertedIndex
 )
-from constants import BM25_B, BM25_K1
+from constants import (
+    AUTOCOMPLETE_LIMIT,
+    BM25_B,
+    BM25_K1,
+    BM25F_WEIGHTS,
+    PROXIMITY_WINDOW,
+)
+
+
+def parse_field_weight(value: str) -> tuple[str, float]:
+    field, _, weight = value.partition("=")
+    try:
+        return field, float(weight)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected FIELD=WEIGHT, got '{value}'")
 
 
 def main() -> None:
@@ -23,6 +46,19 @@ def main() -> None:
     search_parser = subparsers.add_parser("search", help="Search movies using BM25")
     search_parser.add_argument("query", type=str, help="Search query")
     build_parser = subparsers.add_parser("build", help="Build the movies data")
+    build_parser.add_argument(
+        "--workers", type=int, default=1, help="Worker processes that each index a shard of the movies, default: 1"
+    )
+    build_parser.add_argument(
+        "--no-positions",
+        action="store_true",
+        help="Skip token positions (smaller index, no phrase or proximity search)",
+    )
+    build_parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="Store postings delta-encoded and bit-packed in blocks",
+    )
     tf_parser = subparsers.add_parser("tf", help="Get the term frequency of a string")
     tf_parser.add_argument(
         "doc_id", type=int, help="Document ID to search for term frequency"
@@ -70,6 +106,69 @@ def main() -> None:
         "bm25search", help="Search movies using full BM25 scoring"
     )
     bm25search_parser.add_argument("query", type=str, help="Search query")
+    bm25search_parser.add_argument(
+        "--filter",
+        type=str,
+        help='Boolean query results must match, e.g. \'batman AND NOT "lego"\'',
+    )
+    bm25fsearch_parser = subparsers.add_parser(
+        "bm25fsearch", help="Search movies using field-weighted BM25F over title and description"
+    )
+    bm25fsearch_parser.add_argument("query", type=str, help="Search query")
+    bm25fsearch_parser.add_argument(
+        "--weight",
+        type=parse_field_weight,
+        action="append",
+        default=[],
+        metavar="FIELD=WEIGHT",
+        help=f"Field weight, repeatable, default: {BM25F_WEIGHTS}",
+    )
+    boolean_parser = subparsers.add_parser(
+        "boolean", help="Boolean AND / OR / NOT search, ranked by BM25"
+    )
+    boolean_parser.add_argument(
+        "query", type=str, help='Boolean query, e.g. \'(heist OR robbery) AND "new york" NOT comedy\''
+    )
+
+    add_parser = subparsers.add_parser(
+        "add", help="Add or update movies from a JSON file without a full rebuild"
+    )
+    add_parser.add_argument(
+        "path", type=str, help="JSON file with a movie, a list of movies or {\"movies\": [...]}"
+    )
+    delete_parser = subparsers.add_parser("delete", help="Delete movies from the index")
+    delete_parser.add_argument("doc_ids", type=int, nargs="+", help="Document IDs to delete")
+    subparsers.add_parser("merge", help="Compact index segments and purge deleted movies")
+    phrase_parser = subparsers.add_parser(
+        "phrase", help="BM25 search restricted to movies containing the exact phrase"
+    )
+    phrase_parser.add_argument("phrase", type=str, help="Phrase to match")
+    near_parser = subparsers.add_parser(
+        "near", help="BM25 search restricted to movies with all terms close together"
+    )
+    near_parser.add_argument("query", type=str, help="Search query")
+    near_parser.add_argument(
+        "--window",
+        type=int,
+        default=PROXIMITY_WINDOW,
+        help=f"Maximum span in token positions, default: {PROXIMITY_WINDOW}",
+    )
+    fuzzy_parser = subparsers.add_parser(
+        "fuzzysearch", help="BM25 search tolerant of typos in the query terms"
+    )
+    fuzzy_parser.add_argument("query", type=str, help="Search query")
+    fuzzy_parser.add_argument(
+        "--max-edits",
+        type=int,
+        help="Edit distance allowed per term, default: 0, 1 or 2 by term length",
+    )
+    complete_parser = subparsers.add_parser(
+        "complete", help="Complete a prefix to indexed terms, most frequent first"
+    )
+    complete_parser.add_argument("prefix", type=str, help="Prefix to complete")
+    complete_parser.add_argument(
+        "--limit", type=int, default=AUTOCOMPLETE_LIMIT, help=f"Completions to show, default: {AUTOCOMPLETE_LIMIT}"
+    )
     args = parser.parse_args()
 
     match args.command:
@@ -82,7 +181,7 @@ def main() -> None:
             except Exception as e:
                 print({e})
         case "build":
-            build_command()
+            build_command(args.workers, not args.no_positions, args.compress)
         case "tf":
             try:
                 tf = tf_command(args.doc_id, args.term)
@@ -105,8 +204,35 @@ def main() -> None:
             print(
                 f"BM25 TF score of '{args.term}' in document '{args.doc_id}': {bm25_tf:.2f}"
             )
+        case "add":
+            count = add_command(args.path)
+            print(f"Indexed {count} movies into a new segment")
+        case "delete":
+            deleted = delete_command(args.doc_ids)
+            print(f"Deleted {deleted} movies")
+        case "merge":
+            num_docs = merge_command()
+            print(f"Merged index into one segment with {num_docs} movies")
+        case "bm25fsearch":
+            for i, res in enumerate(bm25f_search_command(args.query, dict(args.weight)), 1):
+                print(f"{i}. ({res['id']}) {res['title']} - Score: {res['score']:.2f}")
+        case "boolean":
+            for i, res in enumerate(boolean_search_command(args.query), 1):
+                print(f"{i}. ({res['id']}) {res['title']} - Score: {res['score']:.2f}")
+        case "phrase":
+            for i, res in enumerate(phrase_search_command(args.phrase), 1):
+                print(f"{i}. ({res['id']}) {res['title']} - Score: {res['score']:.2f}")
+        case "near":
+            for i, res in enumerate(proximity_search_command(args.query, args.window), 1):
+                print(f"{i}. ({res['id']}) {res['title']} - Score: {res['score']:.2f}")
+        case "fuzzysearch":
+            for i, res in enumerate(fuzzy_search_command(args.query, args.max_edits), 1):
+                print(f"{i}. ({res['id']}) {res['title']} - Score: {res['score']:.2f}")
+        case "complete":
+            for term, doc_freq in complete_command(args.prefix, args.limit):
+                print(f"{term} ({doc_freq} movies)")
         case "bm25search":
-            bm25_search_command(args.query)
+            bm25_search_command(args.query, args.filter)
         case _:
             parser.print_help()
 
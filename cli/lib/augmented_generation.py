@@ -3,8 +3,8 @@ import os
 from constants import DEFAULT_K, DEFAULT_SEARCH_LIMIT, SEARCH_MULTIPLIER
 from dotenv import load_dotenv
 from google import genai
+from lib.doc_store import load_stored_movies
 from lib.hybrid_search import HybridSearch
-from search_utils import load_movies
 
 load_dotenv()
 api_key = os.getenv("GEMINI_API_KEY")
@@ -13,7 +13,7 @@ model = "gemini-2.0-flash"
 
 
 def rag_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT):
-    documents = load_movies()
+    documents = load_stored_movies()
     hs = HybridSearch(documents)
     results = hs.rrf_search(query, DEFAULT_K, limit * SEARCH_MULTIPLIER)
     if not results:
@@ -44,7 +44,7 @@ def rag_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT):
 
 
 def summarize_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT):
-    documents = load_movies()
+    documents = load_stored_movies()
     hs = HybridSearch(documents)
     results = hs.rrf_search(query, DEFAULT_K, limit * SEARCH_MULTIPLIER)
     if not results:
@@ -74,7 +74,7 @@ def summarize_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT):
     return {"query": query, "results": results[:limit], "error": None, "answer": text}
 
 def citations_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT):
-    documents = load_movies()
+    documents = load_stored_movies()
     hs = HybridSearch(documents)
     results = hs.rrf_search(query, DEFAULT_K, limit * SEARCH_MULTIPLIER)
     if not results:
@@ -114,7 +114,7 @@ Answer:"""
 
 
 def question_command(question: str, limit: int = DEFAULT_SEARCH_LIMIT):
-    documents = load_movies()
+    documents = load_stored_movies()
     hs = HybridSearch(documents)
     results = hs.rrf_search(question, DEFAULT_K, limit * SEARCH_MULTIPLIER)
     if not results:
@@ -0,0 +1,541 @@
+import gc
+import heapq
+import math
+import random
+import string
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from statistics import median
+from typing import Any, Callable
+
+import numpy as np
+
+from .hnsw import HNSWIndex
+from .ivfpq import IVFPQIndex
+from .inverted_index import InvertedIndex, analyze_shard
+from .quantization import quantize, quantized_top_k
+from .result_cache import ResultCache
+from .wand import block_max_wand
+
+from constants import BM25_B, BM25_K1, HNSW_EF_CONSTRUCTION, HNSW_M, PQ_SUBSPACES, SCORE_PRECISION
+from nltk.stem import PorterStemmer
+from preprocessing import Analyzer, preprocess_text
+from search_utils import load_movies, load_stopwords
+from vector_utils import cosine_similarity, cosine_top_k, cosine_top_k_many, normalize_rows
+
+
+def uncached_index() -> InvertedIndex:
+    """An index with result caching off, so repeated timings measure search itself."""
+    idx = InvertedIndex()
+    idx.result_cache = ResultCache(max_size=0)
+    return idx
+
+
+def sample_queries(
+    documents: list[dict[Any, Any]], count: int = 20, terms: int = 3, seed: int = 42
+) -> list[str]:
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        words = []
+        for _ in range(terms):
+            doc = rng.choice(documents)
+            text = f"{doc['title']} {doc['description']}".split()
+            words.append(rng.choice(text))
+        queries.append(" ".join(words))
+    return queries
+
+
+def time_queries(fn: Callable[[str], Any], queries: list[str], repeats: int = 3) -> float:
+    """Median latency of `fn` over `queries`, in milliseconds per query."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for query in queries:
+            fn(query)
+        timings.append((time.perf_counter() - start) / len(queries))
+    return median(timings) * 1000
+
+
+def exhaustive_bm25_scores(idx: InvertedIndex, query: str) -> dict[int, float]:
+    """Reference scorer: every document against every query token, no cached stats."""
+    tokens = preprocess_text(query)
+    doc_count = len(idx.docmap)
+    avg_doc_length = sum(idx.doc_lengths.values()) / doc_count
+    scores = {}
+    for doc_id in idx.docmap:
+        score = 0.0
+        for token in tokens:
+            term_doc_count = len(idx.index.get(token, ()))
+            idf = math.log((doc_count - term_doc_count + 0.5) / (term_doc_count + 0.5) + 1)
+            tf = idx.term_frequencies[doc_id][token]
+            length_norm = 1 - BM25_B + (BM25_B * (idx.doc_lengths[doc_id] / avg_doc_length))
+            score += (tf * (BM25_K1 + 1)) / (tf + BM25_K1 * length_norm) * idf
+        if score > 0:
+            scores[doc_id] = score
+    return scores
+
+
+def bm25_benchmark_command(
+    sizes: list[int], query_count: int = 20, repeats: int = 3, exhaustive_limit: int = 2000
+) -> list[dict[str, Any]]:
+    movies = load_movies()
+    queries = sample_queries(movies, query_count)
+    rows = []
+    for size in sizes:
+        documents = movies[:size]
+        idx = uncached_index()
+        idx.build(documents)
+
+        postings = 0
+        for query in queries:
+            for token in preprocess_text(query):
+                postings += len(idx.index.get(token, ()))
+
+        row = {
+            "docs": len(documents),
+            "postings_per_query": postings / len(queries),
+            "taat_ms": time_queries(lambda q: idx.bm25_search(q, 10), queries, repeats),
+            "exhaustive_ms": None,
+            "max_diff": None,
+        }
+        if len(documents) <= exhaustive_limit:
+            row["exhaustive_ms"] = time_queries(
+                lambda q: exhaustive_bm25_scores(idx, q), queries, 1
+            )
+            max_diff = 0.0
+            for query in queries:
+                expected = exhaustive_bm25_scores(idx, query)
+                actual = idx.bm25_search(query, len(expected))
+                for res in actual:
+                    max_diff = max(max_diff, abs(res["score"] - round(expected[res["id"]], 3)))
+            row["max_diff"] = max_diff
+        rows.append(row)
+    return rows
+
+
+def wand_benchmark_command(
+    term_counts: list[int], limit: int = 10, query_count: int = 20, repeats: int = 3
+) -> list[dict[str, Any]]:
+    movies = load_movies()
+    idx = uncached_index()
+    idx.build(movies)
+    rows = []
+    for terms in term_counts:
+        queries = sample_queries(movies, query_count, terms)
+        matched = 0
+        evaluated = 0
+        mismatches = 0
+        for query in queries:
+            tokens = preprocess_text(query)
+            doc_ids = set()
+            for token in tokens:
+                doc_ids.update(idx.index.get(token, ()))
+            matched += len(doc_ids)
+            stats = {}
+            bmw = block_max_wand([idx.get_posting_list(token) for token in tokens], limit, stats)
+            evaluated += stats["evaluated"]
+            bmw = [(int(idx.reader.doc_ids[ordinal]), round(score, SCORE_PRECISION)) for ordinal, score in bmw]
+            if bmw != [(res["id"], res["score"]) for res in idx.bm25_search(query, limit)]:
+                mismatches += 1
+
+        rows.append({
+            "terms": terms,
+            "limit": limit,
+            "taat_ms": time_queries(lambda q: idx.bm25_search(q, limit), queries, repeats),
+            "bmw_ms": time_queries(
+                lambda q: block_max_wand([idx.get_posting_list(token) for token in preprocess_text(q)], limit),
+                queries,
+                repeats,
+            ),
+            "matched_per_query": matched / len(queries),
+            "evaluated_per_query": evaluated / len(queries),
+            "mismatches": mismatches,
+        })
+    return rows
+
+
+def build_benchmark_command(worker_counts: list[int]) -> list[dict[str, Any]]:
+    movies = load_movies()
+    rows = []
+    serial_index = None
+    serial_seconds = None
+    for workers in [1] + [w for w in worker_counts if w != 1]:
+        idx = uncached_index()
+        start = time.perf_counter()
+        idx.build(movies, workers)
+        seconds = time.perf_counter() - start
+        if serial_index is None:
+            serial_index, serial_seconds = idx.reader.buffer, seconds
+        rows.append({
+            "workers": workers,
+            "seconds": seconds,
+            "speedup": serial_seconds / seconds,
+            "identical": idx.reader.buffer == serial_index,
+        })
+    return rows
+
+
+def legacy_preprocess_text(s: str) -> list[str]:
+    """The original pipeline: stopwords reread and a new stemmer on every call."""
+    text = s.lower()
+    translator = str.maketrans("", "", string.punctuation)
+    raw_tokens = list(filter(lambda x: x != "", text.translate(translator).split()))
+    stopwords = load_stopwords()
+    rsw_tokens = list(filter(lambda x: x not in stopwords, raw_tokens))
+    stemmer = PorterStemmer()
+    return [stemmer.stem(token) for token in rsw_tokens]
+
+
+def analyzer_benchmark_command(doc_count: int = 1000) -> list[dict[str, Any]]:
+    texts = [f"{movie['title']} {movie['description']}" for movie in load_movies()[:doc_count]]
+    token_count = sum(len(text.split()) for text in texts)
+    expected = [legacy_preprocess_text(text) for text in texts]
+
+    def measure(name: str, fn: Callable[[], list[list[str]]]) -> dict[str, Any]:
+        start = time.perf_counter()
+        analyzed = fn()
+        seconds = time.perf_counter() - start
+        return {
+            "pipeline": name,
+            "tokens_per_sec": token_count / seconds,
+            "identical": analyzed == expected,
+        }
+
+    analyzer = Analyzer()
+    return [
+        measure("legacy preprocess_text", lambda: [legacy_preprocess_text(t) for t in texts]),
+        measure("Analyzer.analyze (cold cache)", lambda: [analyzer.analyze(t) for t in texts]),
+        measure("Analyzer.analyze (warm cache)", lambda: [analyzer.analyze(t) for t in texts]),
+        measure("Analyzer.analyze_many", lambda: analyzer.analyze_many(texts)),
+    ]
+
+
+def batch_benchmark_command(query_count: int = 500, limit: int = 10) -> dict[str, Any]:
+    movies = load_movies()
+    idx = uncached_index()
+    idx.build(movies)
+    queries = sample_queries(movies, query_count)
+
+    start = time.perf_counter()
+    idx.impact_matrix()
+    matrix_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    looped = [idx.bm25_search(query, limit) for query in queries]
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = idx.bm25_search_many(queries, limit)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        "queries": len(queries),
+        "matrix_seconds": matrix_seconds,
+        "loop_qps": len(queries) / loop_seconds,
+        "batch_qps": len(queries) / batch_seconds,
+        "identical": looped == batched,
+    }
+
+
+def impact_benchmark_command(
+    term_counts: list[int], limit: int = 10, query_count: int = 50, repeats: int = 3
+) -> list[dict[str, Any]]:
+    movies = load_movies()
+    idx = uncached_index()
+    idx.build(movies)
+    impacts = idx.impact_index()
+    num_docs = len(idx.reader.doc_ids)
+    rows = []
+    for terms in term_counts:
+        queries = sample_queries(movies, query_count, terms)
+        overlap = 0.0
+        processed = 0.0
+        stopped_early = 0
+        within_bound = True
+        for query in queries:
+            exact = {res["id"]: res["score"] for res in idx.bm25_search(query, num_docs)}
+            top = dict(list(exact.items())[:limit])
+            stats = {}
+            approx = {
+                int(idx.reader.doc_ids[ordinal]): score
+                for ordinal, score in impacts.search(preprocess_text(query), limit, num_docs, stats)
+            }
+            overlap += len(top.keys() & approx.keys()) / len(top) if top else 1.0
+            processed += stats["postings"] / stats["total_postings"] if stats["total_postings"] else 1.0
+            stopped_early += stats["stopped_early"]
+            # Quantized scores must stay within the index's stated error bound of
+            # BM25, give or take the rounding of both formatted scores.
+            errors = [abs(score - exact[doc_id]) for doc_id, score in approx.items()]
+            within_bound &= max(errors, default=0.0) <= stats["error_bound"] + 10**-SCORE_PRECISION
+
+        rows.append({
+            "terms": terms,
+            "limit": limit,
+            "taat_ms": time_queries(lambda q: idx.bm25_search(q, limit), queries, repeats),
+            "impact_ms": time_queries(
+                lambda q: impacts.search(preprocess_text(q), limit, num_docs), queries, repeats
+            ),
+            "overlap": overlap / len(queries),
+            "postings_processed": processed / len(queries),
+            "early_stop_rate": stopped_early / len(queries),
+            "within_bound": within_bound,
+        })
+    return rows
+
+
+def memory_benchmark_command(query_count: int = 200) -> list[dict[str, Any]]:
+    """Bytes per posting of the in-memory build structures vs the binary formats."""
+    movies = load_movies()
+    analyzed = analyze_shard(movies)
+
+    # Same structures InvertedIndex.build fills, measured in isolation.
+    tracemalloc.start()
+    index: dict[str, set[int]] = defaultdict(set)
+    term_frequencies: dict[int, Counter] = {}
+    for doc_id, _, counts, *_ in analyzed:
+        for token in counts:
+            index[token].add(doc_id)
+        term_frequencies[doc_id] = Counter(counts)
+    python_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    num_postings = sum(len(doc_ids) for doc_ids in index.values())
+
+    queries = sample_queries(movies, query_count)
+    rows = [{
+        "representation": "dict[str, set] + Counters",
+        "bytes": python_bytes,
+        "bytes_per_posting": python_bytes / num_postings,
+        "query_ms": None,
+    }]
+    for label, compress in (("int32 arrays", False), ("delta + bit-packed blocks", True)):
+        idx = uncached_index()
+        idx.build(movies, positions=False, compress=compress)
+        nbytes = idx.reader.postings_nbytes()
+        rows.append({
+            "representation": label,
+            "bytes": nbytes,
+            "bytes_per_posting": nbytes / num_postings,
+            "query_ms": time_queries(lambda q: idx.bm25_search(q, 10), queries),
+        })
+    return rows
+
+
+def cache_benchmark_command(
+    distinct: int = 200, stream: int = 5000, skew: float = 1.0, limit: int = 10
+) -> dict[str, Any]:
+    """Replay a Zipf-skewed query stream with and without the result cache."""
+    movies = load_movies()
+    idx = InvertedIndex()
+    idx.build(movies)
+    pool = sample_queries(movies, distinct)
+    rng = random.Random(42)
+    weights = [1 / rank**skew for rank in range(1, len(pool) + 1)]
+    queries = rng.choices(pool, weights, k=stream)
+
+    cache = idx.result_cache
+    idx.result_cache = ResultCache(max_size=0)
+    start = time.perf_counter()
+    uncached = [idx.bm25_search(query, limit) for query in queries]
+    uncached_seconds = time.perf_counter() - start
+
+    idx.result_cache = cache
+    start = time.perf_counter()
+    cached = [idx.bm25_search(query, limit) for query in queries]
+    cached_seconds = time.perf_counter() - start
+    info = cache.info()
+
+    # A rebuild changes the index version, so the next lookup starts cold
+    # and must answer exactly as an index built from scratch over the new corpus.
+    rebuilt_movies = movies[: len(movies) // 2]
+    idx.build(rebuilt_movies)
+    idx.bm25_search(queries[0], limit)
+    size_after_rebuild = len(cache.entries)
+    fresh = uncached_index()
+    fresh.build(rebuilt_movies)
+    rebuild_matches_fresh = all(idx.bm25_search(query, limit) == fresh.bm25_search(query, limit) for query in pool)
+
+    return {
+        **info,
+        "queries": len(queries),
+        "distinct": len(set(queries)),
+        "uncached_qps": len(queries) / uncached_seconds,
+        "cached_qps": len(queries) / cached_seconds,
+        "identical": uncached == cached,
+        "invalidations": cache.invalidations,
+        "size_after_rebuild": size_after_rebuild,
+        "rebuild_matches_fresh": rebuild_matches_fresh,
+    }
+
+
+def vector_benchmark_command(
+    sizes: list[int], dim: int = 384, limit: int = 10, query_count: int = 20, loop_queries: int = 3
+) -> list[dict[str, Any]]:
+    """Per-query latency of the cosine scan: Python loop vs one matrix-vector product vs batched.
+
+    Vectors are random, unit-length float32 rows, so any size can be tried
+    without a model. The loop is timed over `loop_queries` queries only.
+    """
+    rng = np.random.default_rng(42)
+    rows = []
+    for size in sizes:
+        matrix = normalize_rows(rng.standard_normal((size, dim), dtype=np.float32))
+        queries = rng.standard_normal((query_count, dim), dtype=np.float32)
+
+        start = time.perf_counter()
+        looped = []
+        for query in queries[:loop_queries]:
+            scores = [(cosine_similarity(query, row), i) for i, row in enumerate(matrix)]
+            looped.append([i for _, i in heapq.nlargest(limit, scores, key=lambda x: x[0])])
+        loop_ms = (time.perf_counter() - start) / loop_queries * 1000
+
+        start = time.perf_counter()
+        single = [cosine_top_k(matrix, query, limit)[0].tolist() for query in queries]
+        matmul_ms = (time.perf_counter() - start) / query_count * 1000
+
+        start = time.perf_counter()
+        batched = [indices.tolist() for indices, _ in cosine_top_k_many(matrix, queries, limit)]
+        batch_ms = (time.perf_counter() - start) / query_count * 1000
+
+        rows.append({
+            "vectors": size,
+            "loop_ms": loop_ms,
+            "matmul_ms": matmul_ms,
+            "batch_ms": batch_ms,
+            "identical": looped == single[:loop_queries] and single == batched,
+        })
+        del matrix
+        gc.collect()
+    return rows
+
+
+def clustered_vectors(count: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Unit vectors scattered around random centres, a stand-in for real embeddings."""
+    centres = rng.standard_normal((clusters, dim), dtype=np.float32)
+    noise = rng.standard_normal((count, dim), dtype=np.float32)
+    return normalize_rows(centres[rng.integers(0, clusters, count)] + 0.8 * noise)
+
+
+def ann_benchmark_vectors(
+    vectors: int, dim: int, embeddings_path: str | None, query_count: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """(queries, indexed rows), all unit length; the queries are held-out rows.
+
+    Uses the embeddings in `embeddings_path` (e.g. the chunk embeddings
+    cache) when given, else clustered random vectors.
+    """
+    rng = np.random.default_rng(42)
+    if embeddings_path:
+        data = normalize_rows(np.load(embeddings_path))
+    else:
+        data = clustered_vectors(vectors + query_count, dim, max(1, vectors // 100), rng)
+    held_out = rng.permutation(len(data))[:query_count]
+    keep = np.ones(len(data), dtype=bool)
+    keep[held_out] = False
+    return data[held_out], data[keep]
+
+
+def exact_neighbors(matrix: np.ndarray, queries: np.ndarray, limit: int) -> tuple[list[set[int]], float]:
+    """True top-`limit` row sets of every query, and the exact scan's ms/query."""
+    start = time.perf_counter()
+    exact = [set(cosine_top_k(matrix, query, limit)[0].tolist()) for query in queries]
+    return exact, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def recall(found: list[set[int]], exact: list[set[int]]) -> float:
+    return sum(len(a & b) / len(b) for a, b in zip(found, exact) if b) / len(exact)
+
+
+def hnsw_benchmark_command(
+    ef_values: list[int],
+    vectors: int = 20_000,
+    dim: int = 384,
+    embeddings_path: str | None = None,
+    m: int = HNSW_M,
+    ef_construction: int = HNSW_EF_CONSTRUCTION,
+    limit: int = 10,
+    query_count: int = 100,
+) -> dict[str, Any]:
+    """Recall@k and latency of HNSW search at several `ef_search` values, against the exact scan."""
+    queries, matrix = ann_benchmark_vectors(vectors, dim, embeddings_path, query_count)
+    start = time.perf_counter()
+    index = HNSWIndex.build(matrix, m, ef_construction)
+    build_seconds = time.perf_counter() - start
+    exact, exact_ms = exact_neighbors(matrix, queries, limit)
+
+    rows = []
+    for ef in ef_values:
+        start = time.perf_counter()
+        found = [set(index.search(query, limit, ef)[0].tolist()) for query in queries]
+        hnsw_ms = (time.perf_counter() - start) / len(queries) * 1000
+        rows.append({"ef_search": ef, "recall": recall(found, exact), "hnsw_ms": hnsw_ms})
+    return {
+        "vectors": len(matrix),
+        "build_seconds": build_seconds,
+        "exact_ms": exact_ms,
+        "rows": rows,
+    }
+
+
+def ivfpq_benchmark_command(
+    nprobe_values: list[int],
+    rerank_values: list[int],
+    vectors: int = 20_000,
+    dim: int = 384,
+    embeddings_path: str | None = None,
+    nlist: int | None = None,
+    subspaces: int = PQ_SUBSPACES,
+    limit: int = 10,
+    query_count: int = 100,
+) -> dict[str, Any]:
+    """Recall@k and latency of IVF-PQ search for each (nprobe, rerank) pair, plus its memory use."""
+    queries, matrix = ann_benchmark_vectors(vectors, dim, embeddings_path, query_count)
+    start = time.perf_counter()
+    index = IVFPQIndex.train(matrix, nlist, subspaces)
+    train_seconds = time.perf_counter() - start
+    exact, exact_ms = exact_neighbors(matrix, queries, limit)
+
+    rows = []
+    for nprobe in nprobe_values:
+        for rerank in rerank_values:
+            start = time.perf_counter()
+            found = [set(index.search(query, limit, nprobe, rerank, matrix)[0].tolist()) for query in queries]
+            ivfpq_ms = (time.perf_counter() - start) / len(queries) * 1000
+            rows.append({"nprobe": nprobe, "rerank": rerank, "recall": recall(found, exact), "ivfpq_ms": ivfpq_ms})
+    return {
+        "train_seconds": train_seconds,
+        "nlist": index.nlist,
+        "exact_ms": exact_ms,
+        "memory": index.memory_report(),
+        "rows": rows,
+    }
+
+
+def precision_benchmark_command(
+    rescore_values: list[int],
+    vectors: int = 100_000,
+    dim: int = 384,
+    embeddings_path: str | None = None,
+    limit: int = 10,
+    query_count: int = 100,
+) -> list[dict[str, Any]]:
+    """Recall@k, latency and bytes per vector of int8 and binary scans, for each rescore depth."""
+    queries, matrix = ann_benchmark_vectors(vectors, dim, embeddings_path, query_count)
+    exact, exact_ms = exact_neighbors(matrix, queries, limit)
+    rows = [{"precision": "float32", "rescore": 0, "recall": 1.0, "ms": exact_ms, "bytes_per_vector": dim * 4}]
+    for precision in ("int8", "binary"):
+        quantized = quantize(matrix, precision)
+        for rescore in rescore_values:
+            start = time.perf_counter()
+            found = [
+                set(quantized_top_k(quantized, matrix, query, limit, rescore)[0].tolist()) for query in queries
+            ]
+            rows.append({
+                "precision": precision,
+                "rescore": rescore,
+                "recall": recall(found, exact),
+                "ms": (time.perf_counter() - start) / len(queries) * 1000,
+                "bytes_per_vector": quantized.nbytes / len(matrix),
+            })
+    return rows
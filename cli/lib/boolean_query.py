@@ -0,0 +1,165 @@
+import re
+from typing import Any
+
+import numpy as np
+
+from preprocessing import get_analyzer
+
+# A parsed query is a tree of tuples: ("term", text), ("phrase", text),
+# ("and", [children]), ("or", [children]) and ("not", child).
+QueryNode = tuple[str, Any]
+
+BOOLEAN_TOKEN = re.compile(r'"([^"]*)"|(\()|(\))|([^\s()"]+)')
+OPERATORS = {"AND", "OR", "NOT"}
+
+
+def intersect_postings(doc_lists: list[np.ndarray]) -> np.ndarray:
+    """Ordinals present in every sorted list, intersecting from the rarest up.
+
+    Each step only probes the surviving candidates, and only inside the
+    slice of the next list between the first and last candidate, so the
+    cost follows the rarest term rather than the longest list.
+    """
+    if not doc_lists:
+        return np.empty(0, dtype=np.int64)
+    doc_lists = sorted(doc_lists, key=len)
+    result = doc_lists[0].astype(np.int64)
+    for docs in doc_lists[1:]:
+        if len(result) == 0:
+            break
+        lo = int(np.searchsorted(docs, result[0]))
+        hi = int(np.searchsorted(docs, result[-1], side="right"))
+        window = docs[lo:hi]
+        if len(window) == 0:
+            return np.empty(0, dtype=np.int64)
+        found = np.minimum(np.searchsorted(window, result), len(window) - 1)
+        result = result[window[found] == result]
+    return result
+
+
+def union_postings(doc_lists: list[np.ndarray]) -> np.ndarray:
+    if not doc_lists:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(np.concatenate(doc_lists).astype(np.int64))
+
+
+def parse_boolean_query(query: str) -> QueryNode:
+    """Parse AND / OR / NOT with parentheses and "quoted phrases".
+
+    Operators must be upper case; adjacent operands are joined with AND and
+    NOT binds tighter than AND, which binds tighter than OR.
+    """
+    tokens = []
+    for phrase, opening, closing, word in BOOLEAN_TOKEN.findall(query):
+        if opening or closing:
+            tokens.append((opening or closing, None))
+        elif word in OPERATORS:
+            tokens.append((word, None))
+        elif word:
+            tokens.append(("term", word))
+        else:
+            tokens.append(("phrase", phrase))
+    if not tokens:
+        raise ValueError("empty boolean query")
+
+    pos = 0
+
+    def peek() -> str | None:
+        return tokens[pos][0] if pos < len(tokens) else None
+
+    def parse_or() -> QueryNode:
+        nonlocal pos
+        children = [parse_and()]
+        while peek() == "OR":
+            pos += 1
+            children.append(parse_and())
+        return children[0] if len(children) == 1 else ("or", children)
+
+    def parse_and() -> QueryNode:
+        nonlocal pos
+        children = [parse_not()]
+        while peek() not in (None, "OR", ")"):
+            if peek() == "AND":
+                pos += 1
+            children.append(parse_not())
+        return children[0] if len(children) == 1 else ("and", children)
+
+    def parse_not() -> QueryNode:
+        nonlocal pos
+        if peek() == "NOT":
+            pos += 1
+            return ("not", parse_not())
+        return parse_atom()
+
+    def parse_atom() -> QueryNode:
+        nonlocal pos
+        kind = peek()
+        if kind == "(":
+            pos += 1
+            node = parse_or()
+            if peek() != ")":
+                raise ValueError("unbalanced parentheses in boolean query")
+            pos += 1
+            return node
+        if kind in ("term", "phrase"):
+            pos += 1
+            return tokens[pos - 1]
+        raise ValueError(f"unexpected '{kind or 'end of query'}' in boolean query")
+
+    node = parse_or()
+    if pos != len(tokens):
+        raise ValueError(f"unexpected '{tokens[pos][0]}' in boolean query")
+    return node
+
+
+def positive_terms(node: QueryNode) -> list[str]:
+    """Terms and phrases outside any NOT, i.e. the ones worth scoring."""
+    kind, value = node
+    if kind in ("term", "phrase"):
+        return [value]
+    if kind == "not":
+        return []
+    return [text for child in value for text in positive_terms(child)]
+
+
+def evaluate_boolean_query(node: QueryNode, index: Any) -> np.ndarray:
+    """Sorted live ordinals of `index` (an InvertedIndex) matching `node`."""
+    matches = _evaluate(node, index)
+    return index.live_ordinals() if matches is None else matches
+
+
+def _evaluate(node: QueryNode, index: Any) -> np.ndarray | None:
+    # None means "no constraint": terms that analyze away (stopwords) are
+    # ignored, along with any NOT, AND or OR that is left with nothing.
+    kind, value = node
+    if kind == "term":
+        return index.match_terms(value)
+    if kind == "phrase":
+        return index.match_phrase(value) if get_analyzer().analyze(value) else None
+    if kind == "not":
+        excluded = _evaluate(value, index)
+        if excluded is None:
+            return None
+        return np.setdiff1d(index.live_ordinals(), excluded, assume_unique=True)
+    if kind == "or":
+        children = [_evaluate(child, index) for child in value]
+        children = [matches for matches in children if matches is not None]
+        return union_postings(children) if children else None
+
+    included = []
+    excluded = []
+    for child in value:
+        if child[0] == "not":
+            matches = _evaluate(child[1], index)
+            if matches is not None:
+                excluded.append(matches)
+        else:
+            matches = _evaluate(child, index)
+            if matches is not None:
+                included.append(matches)
+    if not included and not excluded:
+        return None
+    result = intersect_postings(included) if included else index.live_ordinals()
+    if excluded:
+        result = np.setdiff1d(result, union_postings(excluded), assume_unique=True)
+    return result
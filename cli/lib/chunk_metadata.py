@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+
+
+class ChunkMetadata:
+    """Which movie each chunk embedding row belongs to, as parallel arrays.
+
+    Chunks are laid out contiguously per movie, in movie order: movie `m`
+    owns rows `movie_offsets[m]:movie_offsets[m + 1]` (an empty range if it
+    has no description). Row `i` is chunk `chunk_idx[i]` of movie
+    `movie_idx[i]`. Folding chunk scores to movie scores is then a
+    segmented max over those ranges, with no Python object per chunk.
+    """
+
+    def __init__(self, movie_idx: np.ndarray, chunk_idx: np.ndarray, movie_offsets: np.ndarray):
+        self.movie_idx = movie_idx
+        self.chunk_idx = chunk_idx
+        self.movie_offsets = movie_offsets
+        counts = np.diff(movie_offsets)
+        # Movies with at least one chunk, and where their chunks start.
+        self.chunked_movies = np.flatnonzero(counts > 0)
+        self.chunk_starts = movie_offsets[self.chunked_movies]
+
+    @classmethod
+    def from_counts(cls, chunk_counts: list[int]) -> "ChunkMetadata":
+        """Metadata for movies that have `chunk_counts[m]` chunks each, in movie order."""
+        counts = np.asarray(chunk_counts, dtype=np.int64)
+        movie_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=movie_offsets[1:])
+        movie_idx = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+        chunk_idx = (np.arange(movie_offsets[-1]) - movie_offsets[movie_idx]).astype(np.int32)
+        return cls(movie_idx, chunk_idx, movie_offsets)
+
+    def __len__(self) -> int:
+        return len(self.movie_idx)
+
+    @property
+    def movie_count(self) -> int:
+        return len(self.movie_offsets) - 1
+
+    @property
+    def total_chunks(self) -> np.ndarray:
+        """Chunk count of each row's movie."""
+        return np.diff(self.movie_offsets)[self.movie_idx]
+
+    def movie_max(self, similarities: np.ndarray) -> np.ndarray:
+        """Best chunk similarity of every movie, from similarities of all rows in order.
+
+        Works on one query (1-D) or a batch (2-D, one query per row).
+        Movies without chunks get -inf.
+        """
+        scores = np.full(similarities.shape[:-1] + (self.movie_count,), -np.inf, dtype=np.float32)
+        if len(self.chunk_starts):
+            scores[..., self.chunked_movies] = np.maximum.reduceat(similarities, self.chunk_starts, axis=-1)
+        return scores
+
+    def movie_max_at(self, chunk_ids: np.ndarray, similarities: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(movie indices, best similarity) over a subset of rows, e.g. an ANN result."""
+        if len(chunk_ids) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        movies = self.movie_idx[chunk_ids]
+        order = np.argsort(movies, kind="stable")
+        movies = movies[order]
+        starts = np.flatnonzero(np.r_[True, movies[1:] != movies[:-1]])
+        return movies[starts].astype(np.int64), np.maximum.reduceat(similarities[order], starts)
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, movie_idx=self.movie_idx, chunk_idx=self.chunk_idx, movie_offsets=self.movie_offsets)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ChunkMetadata":
+        with np.load(path) as data:
+            return cls(data["movie_idx"], data["chunk_idx"], data["movie_offsets"])
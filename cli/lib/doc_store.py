@@ -0,0 +1,137 @@
+import json
+import os
+from collections.abc import Sequence
+from typing import Any, Iterable, Iterator
+
+import numpy as np
+
+from constants import DATA_PATH, MOVIE_DOCSTORE_CACHE_PATH
+from search_utils import load_movies
+from .embedding_cache import file_stamp
+from .index_format import INDEX_VERSION, map_file, pack_sections, unpack_sections, write_index_file
+
+
+class DocStore:
+    """Read-only document store, memory-mapped and keyed by document id.
+
+    Each document is stored as UTF-8 JSON; `doc_offsets` locates document
+    `i` (in ascending `doc_ids` order) in the blob. Opening a store reads
+    only its header, and a lookup decodes just the requested document, so
+    formatting the top-k results touches k documents however large the
+    corpus is.
+
+    A store may also record `row_ids`, the ids in the order the documents
+    were written, and the `source` stamp of the file they were read from.
+    """
+
+    def __init__(self, buffer: Any):
+        self.buffer = buffer
+        header, sections = unpack_sections(buffer, "docs")
+        self.doc_ids = sections["doc_ids"]
+        self.doc_offsets = sections["doc_offsets"]
+        self.blob = sections["docs"]
+        self.row_ids = sections.get("row_ids")
+        self.source = header.get("source")
+
+    @classmethod
+    def open(cls, path: str) -> "DocStore":
+        return cls(map_file(path))
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.doc_ids.tolist())
+
+    def __contains__(self, doc_id: object) -> bool:
+        return isinstance(doc_id, (int, np.integer)) and self.__position(int(doc_id)) != -1
+
+    def __getitem__(self, doc_id: int) -> dict[str, Any]:
+        return json.loads(self.raw(doc_id))
+
+    def __position(self, doc_id: int) -> int:
+        pos = int(np.searchsorted(self.doc_ids, doc_id))
+        if pos < len(self.doc_ids) and self.doc_ids[pos] == doc_id:
+            return pos
+        return -1
+
+    def raw(self, doc_id: int) -> bytes:
+        """The stored JSON of `doc_id`, undecoded."""
+        pos = self.__position(doc_id)
+        if pos == -1:
+            raise KeyError(doc_id)
+        return self.blob[self.doc_offsets[pos] : self.doc_offsets[pos + 1]].tobytes()
+
+    def get(self, doc_id: int, default: Any = None) -> Any:
+        try:
+            return self[doc_id]
+        except KeyError:
+            return default
+
+    def records(self) -> Iterator[tuple[int, bytes]]:
+        """(doc id, stored JSON) of every document, in id order, without decoding."""
+        offsets = self.doc_offsets.tolist()
+        blob = self.blob.tobytes()
+        for i, doc_id in enumerate(self.doc_ids.tolist()):
+            yield doc_id, blob[offsets[i] : offsets[i + 1]]
+
+
+class StoredDocuments(Sequence):
+    """The documents of a `DocStore` in row order, indexable like the list they were written from.
+
+    Rows are decoded on access, so hydrating the top-k results of a search
+    reads k documents.
+    """
+
+    def __init__(self, store: DocStore):
+        if store.row_ids is None:
+            raise ValueError("document store has no row order")
+        self.store = store
+        self.ids = store.row_ids
+        self.source = store.source
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, row: Any) -> Any:
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        return self.store[int(self.ids[row])]
+
+
+def load_stored_movies(path: str = MOVIE_DOCSTORE_CACHE_PATH) -> StoredDocuments:
+    """The movies of `DATA_PATH` in file order, from a store rewritten only when that file changes."""
+    stamp = file_stamp(DATA_PATH)
+    if os.path.exists(path):
+        store = DocStore.open(path)
+        if store.source == stamp and store.row_ids is not None:
+            return StoredDocuments(store)
+    movies = load_movies()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    records = [(movie["id"], encode_document(movie)) for movie in movies]
+    write_index_file(path, encode_doc_store(records, [movie["id"] for movie in movies], stamp))
+    return StoredDocuments(DocStore.open(path))
+
+
+def encode_document(document: dict[str, Any]) -> bytes:
+    return json.dumps(document, ensure_ascii=False).encode("utf-8")
+
+
+def encode_doc_store(
+    records: Iterable[tuple[int, bytes]], row_ids: list[int] | None = None, source: str | None = None
+) -> bytes:
+    """Pack (doc id, JSON bytes) records into the `DocStore` file format."""
+    records = sorted(records)
+    doc_offsets = np.zeros(len(records) + 1, dtype=np.int64)
+    np.cumsum([len(data) for _, data in records], out=doc_offsets[1:])
+    sections = {
+        "doc_ids": np.array([doc_id for doc_id, _ in records], dtype=np.int64),
+        "doc_offsets": doc_offsets,
+        "docs": np.frombuffer(b"".join(data for _, data in records), dtype=np.uint8),
+    }
+    header = {"version": INDEX_VERSION, "kind": "docs"}
+    if row_ids is not None:
+        sections["row_ids"] = np.array(row_ids, dtype=np.int64)
+    if source is not None:
+        header["source"] = source
+    return pack_sections(header, sections)
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+from typing import Any, Callable, Iterable
+
+import numpy as np
+
+EMBEDDING_CACHE_VERSION = 1
+# Per-row content hashes are blake2b digests of this many bytes.
+TEXT_HASH_SIZE = 16
+
+
+def corpus_hash(texts: Iterable[str]) -> str:
+    """Digest of the texts an embedding cache was built from, in order."""
+    digest = hashlib.blake2b(digest_size=16)
+    for text in texts:
+        data = text.encode("utf-8")
+        # Length-prefixed, so moving text between neighbours changes the hash.
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def text_hashes(texts: Iterable[str]) -> np.ndarray:
+    """Content hash of every text, as a fixed-width bytes array aligned with the embedding rows."""
+    return np.array(
+        [hashlib.blake2b(text.encode("utf-8"), digest_size=TEXT_HASH_SIZE).digest() for text in texts],
+        dtype=f"S{TEXT_HASH_SIZE}",
+    )
+
+
+def embedding_manifest(
+    model_name: str,
+    texts: Iterable[str] | None,
+    chunking: dict[str, Any] | None = None,
+    source: str | None = None,
+) -> dict[str, Any]:
+    """What an embedding cache must have been built from to be reused.
+
+    `source` is the stamp of the file the texts were read from. A manifest
+    built with `texts` None checks only that stamp, so a cache can be
+    validated without reading every text back to hash it.
+    """
+    manifest = {"version": EMBEDDING_CACHE_VERSION, "model": model_name, "chunking": chunking}
+    if texts is not None:
+        manifest["corpus_hash"] = corpus_hash(texts)
+    if source is not None:
+        manifest["source"] = source
+    return manifest
+
+
+def manifest_path(embeddings_path: str) -> str:
+    return f"{os.path.splitext(embeddings_path)[0]}.manifest.json"
+
+
+def hashes_path(embeddings_path: str) -> str:
+    return f"{os.path.splitext(embeddings_path)[0]}.hashes.npy"
+
+
+def file_stamp(path: str) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def load_embeddings(embeddings_path: str, manifest: dict[str, Any]) -> np.ndarray | None:
+    """The cached embeddings, memory-mapped read-only, or None if they were built from other inputs.
+
+    The cache is reused only if its manifest matches `manifest` (model,
+    chunking, corpus hash) and still describes the `.npy` file on disk. The
+    array is shared through the page cache by every process that maps it.
+    """
+    path = manifest_path(embeddings_path)
+    if not os.path.exists(path) or not os.path.exists(embeddings_path):
+        return None
+    with open(path, "r") as f:
+        saved = json.load(f)
+    if any(saved.get(key) != value for key, value in manifest.items()):
+        return None
+    if saved.get("embeddings") != file_stamp(embeddings_path):
+        return None
+    embeddings = np.load(embeddings_path, mmap_mode="r")
+    if list(embeddings.shape) != saved.get("shape"):
+        return None
+    return embeddings
+
+
+def load_reusable_embeddings(embeddings_path: str, model_name: str) -> tuple[np.ndarray, np.ndarray] | None:
+    """(row content hashes, embeddings) of a cache built with `model_name`, whatever its corpus.
+
+    Rows whose text is unchanged can be copied from here instead of being
+    encoded again. None if there is no intact cache for this model.
+    """
+    path = manifest_path(embeddings_path)
+    if not all(os.path.exists(p) for p in (path, embeddings_path, hashes_path(embeddings_path))):
+        return None
+    with open(path, "r") as f:
+        saved = json.load(f)
+    if (
+        saved.get("version") != EMBEDDING_CACHE_VERSION
+        or saved.get("model") != model_name
+        or saved.get("embeddings") != file_stamp(embeddings_path)
+        or saved.get("hashes") != file_stamp(hashes_path(embeddings_path))
+    ):
+        return None
+    hashes = np.load(hashes_path(embeddings_path))
+    embeddings = np.load(embeddings_path, mmap_mode="r")
+    if len(hashes) != len(embeddings):
+        return None
+    return hashes, embeddings
+
+
+def reuse_or_encode(
+    texts: list[str],
+    hashes: np.ndarray,
+    previous: tuple[np.ndarray, np.ndarray] | None,
+    encode: Callable[[list[str]], np.ndarray],
+) -> tuple[np.ndarray, int]:
+    """Embeddings of `texts` and how many texts had to be encoded.
+
+    A text whose hash is in `previous` (from `load_reusable_embeddings`)
+    gets the stored row; the remaining texts are encoded in one call, each
+    distinct text once, and rows of duplicates are copied.
+    """
+    old_hashes, old_embeddings = previous if previous is not None else (hashes[:0], None)
+    unique_hashes, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+    # Row of every distinct text in the old cache, or -1.
+    unique_rows = np.full(len(unique_hashes), -1, dtype=np.int64)
+    if len(old_hashes):
+        old_order = np.argsort(old_hashes)
+        pos = np.searchsorted(old_hashes, unique_hashes, sorter=old_order)
+        pos = np.minimum(pos, len(old_hashes) - 1)
+        found = old_hashes[old_order[pos]] == unique_hashes
+        unique_rows[found] = old_order[pos[found]]
+    missing = np.flatnonzero(unique_rows == -1)
+
+    encoded = encode([texts[i] for i in first[missing].tolist()]) if len(missing) else None
+    if encoded is not None:
+        dim = encoded.shape[1]
+    elif old_embeddings is not None and len(old_embeddings):
+        dim = old_embeddings.shape[1]
+    else:
+        return np.empty((0, 0), dtype=np.float32), 0
+    unique_embeddings = np.empty((len(unique_hashes), dim), dtype=np.float32)
+    reused = np.flatnonzero(unique_rows != -1)
+    if len(reused):
+        # Rows are read in file order, which keeps a memory-mapped cache sequential.
+        order = np.argsort(unique_rows[reused])
+        unique_embeddings[reused[order]] = old_embeddings[unique_rows[reused[order]]]
+    if encoded is not None:
+        unique_embeddings[missing] = encoded
+    return unique_embeddings[inverse], len(missing)
+
+
+def save_embeddings(
+    embeddings_path: str, embeddings: np.ndarray, manifest: dict[str, Any], hashes: np.ndarray
+) -> np.ndarray:
+    """Write `embeddings`, their row `hashes` and then the manifest, each atomically.
+
+    Returns the saved array memory-mapped. The manifest is written last, so
+    a crash in between leaves a cache that `load_embeddings` rejects rather
+    than one that looks valid.
+    """
+    for path, array in ((hashes_path(embeddings_path), hashes), (embeddings_path, embeddings)):
+        with open(f"{path}.tmp", "wb") as f:
+            np.save(f, array)
+        os.replace(f"{path}.tmp", path)
+
+    path = manifest_path(embeddings_path)
+    saved = dict(
+        manifest,
+        shape=list(embeddings.shape),
+        embeddings=file_stamp(embeddings_path),
+        hashes=file_stamp(hashes_path(embeddings_path)),
+    )
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(saved, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+    return np.load(embeddings_path, mmap_mode="r")
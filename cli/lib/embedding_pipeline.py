@@ -0,0 +1,116 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any
+
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
+
+from constants import BUILD_SHARDS_PER_WORKER, EMBED_BUCKET_SIZE, EMBED_MAX_BATCH_SIZE, EMBED_TOKEN_BUDGET
+
+# Texts tokenized per call when measuring lengths.
+TOKENIZE_BATCH = 4096
+
+_worker_model: SentenceTransformer | None = None
+
+
+def init_embedding_worker(model_name: str, threads: int):
+    """Load the model once per worker process, sharing the CPU cores evenly between workers."""
+    global _worker_model
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model_name, device="cpu")
+
+
+def encode_bucket(texts: list[str], batch_size: int) -> np.ndarray:
+    return _worker_model.encode(texts, batch_size=batch_size)
+
+
+def token_lengths(model: SentenceTransformer, texts: list[str]) -> np.ndarray:
+    """Token count of every text as the model sees it, capped at its max sequence length."""
+    lengths = np.empty(len(texts), dtype=np.int32)
+    for start in range(0, len(texts), TOKENIZE_BATCH):
+        input_ids = model.tokenizer(
+            texts[start : start + TOKENIZE_BATCH], truncation=True, max_length=model.max_seq_length
+        )["input_ids"]
+        lengths[start : start + len(input_ids)] = [len(ids) for ids in input_ids]
+    return lengths
+
+
+def length_buckets(
+    lengths: np.ndarray,
+    bucket_size: int = EMBED_BUCKET_SIZE,
+    token_budget: int = EMBED_TOKEN_BUDGET,
+    max_batch_size: int = EMBED_MAX_BATCH_SIZE,
+) -> list[tuple[np.ndarray, int]]:
+    """(text indices, batch size) of buckets of texts with similar token lengths.
+
+    Texts are sorted longest first, so the slowest buckets start first
+    and the pool does not wait on one long straggler at the end. A batch
+    holds about `token_budget` tokens: short texts go in large batches,
+    long ones in small batches, and little of any batch is padding.
+    """
+    order = np.argsort(-lengths, kind="stable")
+    buckets = []
+    for start in range(0, len(order), bucket_size):
+        indices = order[start : start + bucket_size]
+        longest = max(int(lengths[indices[0]]), 1)
+        buckets.append((indices, max(1, min(max_batch_size, token_budget // longest))))
+    return buckets
+
+
+def padding_fraction(lengths: np.ndarray, batches: list[np.ndarray]) -> float:
+    """Share of the encoded tokens that are padding when `lengths` are batched as `batches`."""
+    padded = sum(int(lengths[batch].max()) * len(batch) for batch in batches if len(batch))
+    return 1 - int(lengths.sum()) / padded if padded else 0.0
+
+
+def encode_bucketed(
+    model: SentenceTransformer, model_name: str, texts: list[str], workers: int = 1
+) -> tuple[np.ndarray, dict[str, Any]]:
+    """Embeddings of `texts` in input order, and throughput statistics.
+
+    Texts are bucketed by token length (`length_buckets`). With
+    `workers > 1` the buckets are encoded by a pool of processes, each with
+    its own copy of the model and `cpu_count // workers` torch threads,
+    and every bucket's rows are written back to their input positions as
+    it completes.
+    """
+    start = time.perf_counter()
+    lengths = token_lengths(model, texts)
+    # Small builds still get a few buckets per worker, so none sits idle.
+    shards = max(workers, 1) * BUILD_SHARDS_PER_WORKER
+    buckets = length_buckets(lengths, max(1, min(EMBED_BUCKET_SIZE, -(-len(texts) // shards))))
+    embeddings = np.empty((len(texts), model.get_sentence_embedding_dimension()), dtype=np.float32)
+    if workers <= 1:
+        for indices, batch_size in buckets:
+            embeddings[indices] = model.encode([texts[i] for i in indices.tolist()], batch_size=batch_size)
+    else:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        # Forking a process that already runs torch threads can deadlock; spawned workers load their own model.
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_embedding_worker,
+            initargs=(model_name, threads),
+        ) as executor:
+            futures = {
+                executor.submit(encode_bucket, [texts[i] for i in indices.tolist()], batch_size): indices
+                for indices, batch_size in buckets
+            }
+            for future in as_completed(futures):
+                embeddings[futures[future]] = future.result()
+    seconds = time.perf_counter() - start
+
+    batches = [
+        indices[i : i + batch_size] for indices, batch_size in buckets for i in range(0, len(indices), batch_size)
+    ]
+    return embeddings, {
+        "texts": len(texts),
+        "workers": max(workers, 1),
+        "buckets": len(buckets),
+        "seconds": seconds,
+        "texts_per_second": len(texts) / seconds if seconds else 0.0,
+        "padding": padding_fraction(lengths, batches),
+    }
@@ -0,0 +1,245 @@
+import heapq
+import math
+import os
+
+import numpy as np
+
+from constants import HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, HNSW_M
+from .embedding_cache import file_stamp
+
+
+class HNSWIndex:
+    """Hierarchical navigable small world graph over unit-length vectors.
+
+    Every vector is a node on layer 0 and, with geometrically falling
+    probability, on the layers above it. A search descends greedily from
+    the single node on the top layer and finishes with a best-first search
+    of `ef_search` candidates on layer 0, so it visits a small part of the
+    collection instead of scanning it. Similarity is the dot product, i.e.
+    cosine similarity for rows from `normalize_rows`.
+
+    Layer `l` is a padded (nodes on l, max neighbours) int32 array, with
+    -1 marking unused slots, and `rows[l]` maps a node to its row there.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        m: int = HNSW_M,
+        ef_construction: int = HNSW_EF_CONSTRUCTION,
+        ef_search: int = HNSW_EF_SEARCH,
+    ):
+        self.vectors = vectors
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.levels = np.zeros(len(vectors), dtype=np.int8)
+        self.graphs: list[np.ndarray] = []
+        self.rows: list[np.ndarray] = []
+        self.entry_point = -1
+        # `file_stamp` of the embeddings file the graph was built from, if saved.
+        self.stamp = ""
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        m: int = HNSW_M,
+        ef_construction: int = HNSW_EF_CONSTRUCTION,
+        ef_search: int = HNSW_EF_SEARCH,
+        seed: int = 42,
+    ) -> "HNSWIndex":
+        index = cls(vectors, m, ef_construction, ef_search)
+        rng = np.random.default_rng(seed)
+        levels = np.floor(-np.log(1 - rng.random(len(vectors))) / math.log(m)).astype(np.int8)
+        index.levels = levels
+        for level in range(int(levels.max()) + 1 if len(levels) else 0):
+            nodes = np.flatnonzero(levels >= level)
+            rows = np.full(len(vectors), -1, dtype=np.int32)
+            rows[nodes] = np.arange(len(nodes), dtype=np.int32)
+            index.graphs.append(np.full((len(nodes), index.max_neighbors(level)), -1, dtype=np.int32))
+            index.rows.append(rows)
+        for node in range(len(vectors)):
+            index.__insert(node)
+        return index
+
+    def max_neighbors(self, level: int) -> int:
+        return 2 * self.m if level == 0 else self.m
+
+    @property
+    def top_level(self) -> int:
+        return int(self.levels[self.entry_point]) if self.entry_point != -1 else -1
+
+    def neighbors(self, level: int, node: int) -> np.ndarray:
+        row = self.graphs[level][self.rows[level][node]]
+        return row[row >= 0]
+
+    def __search_layer(
+        self, query: np.ndarray, entry_points: list[int], ef: int, level: int
+    ) -> list[tuple[float, int]]:
+        """Best-first search of one layer; the `ef` most similar nodes found, best first."""
+        graph, rows = self.graphs[level], self.rows[level]
+        visited = set(entry_points)
+        similarities = (self.vectors[entry_points] @ query).tolist()
+        candidates = [(-similarity, node) for similarity, node in zip(similarities, entry_points)]
+        heapq.heapify(candidates)
+        found = heapq.nlargest(ef, zip(similarities, entry_points))
+        heapq.heapify(found)
+        worst = found[0][0] if len(found) >= ef else -math.inf
+
+        while candidates:
+            negated, node = heapq.heappop(candidates)
+            if -negated < worst:
+                break
+            fresh = [n for n in graph[rows[node]].tolist() if n >= 0 and n not in visited]
+            if not fresh:
+                continue
+            visited.update(fresh)
+            for similarity, neighbor in zip((self.vectors[fresh] @ query).tolist(), fresh):
+                if similarity > worst:
+                    heapq.heappush(candidates, (-similarity, neighbor))
+                    heapq.heappush(found, (similarity, neighbor))
+                    if len(found) > ef:
+                        heapq.heappop(found)
+                    if len(found) >= ef:
+                        worst = found[0][0]
+        return sorted(found, reverse=True)
+
+    def __select_neighbors(self, candidates: list[tuple[float, int]], count: int) -> list[int]:
+        """Up to `count` of `candidates` (best first), preferring diverse directions.
+
+        A candidate is kept if it is closer to the base than to every
+        neighbour kept so far (the HNSW heuristic); skipped candidates fill
+        any remaining slots so nodes keep their degree.
+        """
+        if len(candidates) <= count:
+            return [node for _, node in candidates]
+        nodes = [node for _, node in candidates]
+        pairwise = self.vectors[nodes] @ self.vectors[nodes].T
+        # Highest similarity of every candidate to any kept neighbour so far.
+        closest_kept = np.full(len(nodes), -np.inf, dtype=np.float32)
+        nearest = closest_kept.tolist()
+        selected = []
+        skipped = []
+        for i, (to_base, _) in enumerate(candidates):
+            if len(selected) == count:
+                break
+            if nearest[i] < to_base:
+                selected.append(i)
+                np.maximum(closest_kept, pairwise[i], out=closest_kept)
+                nearest = closest_kept.tolist()
+            else:
+                skipped.append(i)
+        selected += skipped[: count - len(selected)]
+        return [nodes[i] for i in selected]
+
+    def __set_neighbors(self, level: int, node: int, neighbors: list[int]):
+        row = self.graphs[level][self.rows[level][node]]
+        row[:] = -1
+        row[: len(neighbors)] = neighbors
+
+    def __insert(self, node: int):
+        level = int(self.levels[node])
+        if self.entry_point == -1:
+            self.entry_point = node
+            return
+        query = self.vectors[node]
+        entry_points = [self.entry_point]
+        for upper in range(self.top_level, level, -1):
+            entry_points = [self.__search_layer(query, entry_points, 1, upper)[0][1]]
+
+        for current in range(min(level, self.top_level), -1, -1):
+            found = self.__search_layer(query, entry_points, self.ef_construction, current)
+            neighbors = self.__select_neighbors(found, self.m)
+            self.__set_neighbors(current, node, neighbors)
+            limit = self.max_neighbors(current)
+            for neighbor in neighbors:
+                links = self.neighbors(current, neighbor).tolist()
+                if len(links) < limit:
+                    self.__set_neighbors(current, neighbor, links + [node])
+                    continue
+                links.append(node)
+                similarities = (self.vectors[links] @ self.vectors[neighbor]).tolist()
+                ranked = sorted(zip(similarities, links), reverse=True)
+                self.__set_neighbors(current, neighbor, self.__select_neighbors(ranked, limit))
+            entry_points = [candidate for _, candidate in found]
+
+        if level > self.top_level:
+            self.entry_point = node
+
+    def search(
+        self, query: np.ndarray, limit: int, ef_search: int | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Node ids and similarities of (approximately) the `limit` nodes most similar to `query`.
+
+        `query` must be unit length; a larger `ef_search` trades latency for recall.
+        """
+        if self.entry_point == -1 or limit <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = np.asarray(query, dtype=np.float32)
+        entry_points = [self.entry_point]
+        for level in range(self.top_level, 0, -1):
+            entry_points = [self.__search_layer(query, entry_points, 1, level)[0][1]]
+        ef = max(ef_search or self.ef_search, limit)
+        found = self.__search_layer(query, entry_points, ef, 0)[:limit]
+        return (
+            np.array([node for _, node in found], dtype=np.int64),
+            np.array([similarity for similarity, _ in found], dtype=np.float32),
+        )
+
+    def save(self, path: str):
+        sections = {
+            "levels": self.levels,
+            "params": np.array([self.m, self.ef_construction, self.entry_point], dtype=np.int64),
+            "stamp": np.array(self.stamp),
+        }
+        for level, graph in enumerate(self.graphs):
+            sections[f"graph_{level}"] = graph
+        with open(path, "wb") as f:
+            np.savez(f, **sections)
+
+    @classmethod
+    def load(cls, path: str, vectors: np.ndarray, ef_search: int = HNSW_EF_SEARCH) -> "HNSWIndex":
+        with np.load(path) as data:
+            m, ef_construction, entry_point = data["params"].tolist()
+            index = cls(vectors, m, ef_construction, ef_search)
+            index.levels = data["levels"]
+            index.entry_point = entry_point
+            index.stamp = str(data["stamp"]) if "stamp" in data else ""
+            level = 0
+            while f"graph_{level}" in data:
+                index.graphs.append(data[f"graph_{level}"])
+                rows = np.full(len(index.levels), -1, dtype=np.int32)
+                nodes = np.flatnonzero(index.levels >= level)
+                rows[nodes] = np.arange(len(nodes), dtype=np.int32)
+                index.rows.append(rows)
+                level += 1
+        return index
+
+    def is_current(self, stamp: str, m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION) -> bool:
+        return bool(stamp) and self.stamp == stamp and self.m == m and self.ef_construction == ef_construction
+
+
+def load_or_build_hnsw(
+    path: str,
+    embeddings_path: str,
+    vectors: np.ndarray,
+    m: int = HNSW_M,
+    ef_construction: int = HNSW_EF_CONSTRUCTION,
+    ef_search: int = HNSW_EF_SEARCH,
+) -> HNSWIndex:
+    """The graph saved at `path` if it was built from the current embeddings file with these settings, else a new one.
+
+    The graph is keyed on the `file_stamp` of `embeddings_path` (which
+    holds `vectors`), so checking it does not read the embeddings.
+    """
+    stamp = file_stamp(embeddings_path) if os.path.exists(embeddings_path) else ""
+    if stamp and os.path.exists(path):
+        index = HNSWIndex.load(path, vectors, ef_search)
+        if index.is_current(stamp, m, ef_construction):
+            return index
+    index = HNSWIndex.build(vectors, m, ef_construction, ef_search)
+    if stamp:
+        index.stamp = stamp
+        index.save(path)
+    return index
@@ -2,13 +2,18 @@ from typing import Optional
 import heapq
 import os
 
+import numpy as np
+
+from .doc_store import load_stored_movies
+from .embedding_cache import file_stamp
 from .inverted_index import InvertedIndex
+from .result_cache import ResultCache
 from .semantic_search import ChunkedSemanticSearch
 
 from constants import INDEX_CACHE_PATH, SEARCH_MULTIPLIER
 from search_enhancement import enhance_query
 from reranking import rerank
-from search_utils import load_movies, format_search_result
+from search_utils import format_search_result
 from custom_types import RRFSearchResult, SearchResult
 
 class HybridSearch:
@@ -21,14 +26,42 @@ class HybridSearch:
         if not os.path.exists(INDEX_CACHE_PATH):
             self.idx.build()
             self.idx.save()
-
-    def _bm25_search(self, query, limit):
-        self.idx.load()
-        return self.idx.bm25_search(query, limit)
-
-    def weighted_search(self, query, alpha, limit=5) -> list[SearchResult]:
-        kw_search = self._bm25_search(query, limit * 500)
-        sm_search = self.semantic_search.search_chunks(query, limit * 500)
+        # `file_stamp` of the index manifest the loaded index was read from.
+        self.index_stamp = None
+        self.result_cache = ResultCache()
+
+    def _snapshot(self):
+        """Return the version of everything a fused result depends on.
+
+        The index is reloaded only when its manifest on disk changed (another
+        process added, deleted or merged segments), not on every search.
+        """
+        stamp = file_stamp(INDEX_CACHE_PATH)
+        if stamp != self.index_stamp:
+            self.idx.load()
+            self.index_stamp = stamp
+        return (self.idx.index_version(), self.semantic_search.snapshot_version)
+
+    def _cached(self, key, compute) -> list[SearchResult]:
+        results = self.result_cache.get_or_compute(key, self._snapshot(), compute)
+        # Callers (reranking) may annotate the result dicts, so hand out copies.
+        return [dict(result) for result in results]
+
+    def _filter(self, filter_query) -> tuple[np.ndarray | None, set[int] | None]:
+        """Index ordinals and doc ids matching `filter_query`, evaluated once for both searches."""
+        if not filter_query:
+            return None, None
+        candidates = self.idx.match_boolean(filter_query)
+        return candidates, set(self.idx.reader.doc_ids[candidates].tolist())
+
+    def weighted_search(self, query, alpha, limit=5, filter_query=None) -> list[SearchResult]:
+        key = ("weighted", query, alpha, limit, filter_query)
+        return self._cached(key, lambda: self._weighted_search(query, alpha, limit, filter_query))
+
+    def _weighted_search(self, query, alpha, limit, filter_query) -> list[SearchResult]:
+        candidates, doc_ids = self._filter(filter_query)
+        kw_search = self.idx.bm25_search(query, limit * 500, candidates=candidates)
+        sm_search = self.semantic_search.search_chunks(query, limit * 500, doc_ids)
 
         kw_scores = list(map(lambda x: x["score"], kw_search))
         sm_scores = list(map(lambda x: x["score"], sm_search))
@@ -76,9 +109,14 @@ class HybridSearch:
         return list(map(lambda x: format_search_result(x[0], x[1]["title"], x[1]["document"], x[1]["hybrid_score"], kw_score=x[1]["kw_score"], sm_score=x[1]["sm_score"], hybrid_score=x[1]["hybrid_score"]), sorted_scores))
 
 
-    def rrf_search(self, query, k, limit=10) -> list[SearchResult]:
-        kw_search = self._bm25_search(query, limit * 500)
-        sm_search = self.semantic_search.search_chunks(query, limit * 500)
+    def rrf_search(self, query, k, limit=10, filter_query=None) -> list[SearchResult]:
+        key = ("rrf", query, k, limit, filter_query)
+        return self._cached(key, lambda: self._rrf_search(query, k, limit, filter_query))
+
+    def _rrf_search(self, query, k, limit, filter_query) -> list[SearchResult]:
+        candidates, doc_ids = self._filter(filter_query)
+        kw_search = self.idx.bm25_search(query, limit * 500, candidates=candidates)
+        sm_search = self.semantic_search.search_chunks(query, limit * 500, doc_ids)
 
         document_map = {}
         for i, res in enumerate(kw_search, 1):
@@ -134,16 +172,16 @@ def normalize_command(scores: list[float | int] = []):
 def hybrid_score(bm25_score, semantic_score, alpha=0.5):
     return alpha * bm25_score + (1 - alpha) * semantic_score
 
-def weighted_search_command(query, alpha: float=0.5, limit: int=5):
-    documents = load_movies()
+def weighted_search_command(query, alpha: float=0.5, limit: int=5, filter_query: Optional[str] = None):
+    documents = load_stored_movies()
     hs = HybridSearch(documents)
-    return hs.weighted_search(query, alpha, limit)
+    return hs.weighted_search(query, alpha, limit, filter_query)
 
 def rrf_score(rank, k=60):
     return 1 / (k + rank)
 
-def rrf_search_command(query:str, enhance: Optional[str] = None, rerank_method: Optional[str] = None, k:int = 60, limit:int=5) -> RRFSearchResult:
-    documents = load_movies()
+def rrf_search_command(query:str, enhance: Optional[str] = None, rerank_method: Optional[str] = None, k:int = 60, limit:int=5, filter_query: Optional[str] = None) -> RRFSearchResult:
+    documents = load_stored_movies()
     hs = HybridSearch(documents)
 
     org_query = query
@@ -156,7 +194,7 @@ def rrf_search_command(query:str, enhance: Optional[str] = None, rerank_method:
         print(f"DEBUG: Enhanced query: {enhanced_query}")
 
     search_limit = limit * SEARCH_MULTIPLIER if rerank_method else limit
-    results = hs.rrf_search(query, k, search_limit)
+    results = hs.rrf_search(query, k, search_limit, filter_query)
     print("DEBUG: Results of RRF Search:")
     for result in results:
         print(f"\t- {result["title"]}")
@@ -0,0 +1,217 @@
+from typing import Any
+
+import numpy as np
+
+from constants import BM25_B, BM25_K1, IMPACT_LEVELS
+from .impact_matrix import ImpactMatrix
+from .index_format import (
+    INDEX_VERSION,
+    TermDictionary,
+    encode_term_dictionary,
+    map_file,
+    pack_sections,
+    unpack_sections,
+)
+
+
+class ImpactIndex:
+    """Impact-ordered postings with BM25 contributions quantized to 8 bits.
+
+    Every term has its own scale, `term_scales[t]` = its largest BM25
+    contribution / IMPACT_LEVELS, so a common low-idf term gets as many
+    levels as a rare one. A contribution is stored as the nearest level, so
+    it is within `term_scales[t] / 2` of exact, and a document's score is
+    within `error_bound(tokens)` (the sum of those half-steps) of its BM25
+    score.
+
+    Each term's postings are grouped into segments of equal quantized impact,
+    highest impact first, with doc ordinals ascending inside a segment. A
+    query is answered score-at-a-time: segments of all query terms are merged
+    by impact, added into an accumulator, and processing stops as soon as the
+    remaining segments can no longer change which documents are in the
+    top-k. The stopping test compares a running top-(k+1), updated only from
+    the documents touched since the previous test, with the sum of the
+    terms' next impacts, so it never scans every accumulator. The top-k
+    documents are then completed with their contributions from the
+    unprocessed segments, so their quantized scores are exact.
+
+    Impacts depend on BM25_K1 and BM25_B; `is_current` reports whether the
+    file was built with the current constants and index segments.
+    """
+
+    def __init__(self, buffer: Any):
+        self.buffer = buffer
+        header, sections = unpack_sections(buffer, "impacts")
+        self.header = header
+        self.terms = TermDictionary(sections["term_offsets"], sections["terms"])
+        self.term_scales = sections["term_scales"]
+        self.term_segments = sections["term_segments"]
+        self.segment_impacts = sections["segment_impacts"]
+        self.segment_offsets = sections["segment_offsets"]
+        self.postings_docs = sections["postings_docs"]
+
+    @classmethod
+    def open(cls, path: str) -> "ImpactIndex":
+        return cls(map_file(path))
+
+    def is_current(self, source: str | None) -> bool:
+        return (
+            self.header["k1"] == BM25_K1
+            and self.header["b"] == BM25_B
+            and self.header["levels"] == IMPACT_LEVELS
+            and self.header.get("quantization") == "per_term"
+            and self.header["source"] == source
+        )
+
+    def error_bound(self, tokens: list[str]) -> float:
+        """Largest difference between a document's quantized score for `tokens` and its BM25 score."""
+        term_ids = [self.terms.find(token) for token in tokens]
+        return sum(float(self.term_scales[term_id]) / 2 for term_id in term_ids if term_id != -1)
+
+    def __query_segments(self, tokens: list[str]) -> tuple[np.ndarray, ...]:
+        """(dequantized impact, term, start, end, next impact of the same term) of every query segment."""
+        impacts, terms, starts, ends, next_impacts = [], [], [], [], []
+        for t, token in enumerate(tokens):
+            term_id = self.terms.find(token)
+            if term_id == -1:
+                continue
+            first, last = self.term_segments[term_id], self.term_segments[term_id + 1]
+            term_impacts = self.segment_impacts[first:last] * self.term_scales[term_id]
+            impacts.append(term_impacts)
+            terms.append(np.full(last - first, t, dtype=np.int64))
+            starts.append(self.segment_offsets[first:last])
+            ends.append(self.segment_offsets[first + 1 : last + 1])
+            next_impacts.append(np.append(term_impacts[1:], 0.0))
+        if not impacts:
+            empty = np.empty(0, dtype=np.int64)
+            return np.empty(0), empty, empty, empty, np.empty(0)
+        return tuple(np.concatenate(parts) for parts in (impacts, terms, starts, ends, next_impacts))
+
+    def search(
+        self, tokens: list[str], limit: int, num_docs: int, stats: dict[str, Any] | None = None
+    ) -> list[tuple[int, float]]:
+        impacts, terms, starts, ends, next_impacts = self.__query_segments(tokens)
+        order = np.argsort(-impacts, kind="stable")
+        impacts, terms, starts, ends = impacts[order], terms[order], starts[order], ends[order]
+        lengths = ends - starts
+        # Highest score any document can still gain after each segment: the
+        # sum over terms of their next unprocessed impact.
+        first_of_term = np.unique(terms, return_index=True)[1]
+        bounds = impacts[first_of_term].sum() + np.cumsum(next_impacts[order] - impacts)
+        # Stopping tests run where an impact level ends, geometrically spaced by postings.
+        level_ends = np.flatnonzero(np.diff(impacts)) + 1
+        if len(order):
+            level_ends = np.append(level_ends, len(order))
+        cumulative = np.cumsum(lengths)
+
+        accumulators = np.zeros(num_docs, dtype=np.float64)
+        # The (limit + 1) best documents so far. Scores only grow, so only
+        # documents touched since the last test can enter it.
+        top = np.empty(0, dtype=np.int64)
+        processed = 0
+        next_check = limit
+        stopped_early = False
+        for end in level_ends.tolist():
+            if end < len(order) and cumulative[end - 1] < next_check:
+                continue
+            docs = self.__accumulate(accumulators, impacts[processed:end], starts[processed:end], ends[processed:end])
+            processed = end
+            if end == len(order) or limit >= num_docs:
+                continue
+            next_check = 2 * cumulative[end - 1]
+            top = top_candidates(accumulators, np.concatenate((top, docs)), limit + 1)
+            scores = accumulators[top]
+            kth = scores[:limit].min() if len(top) >= limit else 0.0
+            next_best = scores[limit] if len(top) > limit else 0.0
+            if kth > 0 and kth - next_best > bounds[end - 1]:
+                stopped_early = True
+                break
+
+        if stopped_early:
+            # The top-k set is settled; only its documents need the rest of their scores.
+            candidates = top[:limit]
+            for t in np.unique(terms[processed:]).tolist():
+                rest = processed + np.flatnonzero(terms[processed:] == t)
+                docs = self.postings_docs[starts[rest[0]] : ends[rest[-1]]]
+                segment_of = np.repeat(rest, lengths[rest])
+                hits = np.isin(docs, candidates)
+                np.add.at(accumulators, docs[hits], impacts[segment_of[hits]])
+            results = [(int(o), float(accumulators[o])) for o in candidates]
+            results.sort(key=lambda x: (-x[1], x[0]))
+        else:
+            results = top_k_accumulators(accumulators, limit)
+
+        if stats is not None:
+            stats["postings"] = int(cumulative[processed - 1]) if processed else 0
+            stats["total_postings"] = int(lengths.sum())
+            stats["stopped_early"] = stopped_early
+            stats["error_bound"] = self.error_bound(tokens)
+        return results
+
+    def __accumulate(
+        self, accumulators: np.ndarray, impacts: np.ndarray, starts: np.ndarray, ends: np.ndarray
+    ) -> np.ndarray:
+        """Add the impacts of the segments [starts, ends) and return the documents they touched."""
+        lengths = ends - starts
+        total = int(lengths.sum())
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(total)
+        docs = self.postings_docs[offsets].astype(np.int64)
+        np.add.at(accumulators, docs, np.repeat(impacts, lengths))
+        return docs
+
+
+def top_candidates(accumulators: np.ndarray, candidates: np.ndarray, count: int) -> np.ndarray:
+    """The `count` distinct `candidates` with the highest accumulators, best first."""
+    candidates = np.unique(candidates)
+    if len(candidates) > count:
+        candidates = candidates[np.argpartition(-accumulators[candidates], count - 1)[:count]]
+    return candidates[np.lexsort((candidates, -accumulators[candidates]))]
+
+
+def top_k_accumulators(accumulators: np.ndarray, limit: int) -> list[tuple[int, float]]:
+    candidates = np.flatnonzero(accumulators > 0)
+    if limit <= 0 or len(candidates) == 0:
+        return []
+    order = np.lexsort((candidates, -accumulators[candidates]))[:limit]
+    return [(int(candidates[i]), float(accumulators[candidates[i]])) for i in order]
+
+
+def encode_impact_index(matrix: ImpactMatrix, source: str | None) -> bytes:
+    """Quantize `matrix` to IMPACT_LEVELS per term and lay postings out impact-first."""
+    rows = np.repeat(np.arange(len(matrix.terms), dtype=np.int64), np.diff(matrix.indptr))
+    term_max = np.zeros(len(matrix.terms), dtype=np.float64)
+    nonempty = np.flatnonzero(np.diff(matrix.indptr))
+    if len(nonempty):
+        term_max[nonempty] = np.maximum.reduceat(matrix.data, matrix.indptr[nonempty])
+    term_scales = np.where(term_max > 0, term_max / IMPACT_LEVELS, 1.0)
+    quantized = np.clip(np.rint(matrix.data / term_scales[rows]), 1, IMPACT_LEVELS).astype(np.uint8)
+
+    order = np.lexsort((matrix.indices, -quantized.astype(np.int64), rows))
+    rows, quantized, docs = rows[order], quantized[order], matrix.indices[order]
+
+    boundaries = np.flatnonzero((np.diff(rows) != 0) | (np.diff(quantized) != 0)) + 1
+    starts = np.concatenate(([0], boundaries)) if len(rows) else np.empty(0, dtype=np.int64)
+    segment_offsets = np.append(starts, len(rows)).astype(np.int64)
+    term_segments = np.zeros(len(matrix.terms) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows[starts], minlength=len(matrix.terms)), out=term_segments[1:])
+
+    term_offsets, term_blob = encode_term_dictionary(matrix.terms)
+    sections = {
+        "term_offsets": term_offsets,
+        "terms": term_blob,
+        "term_scales": term_scales,
+        "term_segments": term_segments,
+        "segment_impacts": quantized[starts],
+        "segment_offsets": segment_offsets,
+        "postings_docs": docs.astype(np.int32),
+    }
+    metadata = {
+        "version": INDEX_VERSION,
+        "kind": "impacts",
+        "k1": BM25_K1,
+        "b": BM25_B,
+        "levels": IMPACT_LEVELS,
+        "quantization": "per_term",
+        "source": source,
+    }
+    return pack_sections(metadata, sections)
@@ -0,0 +1,105 @@
+import numpy as np
+
+from constants import BM25_BATCH_MAX_CELLS, BM25_K1
+from .index_format import MappedIndex
+from .segments import SegmentedIndex
+
+
+class ImpactMatrix:
+    """Sparse BM25 impact matrix with IDF and length normalisation baked in.
+
+    Stored term-major: row `t` spans `data[indptr[t]:indptr[t + 1]]` with
+    document ordinals in `indices`. That is the CSR form of the term-document
+    matrix, i.e. the CSC form of the document-term matrix; `document_term()`
+    returns the CSR document-term layout for export.
+    """
+
+    def __init__(
+        self,
+        terms: list[str],
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        data: np.ndarray,
+        num_docs: int,
+    ):
+        self.terms = terms
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.num_docs = num_docs
+
+    @classmethod
+    def from_reader(cls, reader: MappedIndex | SegmentedIndex) -> "ImpactMatrix":
+        num_docs = len(reader.doc_ids)
+        if isinstance(reader, MappedIndex):
+            terms = [reader.terms[i] for i in range(len(reader.terms))]
+            indptr = reader.postings_offsets.astype(np.int64)
+            docs, tfs = reader.all_postings()
+            indices = docs.astype(np.int64)
+            idfs = np.repeat(reader.idfs, np.diff(indptr))
+        else:
+            vocabulary = set()
+            for segment in reader.segments:
+                vocabulary.update(segment.terms[i] for i in range(len(segment.terms)))
+            terms = []
+            all_docs, all_tfs, all_idfs = [], [], []
+            indptr = [0]
+            for term in sorted(vocabulary):
+                docs, term_tfs = reader.postings(term)
+                if len(docs) == 0:
+                    continue
+                terms.append(term)
+                all_docs.append(docs)
+                all_tfs.append(term_tfs)
+                all_idfs.append(np.full(len(docs), reader.idf(term)))
+                indptr.append(indptr[-1] + len(docs))
+            indptr = np.array(indptr, dtype=np.int64)
+            indices = np.concatenate(all_docs) if all_docs else np.empty(0, dtype=np.int64)
+            tfs = np.concatenate(all_tfs) if all_tfs else np.empty(0, dtype=np.int32)
+            idfs = np.concatenate(all_idfs) if all_idfs else np.empty(0, dtype=np.float64)
+
+        length_norms = reader.length_norms[indices]
+        data = (tfs * (BM25_K1 + 1)) / (tfs + BM25_K1 * length_norms) * idfs
+        return cls(terms, indptr, indices, data, num_docs)
+
+    def document_term(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(indptr, indices, data) of the CSR document-term matrix."""
+        rows = np.repeat(np.arange(len(self.terms), dtype=np.int64), np.diff(self.indptr))
+        order = np.argsort(self.indices, kind="stable")
+        indptr = np.zeros(self.num_docs + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.indices, minlength=self.num_docs), out=indptr[1:])
+        return indptr, rows[order], self.data[order]
+
+    def score(self, token_lists: list[list[str]]) -> np.ndarray:
+        """Dense (queries x documents) score matrix for analyzed queries.
+
+        Each query is a sparse row vector over terms; the product with the
+        impact matrix is formed by gathering the impact rows of every query
+        token and summing them per (query, document) cell with `bincount`.
+        Tokens are gathered in query order and bincount accumulates in array
+        order, so each cell is summed exactly like term-at-a-time scoring.
+        """
+        cell_ids = []
+        weights = []
+        for q, tokens in enumerate(token_lists):
+            for token in tokens:
+                term_id = self.term_ids.get(token)
+                if term_id is None:
+                    continue
+                start, end = self.indptr[term_id], self.indptr[term_id + 1]
+                cell_ids.append(self.indices[start:end] + q * self.num_docs)
+                weights.append(self.data[start:end])
+        cells = len(token_lists) * self.num_docs
+        if not cell_ids:
+            return np.zeros((len(token_lists), self.num_docs), dtype=np.float64)
+        scores = np.bincount(
+            np.concatenate(cell_ids), weights=np.concatenate(weights), minlength=cells
+        )
+        return scores.reshape(len(token_lists), self.num_docs)
+
+    def score_batches(self, token_lists: list[list[str]]):
+        """Yield (offset, scores) for slices of queries that fit BM25_BATCH_MAX_CELLS."""
+        batch_size = max(1, BM25_BATCH_MAX_CELLS // max(1, self.num_docs))
+        for offset in range(0, len(token_lists), batch_size):
+            yield offset, self.score(token_lists[offset : offset + batch_size])
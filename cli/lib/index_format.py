@@ -0,0 +1,521 @@
+import json
+import math
+import mmap
+import os
+import struct
+from collections import Counter
+from typing import Any
+
+import numpy as np
+
+from constants import BM25_B, BM25_K1, INDEX_COMPRESS_POSTINGS, INDEX_FIELDS, POSTINGS_BLOCK_SIZE
+from .postings_codec import CompressedPostings, encode_postings
+
+INDEX_MAGIC = b"RSIDX\x00\x00\x01"
+INDEX_VERSION = 1
+SECTION_ALIGNMENT = 8
+
+
+class TermDictionary:
+    """Sorted term dictionary backed by a UTF-8 blob and an offsets array.
+
+    UTF-8 byte order matches code point order, so binary search over the
+    encoded terms finds the same position as a search over the strings.
+    """
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray):
+        self.offsets = offsets
+        self.blob = blob
+        self.__decoded: list[str] | None = None
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def term_bytes(self, i: int) -> bytes:
+        return self.blob[self.offsets[i] : self.offsets[i + 1]].tobytes()
+
+    def __getitem__(self, i: int) -> str:
+        return self.term_bytes(i).decode("utf-8")
+
+    def decoded(self) -> list[str]:
+        """Every term as a string, decoded on first use for whole-dictionary scans."""
+        if self.__decoded is None:
+            blob = self.blob.tobytes()
+            offsets = self.offsets.tolist()
+            self.__decoded = [blob[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+        return self.__decoded
+
+    def lower_bound(self, key: bytes) -> int:
+        """Position of the first term whose UTF-8 encoding is not below `key`."""
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.term_bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, term: str) -> int:
+        """Position of `term` in the dictionary, or -1 if it is not indexed."""
+        key = term.encode("utf-8")
+        lo = self.lower_bound(key)
+        if lo < len(self) and self.term_bytes(lo) == key:
+            return lo
+        return -1
+
+
+class MappedIndex:
+    """Read-only view over the binary index format.
+
+    Every section is a NumPy array created with `np.frombuffer` on top of the
+    underlying buffer, so opening an index reads only the header and the OS
+    page cache is shared by every process that maps the same file.
+
+    Documents are addressed by ordinal (their position in `doc_ids`), and
+    `doc_ids` is sorted so ordinal order is also doc id order.
+
+    Postings are either plain int32 arrays or, for compressed indexes, block
+    bit-packed (see `postings_codec`) and decoded a block at a time when a
+    term is read.
+
+    Indexes built with field statistics also store each document's length
+    per field and, for every posting, the term frequency in each field but
+    the last (which is the total minus the others).
+
+    Indexes built with positions also carry, for every posting, the sorted
+    token positions of the term in that document: posting `i` owns
+    `positions[position_offsets[i]:position_offsets[i + 1]]`.
+
+    Indexes built with surface forms also keep a second sorted dictionary of
+    the indexed words as written (lowercased, before stemming), with the
+    term id of each word's stem, so completions can be real words.
+    """
+
+    def __init__(self, buffer: Any):
+        self.buffer = buffer
+        header, self.sections = unpack_sections(buffer, "index")
+        self.header = header
+        self.num_docs: int = header["num_docs"]
+        self.avg_doc_length: float = header["avg_doc_length"]
+        self.doc_ids = self.sections["doc_ids"]
+        self.doc_lengths = self.sections["doc_lengths"]
+        self.length_norms = self.sections["length_norms"]
+        if header["b"] != BM25_B:
+            # Written with a different BM25 b; norms are cheap to redo from lengths.
+            self.length_norms = compute_length_norms(self.doc_lengths, self.avg_doc_length)
+        self.idfs = self.sections["idfs"]
+        self.postings_offsets = self.sections["postings_offsets"]
+        self.compressed: CompressedPostings | None = None
+        if header.get("postings_encoding", "raw") == "bitpacked":
+            self.compressed = CompressedPostings(self.sections, self.postings_offsets, header["block_size"])
+        else:
+            self.postings_docs = self.sections["postings_docs"]
+            self.postings_tfs = self.sections["postings_tfs"]
+        self.terms = TermDictionary(self.sections["term_offsets"], self.sections["terms"])
+        self.has_positions: bool = header.get("positions", False)
+        self.fields: list[str] = header.get("fields", [])
+        if self.fields:
+            self.field_lengths = self.sections["doc_field_lengths"].reshape(-1, len(self.fields))
+            self.avg_field_lengths = np.array(header["avg_field_lengths"], dtype=np.float64)
+            self.leading_field_tfs = self.sections["postings_field_tfs"].reshape(-1, len(self.fields) - 1)
+        self.surface_terms: TermDictionary | None = None
+        if "surface_terms" in self.sections:
+            self.surface_terms = TermDictionary(self.sections["surface_offsets"], self.sections["surface_terms"])
+            self.surface_term_ids = self.sections["surface_term_ids"]
+
+    @classmethod
+    def open(cls, path: str) -> "MappedIndex":
+        return cls(map_file(path))
+
+    def ordinal(self, doc_id: int) -> int:
+        pos = int(np.searchsorted(self.doc_ids, doc_id))
+        if pos >= self.num_docs or self.doc_ids[pos] != doc_id:
+            raise KeyError(doc_id)
+        return pos
+
+    def term_postings(self, term_id: int) -> tuple[np.ndarray, np.ndarray]:
+        if self.compressed is not None:
+            return self.compressed.term_postings(term_id)
+        start = self.postings_offsets[term_id]
+        end = self.postings_offsets[term_id + 1]
+        return self.postings_docs[start:end], self.postings_tfs[start:end]
+
+    def postings(self, term: str) -> tuple[np.ndarray, np.ndarray]:
+        """Doc ordinals (ascending) and term frequencies for `term`."""
+        term_id = self.terms.find(term)
+        if term_id == -1:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        return self.term_postings(term_id)
+
+    def term_field_tfs(self, term_id: int) -> np.ndarray:
+        """(postings x fields) term frequencies of `term_id`, in posting order."""
+        if not self.fields:
+            raise ValueError("index was built without field statistics")
+        start = self.postings_offsets[term_id]
+        end = self.postings_offsets[term_id + 1]
+        leading = self.leading_field_tfs[start:end]
+        tfs = self.term_postings(term_id)[1]
+        return np.column_stack((leading, tfs - leading.sum(axis=1)))
+
+    def field_postings(self, term: str) -> tuple[np.ndarray, np.ndarray]:
+        """Doc ordinals and their (postings x fields) term frequencies for `term`."""
+        term_id = self.terms.find(term)
+        if term_id == -1:
+            if not self.fields:
+                raise ValueError("index was built without field statistics")
+            return np.empty(0, dtype=np.int32), np.empty((0, len(self.fields)), dtype=np.int32)
+        return self.term_postings(term_id)[0], self.term_field_tfs(term_id)
+
+    def all_postings(self) -> tuple[np.ndarray, np.ndarray]:
+        """Doc ordinals and term frequencies of every posting, in term order."""
+        if self.compressed is not None:
+            return self.compressed.decode_all()
+        return self.postings_docs, self.postings_tfs
+
+    def postings_nbytes(self) -> int:
+        """Bytes taken by doc ordinals and term frequencies (offsets excluded)."""
+        if self.compressed is not None:
+            return self.compressed.nbytes()
+        return self.postings_docs.nbytes + self.postings_tfs.nbytes
+
+    def term_positions(self, term_id: int) -> tuple[np.ndarray, np.ndarray]:
+        """Offsets (one per posting, plus an end) into the returned positions."""
+        if not self.has_positions:
+            raise ValueError("index was built without positions")
+        start = self.postings_offsets[term_id]
+        end = self.postings_offsets[term_id + 1]
+        offsets = self.sections["position_offsets"][start : end + 1]
+        return offsets - offsets[0], self.sections["positions"][offsets[0] : offsets[-1]]
+
+    def positions(self, term: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Doc ordinals, per-doc offsets into the positions array, and positions."""
+        term_id = self.terms.find(term)
+        if term_id == -1:
+            if not self.has_positions:
+                raise ValueError("index was built without positions")
+            return np.empty(0, dtype=np.int32), np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32)
+        offsets, positions = self.term_positions(term_id)
+        return self.term_postings(term_id)[0], offsets, positions
+
+    def surface_forms(self) -> dict[str, str]:
+        """Stem of every indexed surface word."""
+        if self.surface_terms is None:
+            raise ValueError("index was built without surface forms")
+        return {
+            word: self.terms[term_id]
+            for word, term_id in zip(self.surface_terms.decoded(), self.surface_term_ids.tolist())
+        }
+
+    def doc_freq(self, term: str) -> int:
+        term_id = self.terms.find(term)
+        if term_id == -1:
+            return 0
+        return int(self.postings_offsets[term_id + 1] - self.postings_offsets[term_id])
+
+    def idf(self, term: str) -> float | None:
+        term_id = self.terms.find(term)
+        if term_id == -1:
+            return None
+        return float(self.idfs[term_id])
+
+
+def unpack_sections(buffer: Any, kind: str) -> tuple[dict[str, Any], dict[str, np.ndarray]]:
+    """Parse the header of a packed file and view each section without copying."""
+    magic = bytes(buffer[: len(INDEX_MAGIC)])
+    if magic != INDEX_MAGIC:
+        raise ValueError("not a binary index file")
+    (header_length,) = struct.unpack_from("<I", buffer, len(INDEX_MAGIC))
+    header_start = len(INDEX_MAGIC) + 4
+    header = json.loads(bytes(buffer[header_start : header_start + header_length]))
+    if header["version"] != INDEX_VERSION:
+        raise ValueError(f"unsupported index version {header['version']}")
+    if header.get("kind", "index") != kind:
+        raise ValueError(f"expected a '{kind}' file, got '{header.get('kind')}'")
+
+    sections: dict[str, np.ndarray] = {}
+    for name, (dtype, offset, count) in header["sections"].items():
+        if count == 0:
+            sections[name] = np.empty(0, dtype=dtype)
+        else:
+            sections[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+    return header, sections
+
+
+def map_file(path: str) -> mmap.mmap:
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def encode_index(
+    index: dict[str, set[int]],
+    term_frequencies: dict[int, Counter],
+    doc_lengths: dict[int, int],
+    b: float = BM25_B,
+    positions: dict[int, dict[str, list[int]]] | None = None,
+    compress: bool = INDEX_COMPRESS_POSTINGS,
+    field_frequencies: dict[int, list[Counter]] | None = None,
+    fields: tuple[str, ...] = INDEX_FIELDS,
+    surface_forms: dict[str, str] | None = None,
+) -> bytes:
+    doc_ids = sorted(doc_lengths)
+    ordinals = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+    num_docs = len(doc_ids)
+
+    lengths = np.array([doc_lengths[doc_id] for doc_id in doc_ids], dtype=np.int32)
+    terms = sorted(index)
+
+    postings_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    postings_docs = []
+    postings_tfs = []
+    position_counts = []
+    all_positions = []
+    field_tfs = []
+    for i, term in enumerate(terms):
+        term_docs = sorted(ordinals[doc_id] for doc_id in index[term])
+        postings_docs.extend(term_docs)
+        postings_tfs.extend(term_frequencies[doc_ids[o]][term] for o in term_docs)
+        if positions is not None:
+            for o in term_docs:
+                doc_positions = positions[doc_ids[o]][term]
+                position_counts.append(len(doc_positions))
+                all_positions.extend(doc_positions)
+        if field_frequencies is not None:
+            for o in term_docs:
+                field_tfs.extend(counts[term] for counts in field_frequencies[doc_ids[o]][:-1])
+        postings_offsets[i + 1] = len(postings_docs)
+
+    position_offsets = None
+    if positions is not None:
+        position_offsets = np.zeros(len(postings_docs) + 1, dtype=np.int64)
+        np.cumsum(position_counts, out=position_offsets[1:])
+    field_lengths = None
+    if field_frequencies is not None:
+        field_lengths = np.array(
+            [[sum(counts.values()) for counts in field_frequencies[doc_id]] for doc_id in doc_ids],
+            dtype=np.int32,
+        ).reshape(num_docs, len(fields))
+    return pack_index(
+        np.array(doc_ids, dtype=np.int64),
+        lengths,
+        terms,
+        postings_offsets,
+        np.array(postings_docs, dtype=np.int32),
+        np.array(postings_tfs, dtype=np.int32),
+        b=b,
+        compress=compress,
+        position_offsets=position_offsets,
+        positions=np.array(all_positions, dtype=np.int32) if positions is not None else None,
+        field_lengths=field_lengths,
+        postings_field_tfs=np.array(field_tfs, dtype=np.int32) if field_frequencies is not None else None,
+        fields=fields,
+        surface_forms=surface_forms,
+    )
+
+
+def concat_indexes(
+    shards: list[MappedIndex], b: float = BM25_B, compress: bool = INDEX_COMPRESS_POSTINGS
+) -> bytes:
+    """One index over the documents of `shards`, which must not share doc ids.
+
+    The result is byte-for-byte what `encode_index` writes for all the
+    documents at once. Shard postings are relabelled to global doc ordinals
+    and term ids, then put in (term, doc) order with one sort, so the merge
+    stays in numpy instead of going back through per-document Counters.
+    Shards must be uncompressed; `compress` applies to the result.
+    """
+    doc_ids = np.concatenate([shard.doc_ids for shard in shards])
+    doc_order = np.argsort(doc_ids, kind="stable")
+    # Global ordinal of every shard document, in shard order.
+    global_ordinals = np.empty(len(doc_ids), dtype=np.int64)
+    global_ordinals[doc_order] = np.arange(len(doc_ids))
+
+    shard_terms = [shard.terms.decoded() for shard in shards]
+    terms = sorted(set().union(*shard_terms))
+    term_ids = {term: i for i, term in enumerate(terms)}
+
+    posting_terms = []
+    posting_docs = []
+    doc_base = 0
+    for shard, names in zip(shards, shard_terms):
+        if shard.compressed is not None:
+            raise ValueError("shards must be encoded without compression")
+        shard_term_ids = np.array([term_ids[term] for term in names], dtype=np.int64)
+        posting_terms.append(np.repeat(shard_term_ids, np.diff(shard.postings_offsets)))
+        posting_docs.append(global_ordinals[doc_base + shard.postings_docs.astype(np.int64)])
+        doc_base += shard.num_docs
+    posting_terms = np.concatenate(posting_terms)
+    posting_docs = np.concatenate(posting_docs)
+    order = np.lexsort((posting_docs, posting_terms))
+
+    postings_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(posting_terms, minlength=len(terms)), out=postings_offsets[1:])
+
+    position_offsets = None
+    positions = None
+    if all(shard.has_positions for shard in shards):
+        counts = np.concatenate([np.diff(shard.sections["position_offsets"]) for shard in shards])[order]
+        position_offsets = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(counts, out=position_offsets[1:])
+        # Where each posting's positions start in the concatenated shard positions.
+        starts = []
+        position_base = 0
+        for shard in shards:
+            starts.append(shard.sections["position_offsets"][:-1] + position_base)
+            position_base += len(shard.sections["positions"])
+        starts = np.concatenate(starts)[order]
+        gather = np.repeat(starts - position_offsets[:-1], counts) + np.arange(position_offsets[-1])
+        positions = np.concatenate([shard.sections["positions"] for shard in shards])[gather]
+
+    field_lengths = None
+    postings_field_tfs = None
+    fields = tuple(shards[0].fields) if shards else INDEX_FIELDS
+    if shards and all(shard.fields == list(fields) for shard in shards) and fields:
+        field_lengths = np.concatenate([shard.field_lengths for shard in shards])[doc_order]
+        postings_field_tfs = np.concatenate([shard.leading_field_tfs for shard in shards])[order].ravel()
+
+    surface_forms = None
+    if shards and all(shard.surface_terms is not None for shard in shards):
+        surface_forms = {}
+        for shard in shards:
+            surface_forms.update(shard.surface_forms())
+
+    return pack_index(
+        doc_ids[doc_order],
+        np.concatenate([shard.doc_lengths for shard in shards])[doc_order],
+        terms,
+        postings_offsets,
+        posting_docs[order].astype(np.int32),
+        np.concatenate([shard.postings_tfs for shard in shards])[order],
+        b=b,
+        compress=compress,
+        position_offsets=position_offsets,
+        positions=positions,
+        field_lengths=field_lengths,
+        postings_field_tfs=postings_field_tfs,
+        fields=fields,
+        surface_forms=surface_forms,
+    )
+
+
+def pack_index(
+    doc_ids: np.ndarray,
+    lengths: np.ndarray,
+    terms: list[str],
+    postings_offsets: np.ndarray,
+    postings_docs: np.ndarray,
+    postings_tfs: np.ndarray,
+    b: float = BM25_B,
+    compress: bool = INDEX_COMPRESS_POSTINGS,
+    position_offsets: np.ndarray | None = None,
+    positions: np.ndarray | None = None,
+    field_lengths: np.ndarray | None = None,
+    postings_field_tfs: np.ndarray | None = None,
+    fields: tuple[str, ...] = INDEX_FIELDS,
+    surface_forms: dict[str, str] | None = None,
+) -> bytes:
+    """Lay out postings already in (term, doc ordinal) order as an index file; stats are derived here.
+
+    `surface_forms` maps indexed words to their stems; words whose stem is
+    not among `terms` are dropped.
+    """
+    num_docs = len(doc_ids)
+    avg_doc_length = int(lengths.sum(dtype=np.int64)) / num_docs if num_docs else 0.0
+    term_offsets, term_blob = encode_term_dictionary(terms)
+    idfs = np.array(
+        [
+            math.log((num_docs - term_doc_count + 0.5) / (term_doc_count + 0.5) + 1)
+            for term_doc_count in np.diff(postings_offsets).tolist()
+        ],
+        dtype=np.float64,
+    )
+
+    sections = {
+        "doc_ids": doc_ids,
+        "doc_lengths": lengths,
+        "length_norms": compute_length_norms(lengths, avg_doc_length, b),
+        "term_offsets": term_offsets,
+        "terms": term_blob,
+        "idfs": idfs,
+        "postings_offsets": postings_offsets,
+    }
+    if compress:
+        sections.update(encode_postings(postings_offsets, postings_docs, postings_tfs))
+    else:
+        sections["postings_docs"] = postings_docs
+        sections["postings_tfs"] = postings_tfs
+    if positions is not None:
+        sections["position_offsets"] = position_offsets
+        sections["positions"] = positions
+    avg_field_lengths = []
+    if field_lengths is not None:
+        avg_field_lengths = (field_lengths.sum(axis=0) / num_docs if num_docs else np.zeros(len(fields))).tolist()
+        sections["doc_field_lengths"] = field_lengths.ravel()
+        sections["postings_field_tfs"] = postings_field_tfs
+    if surface_forms is not None:
+        term_ids = {term: i for i, term in enumerate(terms)}
+        words = sorted(word for word, stem in surface_forms.items() if stem in term_ids)
+        sections["surface_offsets"], sections["surface_terms"] = encode_term_dictionary(words)
+        sections["surface_term_ids"] = np.array([term_ids[surface_forms[word]] for word in words], dtype=np.int32)
+    metadata = {
+        "version": INDEX_VERSION,
+        "kind": "index",
+        "num_docs": num_docs,
+        "avg_doc_length": avg_doc_length,
+        "k1": BM25_K1,
+        "b": b,
+        "positions": positions is not None,
+        "postings_encoding": "bitpacked" if compress else "raw",
+        "block_size": POSTINGS_BLOCK_SIZE,
+        "fields": list(fields) if field_lengths is not None else [],
+        "avg_field_lengths": avg_field_lengths,
+    }
+    return pack_sections(metadata, sections)
+
+
+def compute_length_norms(lengths: np.ndarray, avg_doc_length: float, b: float = BM25_B) -> np.ndarray:
+    if avg_doc_length == 0:
+        return np.full(len(lengths), 1 - b, dtype=np.float64)
+    return 1 - b + (b * (lengths / avg_doc_length))
+
+
+def encode_term_dictionary(terms: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Offsets and UTF-8 blob for an already sorted list of terms."""
+    term_blobs = [term.encode("utf-8") for term in terms]
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum([len(blob) for blob in term_blobs], out=term_offsets[1:])
+    return term_offsets, np.frombuffer(b"".join(term_blobs), dtype=np.uint8)
+
+
+def pack_sections(metadata: dict[str, Any], sections: dict[str, np.ndarray]) -> bytes:
+    # Section offsets depend on the header length and the header lists the
+    # offsets, so lay out the sections against a header padded to a fixed size.
+    layout = {name: [array.dtype.str, 0, len(array)] for name, array in sections.items()}
+    header = json.dumps({**metadata, "sections": layout}).encode("utf-8")
+    header_length = len(header) + 64 + 24 * len(sections)
+    offset = _align(len(INDEX_MAGIC) + 4 + header_length)
+    for name, array in sections.items():
+        layout[name][1] = offset
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({**metadata, "sections": layout}).encode("utf-8")
+    header = header.ljust(header_length, b" ")
+
+    out = bytearray(offset)
+    out[: len(INDEX_MAGIC)] = INDEX_MAGIC
+    struct.pack_into("<I", out, len(INDEX_MAGIC), header_length)
+    out[len(INDEX_MAGIC) + 4 : len(INDEX_MAGIC) + 4 + header_length] = header
+    for name, array in sections.items():
+        start = layout[name][1]
+        out[start : start + array.nbytes] = array.tobytes()
+    return bytes(out)
+
+
+def write_index_file(path: str, data: bytes):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _align(offset: int) -> int:
+    return (offset + SECTION_ALIGNMENT - 1) // SECTION_ALIGNMENT * SECTION_ALIGNMENT
@@ -1,73 +1,147 @@
-import heapq
+import hashlib
+import json
 import math
 import os
-import pickle
 from collections import Counter, defaultdict
-from typing import Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Hashable, Iterable
+
+import numpy as np
 from custom_types import SearchResult
 
 from constants import (
+    AUTOCOMPLETE_LIMIT,
     BM25_B,
+    BM25_BLOCK_SIZE,
+    BM25F_B,
+    BM25F_WEIGHTS,
     BM25_K1,
-    CACHE_PATH,
+    BUILD_SHARDS_PER_WORKER,
     DEFAULT_SEARCH_LIMIT,
-    DOC_LENGTHS_CACHE_PATH,
-    DOCMAP_CACHE_PATH,
+    DOCSTORE_CACHE_PATH,
+    FUZZY_MAX_EXPANSIONS,
+    IMPACTS_CACHE_PATH,
     INDEX_CACHE_PATH,
-    TFREQ_CACHE_PATH,
+    INDEX_COMPRESS_POSTINGS,
+    INDEX_FIELDS,
+    INDEX_MAX_SEGMENTS,
+    INDEX_POSITIONS,
+    INDEX_SEGMENTS_PATH,
+    PROXIMITY_WINDOW,
 )
-from preprocessing import preprocess_text
+from preprocessing import get_analyzer, preprocess_text
 from search_utils import load_movies, format_search_result
+from .boolean_query import (
+    evaluate_boolean_query,
+    intersect_postings,
+    parse_boolean_query,
+    positive_terms,
+)
+from .doc_store import DocStore, encode_doc_store, encode_document
+from .impact_index import ImpactIndex, encode_impact_index
+from .impact_matrix import ImpactMatrix
+from .index_format import MappedIndex, compute_length_norms, concat_indexes, encode_index, write_index_file
+from .positional import phrase_matches, proximity_matches
+from .result_cache import ResultCache
+from .segments import (
+    SegmentedIndex,
+    allocate_segment,
+    load_manifest,
+    merge_segments,
+    new_manifest,
+    remove_unreferenced_segments,
+    save_manifest,
+    segment_path,
+)
+from .term_expansion import auto_max_edits, fuzzy_terms, prefix_range
+from .wand import PostingList
 
 
 class InvertedIndex:
     def __init__(self):
         self.index: dict[str, set[int]] = defaultdict(set)
-        self.docmap: dict[int, dict[Any, Any]] = {}
         self.term_frequencies: dict[int, Counter] = {}
         self.doc_lengths: dict[int, int] = {}
-
-    def __add_document(self, doc_id: int, text: str):
+        self.positions: dict[int, dict[str, list[int]]] = {}
+        self.field_frequencies: dict[int, list[Counter]] = {}
+        self.reader: MappedIndex | SegmentedIndex | None = None
+        self.segments: list[MappedIndex] = []
+        self.manifest: dict[str, Any] | None = None
+        self.posting_lists: dict[str, PostingList] = {}
+        self.__impact_matrix: ImpactMatrix | None = None
+        self.__impact_index: ImpactIndex | None = None
+        self.__field_length_norms: np.ndarray | None = None
+        self.__generation = 0
+        self.result_cache = ResultCache()
+        # Documents by id: a dict after `build`, the memory-mapped store after `load`.
+        self.__docmap: dict[int, dict[Any, Any]] | DocStore | None = {}
+
+    @property
+    def docmap(self) -> dict[int, dict[Any, Any]] | DocStore:
+        if self.__docmap is None:
+            self.__docmap = DocStore.open(DOCSTORE_CACHE_PATH)
+        return self.__docmap
+
+    def __add_document(
+        self,
+        doc_id: int,
+        doc_length: int,
+        counts: Counter,
+        positions: dict[str, list[int]] | None = None,
+        field_counts: list[Counter] | None = None,
+    ):
         if doc_id not in self.term_frequencies:
             self.term_frequencies[doc_id] = Counter()
-        tokens = preprocess_text(text)
-        self.doc_lengths[doc_id] = len(tokens)
-        for token in set(tokens):
+        self.doc_lengths[doc_id] = doc_length
+        if positions is not None:
+            self.positions[doc_id] = positions
+        if field_counts is not None:
+            self.field_frequencies[doc_id] = field_counts
+        for token in counts:
             if token in self.index:
                 self.index[token].add(doc_id)
             else:
                 self.index[token] = set((doc_id,))
-        self.term_frequencies[doc_id].update(tokens)
-
-    def __get_avg_doc_length(self) -> float:
-        if len(self.doc_lengths) == 0:
-            return 0.0
+        self.term_frequencies[doc_id].update(counts)
 
-        total_doc_length = 0
-        for doc_id in self.doc_lengths:
-            total_doc_length += self.doc_lengths[doc_id]
+    def __get_reader(self) -> MappedIndex | SegmentedIndex:
+        if self.reader is None:
+            raise ValueError("No index loaded. Call `build` or `load` first")
+        return self.reader
 
-        return total_doc_length / len(self.doc_lengths)
+    def __get_length_norm(self, doc_length: int, b=BM25_B) -> float:
+        avg_doc_length = self.__get_reader().avg_doc_length
+        if avg_doc_length == 0:
+            return 1 - b
+        return 1 - b + (b * (doc_length / avg_doc_length))
 
     def get_documents(self, term: str) -> list[int]:
         token = term.lower()
-        doc_ids = self.index.get(token, set())
-        return sorted(list(doc_ids))
+        reader = self.__get_reader()
+        doc_ordinals, _ = reader.postings(token)
+        return sorted(reader.doc_ids[doc_ordinals].tolist())
 
     def get_tf(self, doc_id: int, term: str):
         token = preprocess_text(term)
         if len(token) > 1:
             raise Exception("token is more than 1")
 
-        return self.term_frequencies[doc_id][token[0]]
+        reader = self.__get_reader()
+        ordinal = reader.ordinal(doc_id)
+        doc_ordinals, tfs = reader.postings(token[0])
+        pos = int(np.searchsorted(doc_ordinals, ordinal))
+        if pos < len(doc_ordinals) and doc_ordinals[pos] == ordinal:
+            return int(tfs[pos])
+        return 0
 
     def get_idf(self, term: str) -> float:
         tokens = preprocess_text(term)
         if len(tokens) != 1:
             raise ValueError("term must be a single token")
         token = tokens[0]
-        doc_count = len(self.docmap)
-        term_doc_count = len(self.index[token])
+        reader = self.__get_reader()
+        doc_count = reader.num_docs
+        term_doc_count = reader.doc_freq(token)
         return math.log((doc_count + 1) / (term_doc_count + 1))
 
     def get_tfidf(self, doc_id: int, term: str) -> float:
@@ -85,15 +159,19 @@ class InvertedIndex:
         if len(tokens) != 1:
             raise ValueError("term must be a single token")
         token = tokens[0]
-        doc_count = len(self.docmap)
-        term_doc_count = len(self.index[token])
+        reader = self.__get_reader()
+        doc_count = reader.num_docs
+        term_doc_count = reader.doc_freq(token)
         return math.log((doc_count - term_doc_count + 0.5) / (term_doc_count + 0.5) + 1)
 
     def get_bm25_tf(self, doc_id: int, term: str, k1=BM25_K1, b=BM25_B) -> float:
         tf = self.get_tf(doc_id, term)
-        doc_length = self.doc_lengths[doc_id]
-        avg_doc_length = self.__get_avg_doc_length()
-        length_norm = 1 - b + (b * (doc_length / avg_doc_length))
+        reader = self.__get_reader()
+        ordinal = reader.ordinal(doc_id)
+        if b == BM25_B:
+            length_norm = float(reader.length_norms[ordinal])
+        else:
+            length_norm = self.__get_length_norm(int(reader.doc_lengths[ordinal]), b)
         return (tf * (k1 + 1)) / (tf + k1 * length_norm)
 
     def bm25(self, doc_id: int, term: str):
@@ -101,23 +179,351 @@ class InvertedIndex:
         idf = self.get_bm25_idf(term)
         return tf * idf
 
-    def bm25_search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[SearchResult]:
+    def __term_scores(self, token: str, idf: float | None = None) -> tuple[np.ndarray, np.ndarray] | None:
+        reader = self.__get_reader()
+        if idf is None:
+            idf = reader.idf(token)
+        if idf is None:
+            return None
+        doc_ordinals, tfs = reader.postings(token)
+        length_norms = reader.length_norms[doc_ordinals]
+        return doc_ordinals, (tfs * (BM25_K1 + 1)) / (tfs + BM25_K1 * length_norms) * idf
+
+    def get_posting_list(self, token: str) -> PostingList:
+        """Block-max posting list of `token`, for the reference `block_max_wand`."""
+        if token not in self.posting_lists:
+            term_scores = self.__term_scores(token)
+            if term_scores is None:
+                self.posting_lists[token] = PostingList([], [], BM25_BLOCK_SIZE)
+            else:
+                doc_ordinals, scores = term_scores
+                self.posting_lists[token] = PostingList(
+                    doc_ordinals.tolist(), scores.tolist(), BM25_BLOCK_SIZE
+                )
+        return self.posting_lists[token]
+
+    def __taat_top_k(
+        self, tokens: list[str], limit: int, candidates: np.ndarray | None = None
+    ) -> list[tuple[int, float]]:
+        scores = np.zeros(len(self.__get_reader().doc_ids), dtype=np.float64)
+        for token in tokens:
+            term_scores = self.__term_scores(token)
+            if term_scores is None:
+                continue
+            doc_ordinals, term_scores = term_scores
+            scores[doc_ordinals] += term_scores
+        if candidates is not None:
+            restricted = np.zeros_like(scores)
+            restricted[candidates] = scores[candidates]
+            scores = restricted
+
+        return top_k_scores(scores, limit, self.__get_reader().doc_ids)
+
+    def bm25_search(
+        self,
+        query: str,
+        limit: int = DEFAULT_SEARCH_LIMIT,
+        candidates: np.ndarray | None = None,
+    ) -> list[SearchResult]:
+        """Top `limit` documents by BM25.
+
+        `candidates` restricts results to those ordinals (e.g. phrase
+        matches).
+        """
         tokens = preprocess_text(query)
-        scores = {}
-        for doc_id in self.docmap:
-            for token in tokens:
-                bm25 = self.bm25(doc_id, token)
-                if doc_id in scores:
-                    scores[doc_id] += bm25
-                else:
-                    scores[doc_id] = bm25
-
-        sorted_scores = dict(heapq.nlargest(limit, scores.items(), key=lambda x: x[1]))
+        key = ("bm25", tuple(tokens), limit, candidates_key(candidates))
+        top_k = self.result_cache.get_or_compute(
+            key, self.index_version(), lambda: self.__taat_top_k(tokens, limit, candidates)
+        )
+        return self.__format_results(top_k)
+
+    def impact_matrix(self) -> ImpactMatrix:
+        """Precomputed BM25 impact matrix, built on first use."""
+        if self.__impact_matrix is None:
+            self.__impact_matrix = ImpactMatrix.from_reader(self.__get_reader())
+        return self.__impact_matrix
+
+    def bm25f_search(
+        self,
+        query: str,
+        limit: int = DEFAULT_SEARCH_LIMIT,
+        weights: dict[str, float] | None = None,
+        candidates: np.ndarray | None = None,
+    ) -> list[SearchResult]:
+        """Top `limit` documents by BM25F over the indexed fields.
+
+        Each field's term frequency is length-normalised with that field's
+        own b and average length, weighted, and summed into one pseudo term
+        frequency before BM25 saturation, so a term counts once per document
+        however many fields it appears in. All fields of a posting are read
+        together, in one pass over the merged postings of each query term.
+        """
+        reader = self.__get_reader()
+        if not reader.fields:
+            raise ValueError("index was built without field statistics")
+        weights = {**BM25F_WEIGHTS, **(weights or {})}
+        unknown = set(weights) - set(reader.fields)
+        if unknown:
+            raise ValueError(f"unknown fields {sorted(unknown)}, expected some of {reader.fields}")
+        field_weights = np.array([weights[field] for field in reader.fields], dtype=np.float64)
+        tokens = preprocess_text(query)
+        key = ("bm25f", tuple(tokens), limit, tuple(field_weights.tolist()), candidates_key(candidates))
+        top_k = self.result_cache.get_or_compute(
+            key, self.index_version(), lambda: self.__bm25f_top_k(tokens, limit, field_weights, candidates)
+        )
+        return self.__format_results(top_k)
+
+    def __bm25f_top_k(
+        self, tokens: list[str], limit: int, field_weights: np.ndarray, candidates: np.ndarray | None
+    ) -> list[tuple[int, float]]:
+        reader = self.__get_reader()
+        norms = self.__get_field_length_norms()
+        scores = np.zeros(len(reader.doc_ids), dtype=np.float64)
+        for token in tokens:
+            idf = reader.idf(token)
+            if idf is None:
+                continue
+            doc_ordinals, field_tfs = reader.field_postings(token)
+            pseudo_tfs = (field_tfs * field_weights / norms[doc_ordinals]).sum(axis=1)
+            scores[doc_ordinals] += (pseudo_tfs * (BM25_K1 + 1)) / (pseudo_tfs + BM25_K1) * idf
+        if candidates is not None:
+            restricted = np.zeros_like(scores)
+            restricted[candidates] = scores[candidates]
+            scores = restricted
+        return top_k_scores(scores, limit, reader.doc_ids)
+
+    def __get_field_length_norms(self) -> np.ndarray:
+        """(documents x fields) BM25F length normalisation, using BM25F_B per field."""
+        if self.__field_length_norms is None:
+            reader = self.__get_reader()
+            self.__field_length_norms = np.column_stack([
+                compute_length_norms(reader.field_lengths[:, i], reader.avg_field_lengths[i], BM25F_B[field])
+                for i, field in enumerate(reader.fields)
+            ])
+        return self.__field_length_norms
+
+    def __expansion_doc_freqs(self, segment_term_ids: list[np.ndarray]) -> Counter:
+        """Document frequency of each term, given its ids in every segment.
+
+        Frequencies come straight from the postings offsets; only when some
+        documents are deleted are they recounted over live postings.
+        """
+        doc_freqs = Counter()
+        for segment, term_ids in zip(self.segments, segment_term_ids):
+            counts = segment.postings_offsets[term_ids + 1] - segment.postings_offsets[term_ids]
+            for term_id, count in zip(term_ids.tolist(), counts.tolist()):
+                doc_freqs[segment.terms[term_id]] += count
+        reader = self.__get_reader()
+        if isinstance(reader, SegmentedIndex) and not reader.live.all():
+            doc_freqs = Counter({term: reader.doc_freq(term) for term in doc_freqs})
+        return +doc_freqs
+
+    def complete(self, prefix: str, limit: int = AUTOCOMPLETE_LIMIT) -> list[tuple[str, int]]:
+        """Indexed words starting with `prefix` and their document frequencies, most frequent first.
+
+        Words are matched and returned as written (lowercased, before
+        stemming). A word's frequency is that of its stem, the term it
+        matches once it is analyzed as a query.
+        """
+        self.__get_reader()
+        words = get_analyzer().split(prefix)
+        prefix = words[-1] if words else ""
+        stems = {}
+        term_ids = []
+        for segment in self.segments:
+            if segment.surface_terms is None:
+                # Indexes written without surface forms can only complete to stems.
+                start, end = prefix_range(segment.terms, prefix)
+                ids = np.arange(start, end)
+                stems.update((segment.terms[i], segment.terms[i]) for i in range(start, end))
+            else:
+                start, end = prefix_range(segment.surface_terms, prefix)
+                ids = np.unique(segment.surface_term_ids[start:end].astype(np.int64))
+                for i in range(start, end):
+                    stems[segment.surface_terms[i]] = segment.terms[int(segment.surface_term_ids[i])]
+            term_ids.append(ids)
+        doc_freqs = self.__expansion_doc_freqs(term_ids)
+        completions = [(word, doc_freqs[stem]) for word, stem in stems.items() if stem in doc_freqs]
+        return sorted(completions, key=lambda x: (-x[1], x[0]))[:limit]
+
+    def expand_fuzzy(
+        self, term: str, max_edits: int | None = None, limit: int = FUZZY_MAX_EXPANSIONS
+    ) -> list[tuple[str, int, int]]:
+        """Indexed terms within `max_edits` edits of `term`, closest then most frequent first.
+
+        `term` is analyzed like the indexed text, so its stem is compared with
+        the indexed stems and a correctly spelled word matches at distance 0.
+        Returns (term, edit distance, document frequency); `max_edits`
+        defaults to `auto_max_edits` of the stem.
+        """
+        tokens = preprocess_text(term)
+        if len(tokens) > 1:
+            raise ValueError("term must be a single token")
+        if not tokens:
+            return []
+        return self.__expand_token(tokens[0], max_edits, limit)
+
+    def __expand_token(
+        self, term: str, max_edits: int | None = None, limit: int = FUZZY_MAX_EXPANSIONS
+    ) -> list[tuple[str, int, int]]:
+        """`expand_fuzzy` for an already analyzed token."""
+        self.__get_reader()
+        if max_edits is None:
+            max_edits = auto_max_edits(term)
+        distances = {}
+        term_ids = []
+        for segment in self.segments:
+            matches = fuzzy_terms(segment.terms, term, max_edits)
+            term_ids.append(np.array([term_id for term_id, _ in matches], dtype=np.int64))
+            for term_id, distance in matches:
+                distances[segment.terms[term_id]] = distance
+        doc_freqs = self.__expansion_doc_freqs(term_ids)
+        expansions = [(expansion, distances[expansion], doc_freq) for expansion, doc_freq in doc_freqs.items()]
+        return sorted(expansions, key=lambda x: (x[1], -x[2], x[0]))[:limit]
+
+    def fuzzy_search(
+        self,
+        query: str,
+        limit: int = DEFAULT_SEARCH_LIMIT,
+        max_edits: int | None = None,
+        candidates: np.ndarray | None = None,
+    ) -> list[SearchResult]:
+        """BM25 where every query term also matches indexed terms a few edits away.
+
+        All variants of a query term share the IDF of the most frequent one,
+        so a rare misspelling cannot outscore the intended word. A variant at
+        distance `d` scores its BM25 times `1 - d / min(len)` of the two
+        terms, and each document keeps only its best variant per query term,
+        so a typo costs some score but never counts twice.
+        """
+        tokens = preprocess_text(query)
+        key = ("fuzzy", tuple(tokens), limit, max_edits, candidates_key(candidates))
+        top_k = self.result_cache.get_or_compute(
+            key, self.index_version(), lambda: self.__fuzzy_top_k(tokens, limit, max_edits, candidates)
+        )
+        return self.__format_results(top_k)
+
+    def __fuzzy_top_k(
+        self, tokens: list[str], limit: int, max_edits: int | None, candidates: np.ndarray | None
+    ) -> list[tuple[int, float]]:
+        scores = np.zeros(len(self.__get_reader().doc_ids), dtype=np.float64)
+        reader = self.__get_reader()
+        for token in tokens:
+            expansions = self.__expand_token(token, max_edits)
+            if not expansions:
+                continue
+            idf = reader.idf(max(expansions, key=lambda x: x[2])[0])
+            best = np.zeros_like(scores)
+            for expansion, distance, _ in expansions:
+                weight = 1 - distance / min(len(token), len(expansion))
+                term_scores = self.__term_scores(expansion, idf)
+                if weight <= 0 or term_scores is None:
+                    continue
+                doc_ordinals, term_scores = term_scores
+                best[doc_ordinals] = np.maximum(best[doc_ordinals], weight * term_scores)
+            scores += best
+        if candidates is not None:
+            restricted = np.zeros_like(scores)
+            restricted[candidates] = scores[candidates]
+            scores = restricted
+        return top_k_scores(scores, limit, reader.doc_ids)
+
+    def live_ordinals(self) -> np.ndarray:
+        reader = self.__get_reader()
+        if isinstance(reader, SegmentedIndex):
+            return np.flatnonzero(reader.live)
+        return np.arange(reader.num_docs, dtype=np.int64)
+
+    def match_terms(self, text: str) -> np.ndarray | None:
+        """Ordinals containing every token of `text`, or None if none are indexable."""
+        tokens = preprocess_text(text)
+        if not tokens:
+            return None
+        reader = self.__get_reader()
+        return intersect_postings([reader.postings(token)[0] for token in tokens])
+
+    def match_boolean(self, query: str) -> np.ndarray:
+        """Ordinals matching a boolean query, e.g. `batman AND (joker OR "two face") NOT robin`."""
+        return evaluate_boolean_query(parse_boolean_query(query), self)
+
+    def boolean_search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[SearchResult]:
+        """BM25 over the terms outside any NOT, restricted to boolean matches."""
+        node = parse_boolean_query(query)
+        terms = positive_terms(node)
+        if not terms:
+            raise ValueError("boolean query needs at least one term outside NOT to rank by")
+        candidates = evaluate_boolean_query(node, self)
+        return self.bm25_search(" ".join(terms), limit, candidates=candidates)
+
+    def match_phrase(self, phrase: str) -> np.ndarray:
+        """Ordinals of documents containing `phrase` as consecutive tokens.
+
+        Stopwords are not indexed but keep their positions, so they match as
+        gaps of the same width.
+        """
+        tokens, positions = get_analyzer().analyze_positions(phrase)
+        if not tokens:
+            return np.empty(0, dtype=np.int64)
+        reader = self.__get_reader()
+        offsets = [position - positions[0] for position in positions]
+        return phrase_matches([reader.positions(token) for token in tokens], offsets)
+
+    def match_proximity(self, query: str, window: int = PROXIMITY_WINDOW) -> np.ndarray:
+        """Ordinals of documents with every query term inside `window` positions."""
+        tokens = list(dict.fromkeys(preprocess_text(query)))
+        if not tokens:
+            return np.empty(0, dtype=np.int64)
+        reader = self.__get_reader()
+        return proximity_matches([reader.positions(token) for token in tokens], window)
+
+    def impact_index(self) -> ImpactIndex:
+        """Quantized impact-ordered index, reusing the cached file while it is current."""
+        if self.__impact_index is None:
+            source = self.__source_fingerprint()
+            if source is not None and os.path.exists(IMPACTS_CACHE_PATH):
+                impacts = ImpactIndex.open(IMPACTS_CACHE_PATH)
+                if impacts.is_current(source):
+                    self.__impact_index = impacts
+            if self.__impact_index is None:
+                self.__impact_index = self.build_impact_index()
+        return self.__impact_index
+
+    def build_impact_index(self) -> ImpactIndex:
+        """(Re)quantize impacts with the current BM25_K1 and BM25_B."""
+        source = self.__source_fingerprint()
+        data = encode_impact_index(self.impact_matrix(), source)
+        if source is not None:
+            write_index_file(IMPACTS_CACHE_PATH, data)
+        self.__impact_index = ImpactIndex(data)
+        return self.__impact_index
+
+    def index_version(self) -> Hashable:
+        """Changes whenever the searchable contents change; keys the result cache."""
+        source = self.__source_fingerprint()
+        return source if source is not None else ("build", self.__generation)
+
+    def __source_fingerprint(self) -> str | None:
+        # Saved segments are immutable, so their names and tombstones identify the contents.
+        if self.manifest is None:
+            return None
+        return json.dumps(self.manifest["segments"], sort_keys=True)
+
+    def bm25_search_many(
+        self, queries: list[str], limit: int = DEFAULT_SEARCH_LIMIT
+    ) -> list[list[SearchResult]]:
+        """Score a batch of queries with one sparse product per slice of queries."""
+        token_lists = get_analyzer().analyze_many(queries)
+        results = []
+        for _, scores in self.impact_matrix().score_batches(token_lists):
+            for top_k in top_k_rows(scores, limit, self.__get_reader().doc_ids):
+                results.append(self.__format_results(top_k))
+        return results
 
+    def __format_results(self, top_k: list[tuple[int, float]]) -> list[SearchResult]:
+        doc_ids = self.__get_reader().doc_ids
         results: list[SearchResult] = []
-        for doc_id in sorted_scores:
-            doc = self.docmap[doc_id]
-            score = sorted_scores[doc_id]
+        for ordinal, score in top_k:
+            doc = self.docmap[int(doc_ids[ordinal])]
             formatted_result = format_search_result(
                 doc_id=doc['id'],
                 title=doc['title'],
@@ -128,59 +534,316 @@ class InvertedIndex:
 
         return results
 
-    def build(self):
-        movies = load_movies()
-        for movie in movies:
-            input_text = f"{movie['title']} {movie['description']}"
-            self.docmap[movie["id"]] = movie
-            self.__add_document(movie["id"], input_text)
+    def build(
+        self,
+        documents: list[dict[Any, Any]] | None = None,
+        workers: int = 1,
+        positions: bool = INDEX_POSITIONS,
+        compress: bool = INDEX_COMPRESS_POSTINGS,
+    ):
+        movies = documents if documents is not None else load_movies()
+        # A rebuild replaces the whole corpus: the docmap and everything
+        # indexed from it start over together.
+        self.index = defaultdict(set)
+        self.term_frequencies = {}
+        self.doc_lengths = {}
+        self.positions = {}
+        self.field_frequencies = {}
+        self.__docmap = {}
+        if workers > 1 and len(movies) > 1:
+            # Postings only exist in the encoded index here; the in-memory
+            # structures above are filled by the serial build.
+            for movie in movies:
+                self.__docmap[movie["id"]] = movie
+            self.reader = MappedIndex(build_index_parallel(movies, workers, positions, compress))
+        else:
+            for movie, (doc_id, doc_length, counts, term_positions, field_counts) in zip(
+                movies, analyze_shard(movies, positions)
+            ):
+                self.__docmap[movie["id"]] = movie
+                self.__add_document(doc_id, doc_length, counts, term_positions, field_counts)
+            self.reader = MappedIndex(
+                encode_index(
+                    self.index,
+                    self.term_frequencies,
+                    self.doc_lengths,
+                    positions=self.positions if positions else None,
+                    compress=compress,
+                    field_frequencies=self.field_frequencies,
+                    surface_forms=surface_forms(movies),
+                )
+            )
+        self.segments = [self.reader]
+        self.manifest = None
+        self.__generation += 1
+        self.posting_lists = {}
+        self.__impact_matrix = None
+        self.__impact_index = None
+        self.__field_length_norms = None
 
     def save(self):
-        if not os.path.exists(CACHE_PATH):
-            os.makedirs(CACHE_PATH)
-        with open(INDEX_CACHE_PATH, "wb") as idx_cache:
-            pickle.dump(self.index, idx_cache)
-        with open(DOCMAP_CACHE_PATH, "wb") as docmap_cache:
-            pickle.dump(self.docmap, docmap_cache)
-        with open(TFREQ_CACHE_PATH, "wb") as tfreq_cache:
-            pickle.dump(self.term_frequencies, tfreq_cache)
-        with open(DOC_LENGTHS_CACHE_PATH, "wb") as doc_len_cache:
-            pickle.dump(self.doc_lengths, doc_len_cache)
-
-        idx_cache.close()
-        docmap_cache.close()
-        tfreq_cache.close()
-        doc_len_cache.close()
+        if not os.path.exists(INDEX_SEGMENTS_PATH):
+            os.makedirs(INDEX_SEGMENTS_PATH)
+        reader = self.__get_reader()
+        data = reader.buffer if isinstance(reader, MappedIndex) else merge_segments(reader)
+
+        manifest = load_manifest() if os.path.exists(INDEX_CACHE_PATH) else new_manifest()
+        name = allocate_segment(manifest)
+        write_index_file(segment_path(name), data)
+        manifest["segments"] = [{"name": name, "tombstones": []}]
+        self.manifest = manifest
+        self.__commit()
+        remove_unreferenced_segments(manifest)
 
     def load(self):
-        if (
-            not os.path.exists(INDEX_CACHE_PATH)
-            or not os.path.exists(DOCMAP_CACHE_PATH)
-            or not os.path.exists(TFREQ_CACHE_PATH)
-            or not os.path.exists(DOC_LENGTHS_CACHE_PATH)
-        ):
+        if not os.path.exists(INDEX_CACHE_PATH) or not os.path.exists(DOCSTORE_CACHE_PATH):
             raise FileNotFoundError("File not found on cache")
 
-        with open(INDEX_CACHE_PATH, "rb") as idx_cache:
-            self.index = pickle.load(idx_cache)
-        with open(DOCMAP_CACHE_PATH, "rb") as docmap_cache:
-            self.docmap = pickle.load(docmap_cache)
-        with open(TFREQ_CACHE_PATH, "rb") as tfreq_cache:
-            self.term_frequencies = pickle.load(tfreq_cache)
-        with open(DOC_LENGTHS_CACHE_PATH, "rb") as doc_len_cache:
-            self.doc_lengths = pickle.load(doc_len_cache)
-
-        idx_cache.close()
-        docmap_cache.close()
-        tfreq_cache.close()
-        doc_len_cache.close()
-
-def build_command():
+        self.manifest = load_manifest()
+        segments = self.manifest["segments"]
+        self.segments = [MappedIndex.open(segment_path(segment["name"])) for segment in segments]
+        tombstones = [segment["tombstones"] for segment in segments]
+        if len(self.segments) == 1 and not tombstones[0]:
+            self.reader = self.segments[0]
+        else:
+            self.reader = SegmentedIndex(self.segments, tombstones)
+        self.posting_lists = {}
+        self.__impact_matrix = None
+        self.__impact_index = None
+        self.__field_length_norms = None
+        self.__docmap = None
+
+    def __commit(self, updated: Iterable[dict[Any, Any]] = (), deleted: Iterable[int] = ()):
+        docmap = self.docmap
+        if isinstance(docmap, DocStore):
+            # Unchanged documents are copied as stored, without decoding them.
+            records = dict(docmap.records())
+        else:
+            records = {doc_id: encode_document(document) for doc_id, document in docmap.items()}
+        for document in updated:
+            records[document["id"]] = encode_document(document)
+        for doc_id in deleted:
+            records.pop(doc_id, None)
+        write_index_file(DOCSTORE_CACHE_PATH, encode_doc_store(records.items()))
+        save_manifest(self.manifest)
+        self.load()
+
+    def __tombstone(self, doc_ids: list[int]) -> int:
+        if self.manifest is None:
+            raise ValueError("No index loaded. Call `load` first")
+        deleted = 0
+        for segment, entry in zip(self.segments, self.manifest["segments"]):
+            tombstones = set(entry["tombstones"])
+            for doc_id in doc_ids:
+                if doc_id in tombstones:
+                    continue
+                try:
+                    segment.ordinal(doc_id)
+                except KeyError:
+                    continue
+                tombstones.add(doc_id)
+                deleted += 1
+            entry["tombstones"] = sorted(tombstones)
+        return deleted
+
+    def add_documents(self, documents: list[dict[Any, Any]]):
+        """Index `documents` into a new segment, replacing any with the same id."""
+        if not documents:
+            return
+        segment = InvertedIndex()
+        segment.build(
+            documents,
+            positions=self.__get_reader().has_positions,
+            compress=all(existing.compressed is not None for existing in self.segments),
+        )
+        self.__tombstone([document["id"] for document in documents])
+
+        name = allocate_segment(self.manifest)
+        write_index_file(segment_path(name), segment.reader.buffer)
+        self.manifest["segments"].append({"name": name, "tombstones": []})
+        self.__commit(updated=documents)
+
+        if len(self.manifest["segments"]) > INDEX_MAX_SEGMENTS:
+            self.merge()
+
+    def delete_documents(self, doc_ids: list[int]) -> int:
+        deleted = self.__tombstone(doc_ids)
+        self.__commit(deleted=doc_ids)
+        return deleted
+
+    def merge(self):
+        """Compact all segments into one, dropping deleted documents."""
+        if self.manifest is None:
+            raise ValueError("No index loaded. Call `load` first")
+        segments = self.manifest["segments"]
+        if len(segments) <= 1 and not any(segment["tombstones"] for segment in segments):
+            return
+        reader = SegmentedIndex(self.segments, [segment["tombstones"] for segment in segments])
+        name = allocate_segment(self.manifest)
+        write_index_file(segment_path(name), merge_segments(reader))
+        self.manifest["segments"] = [{"name": name, "tombstones": []}]
+        self.__commit()
+        remove_unreferenced_segments(self.manifest)
+
+
+def analyze_shard(
+    movies: list[dict[Any, Any]], positions: bool = False
+) -> list[tuple[int, int, Counter, dict[str, list[int]] | None, list[Counter]]]:
+    """(id, length, term counts, term positions, per-field term counts) per movie.
+
+    Movies are analyzed as their INDEX_FIELDS joined by spaces, which splits
+    exactly like analyzing each field on its own, so only the leading fields
+    are analyzed again and the last field's counts are the remainder.
+    """
+    analyzer = get_analyzer()
+    texts = [" ".join(movie[field] for field in INDEX_FIELDS) for movie in movies]
+    leading_fields = [
+        analyzer.analyze_many(movie[field] for movie in movies) for field in INDEX_FIELDS[:-1]
+    ]
+
+    analyzed = []
+    for i, (movie, text) in enumerate(zip(movies, texts)):
+        term_positions = None
+        if positions:
+            tokens, token_positions = analyzer.analyze_positions(text)
+            term_positions = defaultdict(list)
+            for token, position in zip(tokens, token_positions):
+                term_positions[token].append(position)
+            term_positions = dict(term_positions)
+        else:
+            tokens = analyzer.analyze(text)
+        counts = Counter(tokens)
+        field_counts = [Counter(field_tokens[i]) for field_tokens in leading_fields]
+        field_counts.append(counts - sum(field_counts, Counter()))
+        analyzed.append((movie["id"], len(tokens), counts, term_positions, field_counts))
+    return analyzed
+
+
+def surface_forms(movies: list[dict[Any, Any]]) -> dict[str, str]:
+    """Stem of every distinct indexed word of `movies`, as written before stemming."""
+    analyzer = get_analyzer()
+    words = set()
+    for movie in movies:
+        words.update(analyzer.surface_tokens(" ".join(movie[field] for field in INDEX_FIELDS)))
+    if not analyzer.stemming:
+        return {word: word for word in words}
+    return {word: analyzer.stem(word) for word in words}
+
+
+def build_shard(movies: list[dict[Any, Any]], positions: bool = False) -> bytes:
+    """Uncompressed index file over `movies` alone, for `concat_indexes`."""
+    segment = InvertedIndex()
+    segment.build(movies, positions=positions, compress=False)
+    return segment.reader.buffer
+
+
+def build_index_parallel(
+    movies: list[dict[Any, Any]],
+    workers: int,
+    positions: bool = False,
+    compress: bool = INDEX_COMPRESS_POSTINGS,
+) -> bytes:
+    """Index `movies` across a process pool; the result equals the serial build byte for byte.
+
+    Movies are split into contiguous shards (several per worker to even out
+    stragglers). Each worker analyzes its shard and encodes it as a complete
+    index, so the tokenizing and the per-term postings work both happen in
+    parallel. The parent only merges the shard postings (`concat_indexes`).
+    """
+    shard_count = workers * BUILD_SHARDS_PER_WORKER
+    shard_size = max(1, math.ceil(len(movies) / shard_count))
+    shards = [movies[i : i + shard_size] for i in range(0, len(movies), shard_size)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        encoded = list(executor.map(build_shard, shards, [positions] * len(shards)))
+    return concat_indexes([MappedIndex(data) for data in encoded], compress=compress)
+
+
+def candidates_key(candidates: np.ndarray | None) -> bytes | None:
+    if candidates is None:
+        return None
+    return hashlib.blake2b(np.ascontiguousarray(candidates, dtype=np.int64).tobytes(), digest_size=16).digest()
+
+
+def top_k_scores(scores: np.ndarray, limit: int, doc_ids: np.ndarray) -> list[tuple[int, float]]:
+    """Highest positive scores as (ordinal, score), ties broken by lower doc id.
+
+    `doc_ids` maps ordinals to doc ids. A segmented index numbers documents
+    by segment, so ordinal order would rank ties differently before and
+    after a merge.
+    """
+    candidates = np.flatnonzero(scores > 0)
+    if limit <= 0 or len(candidates) == 0:
+        return []
+    if len(candidates) > limit:
+        kth = np.argpartition(-scores[candidates], limit - 1)[:limit]
+        cutoff = scores[candidates[kth]].min()
+        candidates = candidates[scores[candidates] >= cutoff]
+    order = np.lexsort((doc_ids[candidates], -scores[candidates]))[:limit]
+    return [(int(candidates[i]), float(scores[candidates[i]])) for i in order]
+
+
+def top_k_rows(scores: np.ndarray, limit: int, doc_ids: np.ndarray) -> list[list[tuple[int, float]]]:
+    """`top_k_scores` for every row of a (queries x documents) score matrix.
+
+    One row-wise argpartition covers the common case; rows whose cutoff score
+    is tied with unselected documents fall back to `top_k_scores` so the
+    lower-doc-id tie-break is preserved.
+    """
+    num_rows, num_docs = scores.shape
+    if limit <= 0 or num_docs == 0:
+        return [[] for _ in range(num_rows)]
+    if num_docs <= limit:
+        return [top_k_scores(row, limit, doc_ids) for row in scores]
+
+    selected = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+    selected_scores = np.take_along_axis(scores, selected, axis=1)
+    cutoffs = selected_scores.min(axis=1)
+    tied = (scores >= cutoffs[:, None]).sum(axis=1) > limit
+    order = np.lexsort((doc_ids[selected], -selected_scores), axis=1)
+    selected = np.take_along_axis(selected, order, axis=1)
+    selected_scores = np.take_along_axis(selected_scores, order, axis=1)
+
+    results = []
+    for row in range(num_rows):
+        if tied[row] and cutoffs[row] > 0:
+            results.append(top_k_scores(scores[row], limit, doc_ids))
+            continue
+        positive = selected_scores[row] > 0
+        results.append(list(zip(selected[row][positive].tolist(), selected_scores[row][positive].tolist())))
+    return results
+
+
+def build_command(
+    workers: int = 1, positions: bool = INDEX_POSITIONS, compress: bool = INDEX_COMPRESS_POSTINGS
+):
     idx = InvertedIndex()
-    idx.build()
+    idx.build(workers=workers, positions=positions, compress=compress)
     idx.save()
 
 
+def add_command(path: str) -> int:
+    with open(path, "r") as f:
+        data = json.load(f)
+    documents = data if isinstance(data, list) else data.get("movies", [data])
+    inverted_idx = InvertedIndex()
+    inverted_idx.load()
+    inverted_idx.add_documents(documents)
+    return len(documents)
+
+
+def delete_command(doc_ids: list[int]) -> int:
+    inverted_idx = InvertedIndex()
+    inverted_idx.load()
+    return inverted_idx.delete_documents(doc_ids)
+
+
+def merge_command() -> int:
+    inverted_idx = InvertedIndex()
+    inverted_idx.load()
+    inverted_idx.merge()
+    return inverted_idx.reader.num_docs
+
+
 def search_command(q: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict[Any, Any]]:
     inverted_idx = InvertedIndex()
     inverted_idx.load()
@@ -235,10 +898,53 @@ def bm25_tf_command(
     return bm25_tf
 
 
-def bm25_search_command(query: str):
+def boolean_search_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[SearchResult]:
+    inverted_idx = InvertedIndex()
+    inverted_idx.load()
+    return inverted_idx.boolean_search(query, limit)
+
+
+def phrase_search_command(phrase: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[SearchResult]:
+    inverted_idx = InvertedIndex()
+    inverted_idx.load()
+    return inverted_idx.bm25_search(phrase, limit, candidates=inverted_idx.match_phrase(phrase))
+
+
+def proximity_search_command(
+    query: str, window: int = PROXIMITY_WINDOW, limit: int = DEFAULT_SEARCH_LIMIT
+) -> list[SearchResult]:
+    inverted_idx = InvertedIndex()
+    inverted_idx.load()
+    return inverted_idx.bm25_search(query, limit, candidates=inverted_idx.match_proximity(query, window))
+
+
+def bm25f_search_command(
+    query: str, weights: dict[str, float] | None = None, limit: int = DEFAULT_SEARCH_LIMIT
+) -> list[SearchResult]:
+    inverted_idx = InvertedIndex()
+    inverted_idx.load()
+    return inverted_idx.bm25f_search(query, limit, weights)
+
+
+def complete_command(prefix: str, limit: int = AUTOCOMPLETE_LIMIT) -> list[tuple[str, int]]:
+    inverted_idx = InvertedIndex()
+    inverted_idx.load()
+    return inverted_idx.complete(prefix, limit)
+
+
+def fuzzy_search_command(
+    query: str, max_edits: int | None = None, limit: int = DEFAULT_SEARCH_LIMIT
+) -> list[SearchResult]:
+    inverted_idx = InvertedIndex()
+    inverted_idx.load()
+    return inverted_idx.fuzzy_search(query, limit, max_edits)
+
+
+def bm25_search_command(query: str, filter_query: str | None = None):
     inverted_idx = InvertedIndex()
     inverted_idx.load()
-    bm25 = inverted_idx.bm25_search(query)
+    candidates = inverted_idx.match_boolean(filter_query) if filter_query else None
+    bm25 = inverted_idx.bm25_search(query, candidates=candidates)
     for i, res in enumerate(bm25):
         title = res["title"]
         print(f"{i + 1}. ({res["id"]}) {title} - Score: {res["score"]:.2f}")
@@ -0,0 +1,254 @@
+import math
+import os
+from typing import Any
+
+import numpy as np
+
+from constants import IVF_NPROBE, IVF_RERANK, IVF_TRAIN_SAMPLE, PQ_SUBSPACES
+from vector_utils import normalize_rows, top_k_indices
+from .embedding_cache import file_stamp
+
+# Codewords per PQ subspace, so every code fits in one byte.
+PQ_CODEWORDS = 256
+# Rows assigned to centroids per matrix product, bounding the distance matrix size.
+ASSIGN_BATCH = 8192
+
+
+def default_nlist(count: int) -> int:
+    """Inverted lists for `count` vectors: about 4 * sqrt(count), as usual for IVF."""
+    return max(1, min(count, 4096, int(4 * math.sqrt(count))))
+
+
+def assign(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the nearest (squared L2) centroid of every row of `data`."""
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    labels = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), ASSIGN_BATCH):
+        batch = data[start : start + ASSIGN_BATCH]
+        # |x - c|^2 = |x|^2 - 2 x.c + |c|^2, and |x|^2 does not change the argmin.
+        labels[start : start + len(batch)] = np.argmin(centroid_norms - 2 * batch @ centroids.T, axis=1)
+    return labels
+
+
+def kmeans(data: np.ndarray, k: int, rng: np.random.Generator, iterations: int = 20) -> np.ndarray:
+    """`k` centroids of `data` by Lloyd's algorithm, starting from random rows.
+
+    A centroid that loses all its rows is moved to a random row, so none
+    are wasted.
+    """
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        labels = assign(data, centroids)
+        counts = np.bincount(labels, minlength=k)
+        empty = counts == 0
+        # Rows sorted by centroid, so every cluster sum is one contiguous reduction.
+        order = np.argsort(labels, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[~empty]
+        centroids[~empty] = np.add.reduceat(data[order], starts, axis=0) / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+    return centroids
+
+
+class IVFPQIndex:
+    """Inverted file of product-quantized residuals over unit-length vectors.
+
+    A coarse k-means quantizer splits the vectors into `nlist` lists. Each
+    vector is stored in its list as `subspaces` one-byte codes: its residual
+    from the list centroid is cut into `subspaces` slices, and every slice
+    is replaced by the nearest of 256 codewords trained for that slice. A
+    384-d float32 vector (1536 bytes) becomes 48 bytes with the defaults.
+
+    A query probes the `nprobe` lists whose centroids are most similar. For
+    the dot product, `q.x = q.c + q.r`, and `q.r` is the sum over slices of
+    `q_slice . codeword`, so one (subspaces, 256) table per query scores
+    every probed code with table lookups (asymmetric distance computation).
+    The best `rerank` candidates can then be rescored exactly against the
+    float vectors, which may stay on disk.
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        codebooks: np.ndarray,
+        codes: np.ndarray,
+        ids: np.ndarray,
+        list_offsets: np.ndarray,
+        stamp: str = "",
+    ):
+        # (nlist, dim) coarse centroids; (subspaces, 256, dim / subspaces) codewords.
+        self.centroids = centroids
+        self.codebooks = codebooks
+        # Codes and vector ids grouped by list; list `l` is rows
+        # list_offsets[l]:list_offsets[l + 1].
+        self.codes = codes
+        self.ids = ids
+        self.list_offsets = list_offsets
+        # `file_stamp` of the embeddings file the index was trained on, if saved.
+        self.stamp = stamp
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def subspaces(self) -> int:
+        return len(self.codebooks)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def train(
+        cls,
+        vectors: np.ndarray,
+        nlist: int | None = None,
+        subspaces: int = PQ_SUBSPACES,
+        sample: int = IVF_TRAIN_SAMPLE,
+        seed: int = 42,
+    ) -> "IVFPQIndex":
+        """Train the quantizers on up to `sample` of `vectors` (unit length), then encode them all."""
+        count, dim = vectors.shape
+        if count == 0:
+            raise ValueError("cannot train an IVF-PQ index on no vectors")
+        if dim % subspaces:
+            raise ValueError(f"{dim} dimensions do not split into {subspaces} subspaces")
+        rng = np.random.default_rng(seed)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        training = vectors[np.sort(rng.choice(count, min(sample, count), replace=False))]
+
+        centroids = kmeans(training, nlist or default_nlist(count), rng)
+        residuals = training - centroids[assign(training, centroids)]
+        slices = residuals.reshape(len(training), subspaces, dim // subspaces)
+        codebooks = np.zeros((subspaces, PQ_CODEWORDS, dim // subspaces), dtype=np.float32)
+        for s in range(subspaces):
+            trained = kmeans(np.ascontiguousarray(slices[:, s]), PQ_CODEWORDS, rng)
+            codebooks[s, : len(trained)] = trained
+            # Unused codewords (fewer training rows than 256) repeat a real one.
+            codebooks[s, len(trained) :] = trained[0]
+
+        labels = assign(vectors, centroids)
+        codes = cls.encode(vectors - centroids[labels], codebooks)
+        order = np.argsort(labels, kind="stable")
+        list_offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=len(centroids)), out=list_offsets[1:])
+        return cls(centroids, codebooks, codes[order], order.astype(np.int32), list_offsets)
+
+    @staticmethod
+    def encode(residuals: np.ndarray, codebooks: np.ndarray) -> np.ndarray:
+        """(rows, subspaces) uint8 codes of the nearest codeword to every residual slice."""
+        subspaces, _, width = codebooks.shape
+        codes = np.empty((len(residuals), subspaces), dtype=np.uint8)
+        for s in range(subspaces):
+            codes[:, s] = assign(np.ascontiguousarray(residuals[:, s * width : (s + 1) * width]), codebooks[s])
+        return codes
+
+    def search(
+        self,
+        query: np.ndarray,
+        limit: int,
+        nprobe: int = IVF_NPROBE,
+        rerank: int = IVF_RERANK,
+        vectors: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Vector ids and similarities of (approximately) the `limit` vectors most similar to `query`.
+
+        `query` must be unit length. With `vectors` (the indexed rows, e.g.
+        a memory-mapped embeddings file) and `rerank > 0`, the best
+        `max(limit, rerank)` candidates are rescored exactly; otherwise the
+        quantized scores are returned.
+        """
+        if len(self.ids) == 0 or limit <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = np.asarray(query, dtype=np.float32)
+        coarse = self.centroids @ query
+        probed = top_k_indices(coarse, nprobe)
+        starts, ends = self.list_offsets[probed], self.list_offsets[probed + 1]
+        rows = np.concatenate([np.arange(start, end) for start, end in zip(starts.tolist(), ends.tolist())])
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        table = np.einsum("sd,skd->sk", query.reshape(self.subspaces, -1), self.codebooks)
+        scores = np.repeat(coarse[probed], ends - starts)
+        scores += table[np.arange(self.subspaces), self.codes[rows]].sum(axis=1)
+
+        if vectors is None or rerank <= 0:
+            best = top_k_indices(scores, limit)
+            return self.ids[rows[best]].astype(np.int64), scores[best]
+        candidates = np.sort(self.ids[rows[top_k_indices(scores, max(limit, rerank))]]).astype(np.int64)
+        exact = normalize_rows(vectors[candidates]) @ query
+        best = top_k_indices(exact, limit)
+        return candidates[best], exact[best]
+
+    def memory_report(self) -> dict[str, Any]:
+        """Bytes used by the index, per vector and in total, against float32 storage."""
+        per_vector = self.codes.itemsize * self.subspaces + self.ids.itemsize
+        fixed = self.centroids.nbytes + self.codebooks.nbytes + self.list_offsets.nbytes
+        count = max(len(self.ids), 1)
+        return {
+            "vectors": len(self.ids),
+            "bytes_per_vector": per_vector,
+            "amortized_bytes_per_vector": per_vector + fixed / count,
+            "float32_bytes_per_vector": self.centroids.shape[1] * 4,
+            "total_bytes": per_vector * len(self.ids) + fixed,
+        }
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                codebooks=self.codebooks,
+                codes=self.codes,
+                ids=self.ids,
+                list_offsets=self.list_offsets,
+                stamp=np.array(self.stamp),
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "IVFPQIndex":
+        with np.load(path) as data:
+            return cls(
+                data["centroids"],
+                data["codebooks"],
+                data["codes"],
+                data["ids"],
+                data["list_offsets"],
+                str(data["stamp"]) if "stamp" in data else "",
+            )
+
+    def is_current(
+        self, stamp: str, count: int, nlist: int | None = None, subspaces: int = PQ_SUBSPACES
+    ) -> bool:
+        return (
+            bool(stamp)
+            and self.stamp == stamp
+            and len(self) == count
+            and self.subspaces == subspaces
+            and self.nlist == min(nlist or default_nlist(count), count, IVF_TRAIN_SAMPLE)
+        )
+
+
+def load_or_train_ivfpq(
+    path: str,
+    embeddings_path: str,
+    vectors: np.ndarray,
+    nlist: int | None = None,
+    subspaces: int = PQ_SUBSPACES,
+) -> IVFPQIndex:
+    """The index saved at `path` if it was trained on the current embeddings file with these settings, else a new one.
+
+    Like the HNSW graph, it is keyed on the `file_stamp` of `embeddings_path`
+    (which holds `vectors`) rather than on the vectors themselves.
+    """
+    stamp = file_stamp(embeddings_path) if os.path.exists(embeddings_path) else ""
+    if stamp and os.path.exists(path):
+        index = IVFPQIndex.load(path)
+        if index.is_current(stamp, len(vectors), nlist, subspaces):
+            return index
+    index = IVFPQIndex.train(vectors, nlist, subspaces)
+    if stamp:
+        index.stamp = stamp
+        index.save(path)
+    return index
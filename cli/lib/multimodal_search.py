@@ -1,17 +1,21 @@
-import heapq
 from PIL import Image
 from sentence_transformers import SentenceTransformer
-from vector_utils import cosine_similarity
+from vector_utils import cosine_top_k, normalize_rows
+from .query_embedding_cache import QueryEmbeddingCache, shared_query_cache
+from .semantic_search import normalize_query
 from constants import DEFAULT_SEARCH_LIMIT
 from search_utils import load_movies, format_search_result
 
 
 class MultimodalSearch:
     def __init__(self, documents, model_name="clip-ViT-B-32"):
+        self.model_name = model_name
         self.model: SentenceTransformer = SentenceTransformer(model_name)
+        self.query_cache: QueryEmbeddingCache = shared_query_cache
         self.documents = documents
         self.texts = list(map(lambda doc: f"{doc['title']}: {doc['description']}", documents))
         self.text_embeddings = self.model.encode(self.texts, show_progress_bar=True)
+        self.normalized_text_embeddings = normalize_rows(self.text_embeddings)
 
     def embed_image(self, image_path:str):
         image = Image.open(image_path)
@@ -20,26 +24,27 @@ class MultimodalSearch:
 
         return image_embedding
 
+    def embed_text(self, text: str):
+        if text.strip() == "":
+            raise ValueError("text contains only empty string or whitespace")
+        return self.query_cache.get_or_encode(self.model_name, normalize_query(text), self.model.encode)
+
     def search_with_image(self, image_path: str):
-        image_embedding = self.embed_image(image_path)
+        return self.search_with_embedding(self.embed_image(image_path))
 
-        results = []
-        for i, text_embedding in enumerate(self.text_embeddings):
-            results.append({
-                "score": cosine_similarity(image_embedding, text_embedding),
-                "doc_idx": i
-            })
+    def search_with_text(self, query: str):
+        return self.search_with_embedding(self.embed_text(query))
 
-        sorted_results = heapq.nlargest(DEFAULT_SEARCH_LIMIT, results, lambda x: x["score"])
+    def search_with_embedding(self, embedding):
+        indices, scores = cosine_top_k(self.normalized_text_embeddings, embedding, DEFAULT_SEARCH_LIMIT)
 
         dcts = []
-        for res in sorted_results:
-            doc_idx = res["doc_idx"]
+        for doc_idx, score in zip(indices.tolist(), scores.tolist()):
             doc = self.documents[doc_idx]
             id = doc["id"]
             title = doc["title"]
             description = doc["description"]
-            dcts.append(format_search_result(id, title, description[:100], res["score"]))
+            dcts.append(format_search_result(id, title, description[:100], score))
 
         return dcts
 
@@ -55,3 +60,8 @@ def image_search_command(image_path: str):
     ms = MultimodalSearch(documents)
     results = ms.search_with_image(image_path)
     return results
+
+def text_search_command(query: str):
+    documents = load_movies()
+    ms = MultimodalSearch(documents)
+    return ms.search_with_text(query)
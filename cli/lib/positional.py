@@ -0,0 +1,81 @@
+import heapq
+
+import numpy as np
+
+from .boolean_query import intersect_postings
+
+# (doc ordinals, per-doc offsets into positions, positions) as returned by
+# `MappedIndex.positions` and `SegmentedIndex.positions`.
+PositionalPostings = tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def _candidate_positions(
+    postings: PositionalPostings, candidates: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Position counts and concatenated positions of `candidates` (all present)."""
+    docs, offsets, positions = postings
+    rows = np.searchsorted(docs, candidates)
+    starts = offsets[rows]
+    counts = offsets[rows + 1] - starts
+    # Index of every position of every candidate: each run starts at its own
+    # offset and counts up, i.e. a global arange shifted per run.
+    shifts = np.repeat(starts - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+    return counts, positions[np.arange(int(counts.sum())) + shifts].astype(np.int64)
+
+
+def phrase_matches(term_postings: list[PositionalPostings], offsets: list[int]) -> np.ndarray:
+    """Ordinals where term `i` occurs at `start + offsets[i]` for some start.
+
+    Candidates come from a plain doc intersection. Each term's positions in
+    those docs are shifted back by its offset and packed with the doc into a
+    single int64 key, so the phrase check is an intersection of sorted key
+    arrays, smallest first.
+    """
+    candidates = intersect_postings([docs for docs, _, _ in term_postings])
+    if len(candidates) == 0:
+        return candidates
+    gathered = [_candidate_positions(postings, candidates) for postings in term_postings]
+    max_offset = max(offsets)
+    stride = max(int(positions.max()) for _, positions in gathered) + max_offset + 1
+
+    keys = None
+    for (counts, positions), offset in sorted(zip(gathered, offsets), key=lambda x: len(x[0][1])):
+        term_keys = np.repeat(candidates, counts) * stride + (positions - offset + max_offset)
+        keys = term_keys if keys is None else np.intersect1d(keys, term_keys, assume_unique=True)
+        if len(keys) == 0:
+            return np.empty(0, dtype=np.int64)
+    return np.unique(keys // stride)
+
+
+def proximity_matches(term_postings: list[PositionalPostings], window: int) -> np.ndarray:
+    """Ordinals where every term occurs inside some span of `window` positions."""
+    candidates = intersect_postings([docs for docs, _, _ in term_postings])
+    if len(candidates) == 0 or len(term_postings) == 1:
+        return candidates
+    per_term = []
+    for postings in term_postings:
+        counts, positions = _candidate_positions(postings, candidates)
+        per_term.append(np.split(positions, np.cumsum(counts)[:-1]))
+
+    matches = [
+        doc
+        for i, doc in enumerate(candidates.tolist())
+        if minimum_span([positions[i].tolist() for positions in per_term]) <= window
+    ]
+    return np.array(matches, dtype=np.int64)
+
+
+def minimum_span(position_lists: list[list[int]]) -> int:
+    """Length of the shortest span holding one position from every sorted list."""
+    heap = [(positions[0], i, 0) for i, positions in enumerate(position_lists)]
+    heapq.heapify(heap)
+    highest = max(positions[0] for positions in position_lists)
+    best = highest - heap[0][0] + 1
+    while True:
+        lowest, i, j = heapq.heappop(heap)
+        best = min(best, highest - lowest + 1)
+        if j + 1 == len(position_lists[i]):
+            return best
+        following = position_lists[i][j + 1]
+        highest = max(highest, following)
+        heapq.heappush(heap, (following, i, j + 1))
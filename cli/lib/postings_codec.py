@@ -0,0 +1,173 @@
+import numpy as np
+
+from constants import POSTINGS_BLOCK_SIZE
+
+
+def pack_bits(values: np.ndarray, width: int) -> np.ndarray:
+    """Pack non-negative `values` into `width` bits each, little-endian."""
+    if width == 0 or len(values) == 0:
+        return np.empty(0, dtype=np.uint8)
+    bits = (values.astype(np.uint64)[:, None] >> np.arange(width, dtype=np.uint64)) & 1
+    return np.packbits(bits.astype(np.uint8).ravel(), bitorder="little")
+
+
+def unpack_bits(packed: np.ndarray, count: int, width: int) -> np.ndarray:
+    if width == 0 or count == 0:
+        return np.zeros(count, dtype=np.int64)
+    bits = np.unpackbits(packed, count=count * width, bitorder="little").reshape(count, width)
+    return bits.astype(np.int64) @ (np.int64(1) << np.arange(width, dtype=np.int64))
+
+
+def packed_size(count: int, width: int) -> int:
+    return (count * width + 7) // 8
+
+
+def encode_postings(
+    postings_offsets: np.ndarray,
+    postings_docs: np.ndarray,
+    postings_tfs: np.ndarray,
+    block_size: int = POSTINGS_BLOCK_SIZE,
+) -> dict[str, np.ndarray]:
+    """Sections for block bit-packed postings.
+
+    Every term's postings are cut into blocks of `block_size`. A block keeps
+    its first doc ordinal uncompressed, then the gaps to the following docs
+    and the term frequencies minus one, each bit-packed with the smallest
+    width that fits the block.
+    """
+    num_terms = len(postings_offsets) - 1
+    term_blocks = np.zeros(num_terms + 1, dtype=np.int64)
+    first_docs = []
+    doc_bits = []
+    tf_bits = []
+    chunks = []
+    block_offsets = [0]
+    for term_id in range(num_terms):
+        start, end = int(postings_offsets[term_id]), int(postings_offsets[term_id + 1])
+        for block_start in range(start, end, block_size):
+            docs = postings_docs[block_start : min(block_start + block_size, end)].astype(np.int64)
+            tfs = postings_tfs[block_start : min(block_start + block_size, end)].astype(np.int64) - 1
+            gaps = np.diff(docs)
+            gap_width = int(gaps.max()).bit_length() if len(gaps) else 0
+            tf_width = int(tfs.max()).bit_length()
+            first_docs.append(docs[0])
+            doc_bits.append(gap_width)
+            tf_bits.append(tf_width)
+            chunks.append(pack_bits(gaps, gap_width))
+            chunks.append(pack_bits(tfs, tf_width))
+            block_offsets.append(block_offsets[-1] + len(chunks[-2]) + len(chunks[-1]))
+        term_blocks[term_id + 1] = len(first_docs)
+
+    return {
+        "term_blocks": term_blocks,
+        "block_offsets": np.array(block_offsets, dtype=np.int64),
+        "block_first_docs": np.array(first_docs, dtype=np.int32),
+        "block_doc_bits": np.array(doc_bits, dtype=np.uint8),
+        "block_tf_bits": np.array(tf_bits, dtype=np.uint8),
+        "postings_blob": np.concatenate(chunks) if chunks else np.empty(0, dtype=np.uint8),
+    }
+
+
+class CompressedPostings:
+    """Block-wise decoder over the sections written by `encode_postings`."""
+
+    def __init__(self, sections: dict[str, np.ndarray], postings_offsets: np.ndarray, block_size: int):
+        self.postings_offsets = postings_offsets
+        self.block_size = block_size
+        self.term_blocks = sections["term_blocks"]
+        self.block_offsets = sections["block_offsets"]
+        self.block_first_docs = sections["block_first_docs"]
+        self.block_doc_bits = sections["block_doc_bits"]
+        self.block_tf_bits = sections["block_tf_bits"]
+        self.blob = sections["postings_blob"]
+
+    def nbytes(self) -> int:
+        return sum(
+            array.nbytes
+            for array in (
+                self.term_blocks,
+                self.block_offsets,
+                self.block_first_docs,
+                self.block_doc_bits,
+                self.block_tf_bits,
+                self.blob,
+            )
+        )
+
+    def decode_block(self, block: int, count: int) -> tuple[np.ndarray, np.ndarray]:
+        """Doc ordinals and term frequencies of one block holding `count` postings."""
+        gap_width = int(self.block_doc_bits[block])
+        tf_width = int(self.block_tf_bits[block])
+        start = int(self.block_offsets[block])
+        middle = start + packed_size(count - 1, gap_width)
+        docs = np.empty(count, dtype=np.int64)
+        docs[0] = self.block_first_docs[block]
+        np.cumsum(unpack_bits(self.blob[start:middle], count - 1, gap_width), out=docs[1:])
+        docs[1:] += docs[0]
+        tfs = unpack_bits(self.blob[middle : int(self.block_offsets[block + 1])], count, tf_width) + 1
+        return docs, tfs
+
+    def blocks(self, term_id: int):
+        """Yield decoded (docs, tfs) for each block of `term_id` in doc order."""
+        remaining = int(self.postings_offsets[term_id + 1] - self.postings_offsets[term_id])
+        for block in range(int(self.term_blocks[term_id]), int(self.term_blocks[term_id + 1])):
+            count = min(self.block_size, remaining)
+            remaining -= count
+            yield self.decode_block(block, count)
+
+    def term_postings(self, term_id: int) -> tuple[np.ndarray, np.ndarray]:
+        """All postings of `term_id`, decoding its blocks together.
+
+        Values are read straight from the unpacked bit stream of the term's
+        blocks: value `j` of block `k` starts at `k`'s bit offset plus
+        `j * width_k`, so blocks of different widths decode in one gather.
+        """
+        first, last = int(self.term_blocks[term_id]), int(self.term_blocks[term_id + 1])
+        total = int(self.postings_offsets[term_id + 1] - self.postings_offsets[term_id])
+        if total == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        if last - first == 1:
+            docs, tfs = self.decode_block(first, total)
+            return docs.astype(np.int32), tfs.astype(np.int32)
+
+        counts = np.full(last - first, self.block_size, dtype=np.int64)
+        counts[-1] = total - self.block_size * (last - first - 1)
+        gap_widths = self.block_doc_bits[first:last].astype(np.int64)
+        tf_widths = self.block_tf_bits[first:last].astype(np.int64)
+        byte_offsets = self.block_offsets[first : last + 1]
+        bits = np.unpackbits(self.blob[byte_offsets[0] : byte_offsets[-1]], bitorder="little")
+        gap_starts = (byte_offsets[:-1] - byte_offsets[0]) * 8
+        tf_starts = gap_starts + ((counts - 1) * gap_widths + 7) // 8 * 8
+
+        block_starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        block_of = np.repeat(np.arange(last - first), counts)
+        index_in_block = np.arange(total) - block_starts[block_of]
+
+        # Gap i of a block sits before posting i + 1; each block's first posting
+        # is overwritten with its stored doc, and a per-block prefix sum turns
+        # the gaps back into ordinals.
+        gap_widths, tf_widths = gap_widths[block_of], tf_widths[block_of]
+        gap_index = np.maximum(index_in_block - 1, 0)
+        deltas = _gather_bits(bits, gap_starts[block_of] + gap_index * gap_widths, gap_widths)
+        deltas[block_starts] = self.block_first_docs[first:last]
+        prefix = np.cumsum(deltas)
+        docs = prefix - np.repeat(prefix[block_starts] - deltas[block_starts], counts)
+        tfs = _gather_bits(bits, tf_starts[block_of] + index_in_block * tf_widths, tf_widths) + 1
+        return docs.astype(np.int32), tfs.astype(np.int32)
+
+    def decode_all(self) -> tuple[np.ndarray, np.ndarray]:
+        decoded = [self.term_postings(term_id) for term_id in range(len(self.term_blocks) - 1)]
+        if not decoded:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        return np.concatenate([docs for docs, _ in decoded]), np.concatenate([tfs for _, tfs in decoded])
+
+
+def _gather_bits(bits: np.ndarray, starts: np.ndarray, widths: np.ndarray) -> np.ndarray:
+    """Little-endian integers of `widths[i]` bits starting at bit `starts[i]`."""
+    max_width = int(widths.max()) if len(widths) else 0
+    if max_width == 0:
+        return np.zeros(len(starts), dtype=np.int64)
+    shifts = np.arange(max_width, dtype=np.int64)
+    valid = shifts < widths[:, None]
+    positions = np.where(valid, starts[:, None] + shifts, 0)
+    return ((bits[positions] & valid).astype(np.int64) << shifts).sum(axis=1)
@@ -0,0 +1,152 @@
+import os
+
+import numpy as np
+
+from constants import QUANTIZED_RESCORE
+from vector_utils import normalize_rows, top_k_indices
+from .embedding_cache import file_stamp
+
+# Rows scored (or quantized) per step, so the float32 temporaries stay in cache.
+QUANTIZED_BLOCK = 1024
+
+
+class Int8Embeddings:
+    """Unit-length embeddings stored as int8 with one float32 scale per dimension.
+
+    Dimension `d` is stored as `round(x_d / scale_d)` with `scale_d` the
+    largest |x_d| over all rows divided by 127, so a row costs one byte per
+    dimension instead of four. `q . x` is approximated by `(q * scale) . codes`.
+    """
+
+    precision = "int8"
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray):
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def from_vectors(cls, vectors: np.ndarray) -> "Int8Embeddings":
+        scales = np.zeros(vectors.shape[1], dtype=np.float32)
+        for start in range(0, len(vectors), QUANTIZED_BLOCK):
+            block = normalize_rows(vectors[start : start + QUANTIZED_BLOCK])
+            np.maximum(scales, np.abs(block).max(axis=0), out=scales)
+        scales = np.where(scales == 0, 1, scales / 127).astype(np.float32)
+        codes = np.empty(vectors.shape, dtype=np.int8)
+        for start in range(0, len(vectors), QUANTIZED_BLOCK):
+            block = normalize_rows(vectors[start : start + QUANTIZED_BLOCK])
+            codes[start : start + len(block)] = np.clip(np.rint(block / scales), -127, 127)
+        return cls(codes, scales)
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Approximate dot product of every row with the unit-length `query`."""
+        scaled = (query * self.scales).astype(np.float32)
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), QUANTIZED_BLOCK):
+            block = self.codes[start : start + QUANTIZED_BLOCK]
+            scores[start : start + len(block)] = block.astype(np.float32) @ scaled
+        return scores
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes
+
+    def sections(self) -> dict[str, np.ndarray]:
+        return {"codes": self.codes, "scales": self.scales}
+
+
+class BinaryEmbeddings:
+    """Embeddings reduced to the sign of every dimension, packed 8 per byte.
+
+    A 384-d row is 48 bytes. Rows are ranked by Hamming distance to the
+    query's sign bits (XOR, then popcount), reported as `dim - 2 * distance`
+    so that higher is better, as with the other scores.
+    """
+
+    precision = "binary"
+
+    def __init__(self, bits: np.ndarray, dim: int):
+        self.bits = bits
+        self.dim = dim
+
+    @classmethod
+    def from_vectors(cls, vectors: np.ndarray) -> "BinaryEmbeddings":
+        bits = np.empty((len(vectors), (vectors.shape[1] + 7) // 8), dtype=np.uint8)
+        for start in range(0, len(vectors), QUANTIZED_BLOCK):
+            block = np.asarray(vectors[start : start + QUANTIZED_BLOCK])
+            bits[start : start + len(block)] = np.packbits(block > 0, axis=1)
+        return cls(bits, vectors.shape[1])
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        packed = np.packbits(np.asarray(query) > 0)
+        distances = np.empty(len(self.bits), dtype=np.int32)
+        for start in range(0, len(self.bits), QUANTIZED_BLOCK):
+            block = self.bits[start : start + QUANTIZED_BLOCK]
+            distances[start : start + len(block)] = np.bitwise_count(block ^ packed).sum(axis=1, dtype=np.int32)
+        return (self.dim - 2 * distances).astype(np.float32)
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes
+
+    def sections(self) -> dict[str, np.ndarray]:
+        return {"bits": self.bits, "dim": np.array(self.dim)}
+
+
+QUANTIZERS = {"int8": Int8Embeddings, "binary": BinaryEmbeddings}
+
+
+def quantize(vectors: np.ndarray, precision: str) -> Int8Embeddings | BinaryEmbeddings:
+    if precision not in QUANTIZERS:
+        raise ValueError(f"unknown quantized precision '{precision}', expected one of {tuple(QUANTIZERS)}")
+    return QUANTIZERS[precision].from_vectors(vectors)
+
+
+def quantized_top_k(
+    quantized: Int8Embeddings | BinaryEmbeddings,
+    vectors: np.ndarray,
+    query: np.ndarray,
+    limit: int,
+    rescore: int = QUANTIZED_RESCORE,
+    allowed: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Row indices and cosine similarities of (approximately) the `limit` rows most similar to `query`.
+
+    The quantized scan picks `max(limit, rescore)` candidates, which are
+    rescored in float32 from `vectors` (only those rows are read, so a
+    memory-mapped array stays on disk). `allowed` is an optional boolean
+    mask of rows that may be returned.
+    """
+    query = normalize_rows(query)
+    approximate = quantized.scores(query)
+    if allowed is not None:
+        approximate[~allowed] = -np.inf
+        limit = min(limit, int(allowed.sum()))
+    candidates = top_k_indices(approximate, max(limit, rescore))
+    candidates = np.sort(candidates[np.isfinite(approximate[candidates])])
+    exact = normalize_rows(vectors[candidates]) @ query
+    best = top_k_indices(exact, limit)
+    return candidates[best], exact[best]
+
+
+def quantized_cache_path(embeddings_path: str, precision: str) -> str:
+    """Where the `precision` copy of the embeddings at `embeddings_path` is kept."""
+    return f"{os.path.splitext(embeddings_path)[0]}.{precision}.npz"
+
+
+def load_or_quantize(
+    embeddings_path: str, vectors: np.ndarray, precision: str
+) -> Int8Embeddings | BinaryEmbeddings:
+    """The `precision` copy of `vectors`, read from its cache if it was made from the current embeddings file."""
+    path = quantized_cache_path(embeddings_path, precision)
+    stamp = file_stamp(embeddings_path) if os.path.exists(embeddings_path) else ""
+    if stamp and os.path.exists(path):
+        with np.load(path) as data:
+            if str(data["stamp"]) == stamp:
+                if precision == "int8":
+                    return Int8Embeddings(data["codes"], data["scales"])
+                return BinaryEmbeddings(data["bits"], int(data["dim"]))
+    quantized = quantize(vectors, precision)
+    if stamp:
+        with open(path, "wb") as f:
+            np.savez(f, stamp=np.array(stamp), **quantized.sections())
+    return quantized
@@ -0,0 +1,179 @@
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Any, Callable
+
+import numpy as np
+
+from constants import QUERY_EMBEDDING_CACHE_PATH, QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_DISK_CACHE_SIZE
+
+# Eviction trims the on-disk store to this share of its bound, so it does
+# not rescan the directory on every write once the store is full.
+DISK_EVICTION_TARGET = 0.9
+
+
+class QueryEmbeddingCache:
+    """Two-tier cache of query embeddings keyed by (model name, query text).
+
+    An in-process LRU of `max_size` vectors sits in front of an optional
+    on-disk store under `path` (one `.npy` per query, written atomically),
+    so popular queries skip the model's forward pass across processes and
+    restarts as well as within one. The disk tier is off unless `path` is
+    given or `enable_disk` is called. Embeddings only depend on the model and
+    the text, so entries never go stale. Returned vectors are read-only,
+    since every caller shares them.
+
+    The on-disk store holds at most `max_disk_entries` files. A disk hit
+    refreshes its file's mtime, and when a write goes over the bound the
+    least recently used files are deleted. `max_disk_entries=0` keeps the
+    disk tier off even when it is enabled.
+    """
+
+    def __init__(
+        self,
+        max_size: int = QUERY_EMBEDDING_CACHE_SIZE,
+        path: str | None = None,
+        max_disk_entries: int = QUERY_EMBEDDING_DISK_CACHE_SIZE,
+    ):
+        self.max_size = max_size
+        self.path = path if max_disk_entries > 0 else None
+        self.max_disk_entries = max_disk_entries
+        self.entries: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+        # Files in the on-disk store, counted on the first write.
+        self.disk_entries: int | None = None
+
+    def enable_disk(self, path: str = QUERY_EMBEDDING_CACHE_PATH):
+        """Also keep embeddings on disk under `path`, shared across processes."""
+        self.path = path if self.max_disk_entries > 0 else None
+        self.disk_entries = None
+
+    def get_or_encode(
+        self, model_name: str, query: str, encode: Callable[[list[str]], np.ndarray]
+    ) -> np.ndarray:
+        return self.get_or_encode_many(model_name, [query], encode)[0]
+
+    def get_or_encode_many(
+        self, model_name: str, queries: list[str], encode: Callable[[list[str]], np.ndarray]
+    ) -> list[np.ndarray]:
+        """The embedding of every query; the ones cached nowhere are encoded in one `encode` call."""
+        found: dict[str, np.ndarray] = {}
+        for query in queries:
+            if query in found:
+                continue
+            embedding = self.entries.get((model_name, query))
+            if embedding is not None:
+                self.entries.move_to_end((model_name, query))
+                self.memory_hits += 1
+            else:
+                embedding = self.__read(model_name, query)
+                if embedding is None:
+                    continue
+                self.disk_hits += 1
+                self.__remember(model_name, query, embedding)
+            found[query] = embedding
+
+        missing = [query for query in dict.fromkeys(queries) if query not in found]
+        if missing:
+            self.misses += len(missing)
+            for query, embedding in zip(missing, encode(missing)):
+                embedding = np.array(embedding, dtype=np.float32)
+                embedding.flags.writeable = False
+                self.__remember(model_name, query, embedding)
+                self.__write(model_name, query, embedding)
+                found[query] = embedding
+        return [found[query] for query in queries]
+
+    def __remember(self, model_name: str, query: str, embedding: np.ndarray):
+        if self.max_size <= 0:
+            return
+        self.entries[(model_name, query)] = embedding
+        self.entries.move_to_end((model_name, query))
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def __file(self, model_name: str, query: str) -> str:
+        model_dir = hashlib.blake2b(model_name.encode("utf-8"), digest_size=8).hexdigest()
+        name = hashlib.blake2b(query.encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.path, model_dir, f"{name}.npy")
+
+    def __read(self, model_name: str, query: str) -> np.ndarray | None:
+        if self.path is None:
+            return None
+        path = self.__file(model_name, query)
+        try:
+            embedding = np.load(path)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        embedding.flags.writeable = False
+        return embedding
+
+    def __write(self, model_name: str, query: str, embedding: np.ndarray):
+        if self.path is None:
+            return
+        path = self.__file(model_name, query)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique per process, so concurrent writers never share a temp file.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, embedding)
+        os.replace(tmp_path, path)
+
+        if self.disk_entries is None:
+            self.disk_entries = len(self.__disk_files())
+        else:
+            self.disk_entries += 1
+        if self.disk_entries > self.max_disk_entries:
+            self.__evict_disk()
+
+    def __disk_files(self) -> list[os.DirEntry]:
+        files = []
+        for model_dir in os.scandir(self.path):
+            if model_dir.is_dir():
+                files.extend(entry for entry in os.scandir(model_dir.path) if entry.name.endswith(".npy"))
+        return files
+
+    def __evict_disk(self):
+        """Delete the least recently used files, down to `DISK_EVICTION_TARGET` of the bound."""
+        files = []
+        for entry in self.__disk_files():
+            try:
+                files.append((entry.stat().st_mtime_ns, entry.path))
+            except FileNotFoundError:
+                continue
+        files.sort()
+        keep = int(self.max_disk_entries * DISK_EVICTION_TARGET)
+        for _, path in files[: max(0, len(files) - keep)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Another process evicted it first.
+                continue
+            self.disk_evictions += 1
+        self.disk_entries = min(len(files), keep)
+
+    def clear(self):
+        """Empty the in-process tier; the on-disk store is left alone."""
+        self.entries.clear()
+
+    def info(self) -> dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "disk_entries": self.disk_entries,
+            "max_disk_entries": self.max_disk_entries,
+            "disk_evictions": self.disk_evictions,
+        }
+
+
+# One cache per process, shared by every search class that embeds text queries.
+shared_query_cache = QueryEmbeddingCache()
@@ -0,0 +1,66 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, TypeVar
+
+from constants import RESULT_CACHE_SIZE, RESULT_CACHE_TTL
+
+T = TypeVar("T")
+
+
+class ResultCache:
+    """Size-bounded LRU cache of search results with a TTL and a version.
+
+    Callers pass the version of the data the results were computed from (an
+    index fingerprint, an embeddings snapshot counter). A lookup with a new
+    version drops every entry first, so results never outlive the index or
+    embeddings they came from.
+    """
+
+    def __init__(self, max_size: int = RESULT_CACHE_SIZE, ttl: float | None = RESULT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.version: Hashable = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_compute(self, key: Hashable, version: Hashable, compute: Callable[[], T]) -> T:
+        if version != self.version:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.version = version
+
+        entry = self.entries.get(key)
+        now = time.monotonic()
+        if entry is not None and (self.ttl is None or now - entry[0] <= self.ttl):
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        value = compute()
+        if self.max_size > 0:
+            self.entries[key] = (now, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        self.entries.clear()
+
+    def info(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,226 @@
+import json
+import math
+import os
+from collections import Counter, defaultdict
+from typing import Any
+
+import numpy as np
+
+from constants import BM25_B, INDEX_CACHE_PATH, INDEX_FIELDS, INDEX_SEGMENTS_PATH
+from .index_format import MappedIndex, compute_length_norms, encode_index
+
+MANIFEST_VERSION = 1
+
+
+def new_manifest() -> dict[str, Any]:
+    return {"version": MANIFEST_VERSION, "segments": [], "next_segment": 0}
+
+
+def load_manifest() -> dict[str, Any]:
+    with open(INDEX_CACHE_PATH, "r") as f:
+        manifest = json.load(f)
+    if manifest["version"] != MANIFEST_VERSION:
+        raise ValueError(f"unsupported index manifest version {manifest['version']}")
+    return manifest
+
+
+def save_manifest(manifest: dict[str, Any]):
+    tmp_path = f"{INDEX_CACHE_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, INDEX_CACHE_PATH)
+
+
+def segment_path(name: str) -> str:
+    return os.path.join(INDEX_SEGMENTS_PATH, name)
+
+
+def allocate_segment(manifest: dict[str, Any]) -> str:
+    name = f"seg_{manifest['next_segment']:06d}.bin"
+    manifest["next_segment"] += 1
+    return name
+
+
+def remove_unreferenced_segments(manifest: dict[str, Any]):
+    referenced = {segment["name"] for segment in manifest["segments"]}
+    for name in os.listdir(INDEX_SEGMENTS_PATH):
+        if name.endswith(".bin") and name not in referenced:
+            os.remove(segment_path(name))
+
+
+class SegmentedIndex:
+    """Read-only view over several index segments plus their tombstones.
+
+    Segments keep their own postings; this view concatenates them into one
+    ordinal space (segment order, then ordinal within the segment) and masks
+    out deleted documents. Collection statistics - live document count,
+    average document length, document frequencies and IDF - are recomputed
+    over live documents only, so BM25 scores equal those of a single index
+    built from the same documents.
+    """
+
+    def __init__(self, segments: list[MappedIndex], tombstones: list[list[int]], b: float = BM25_B):
+        self.segments = segments
+        self.bases = []
+        base = 0
+        for segment in segments:
+            self.bases.append(base)
+            base += segment.num_docs
+
+        if segments:
+            self.doc_ids = np.concatenate([segment.doc_ids for segment in segments])
+            self.doc_lengths = np.concatenate([segment.doc_lengths for segment in segments])
+        else:
+            self.doc_ids = np.empty(0, dtype=np.int64)
+            self.doc_lengths = np.empty(0, dtype=np.int32)
+
+        self.live = np.ones(len(self.doc_ids), dtype=bool)
+        for segment, seg_base, deleted in zip(segments, self.bases, tombstones):
+            if deleted:
+                dead = np.isin(segment.doc_ids, np.array(deleted, dtype=np.int64))
+                self.live[seg_base : seg_base + segment.num_docs] &= ~dead
+
+        self.num_docs = int(self.live.sum())
+        total_doc_length = int(self.doc_lengths[self.live].sum(dtype=np.int64))
+        self.avg_doc_length = total_doc_length / self.num_docs if self.num_docs else 0.0
+        self.length_norms = compute_length_norms(self.doc_lengths, self.avg_doc_length, b)
+        self.has_positions = all(segment.has_positions for segment in segments)
+
+        field_lists = {tuple(segment.fields) for segment in segments}
+        self.fields: list[str] = list(field_lists.pop()) if len(field_lists) == 1 else []
+        if self.fields:
+            self.field_lengths = np.concatenate([segment.field_lengths for segment in segments])
+            live_lengths = self.field_lengths[self.live]
+            self.avg_field_lengths = (
+                live_lengths.sum(axis=0) / self.num_docs if self.num_docs else np.zeros(len(self.fields))
+            )
+
+    def ordinal(self, doc_id: int) -> int:
+        for segment, seg_base in reversed(list(zip(self.segments, self.bases))):
+            try:
+                ordinal = seg_base + segment.ordinal(doc_id)
+            except KeyError:
+                continue
+            if self.live[ordinal]:
+                return ordinal
+        raise KeyError(doc_id)
+
+    def postings(self, term: str) -> tuple[np.ndarray, np.ndarray]:
+        """Live doc ordinals (ascending) and term frequencies for `term`."""
+        all_docs = []
+        all_tfs = []
+        for segment, seg_base in zip(self.segments, self.bases):
+            docs, tfs = segment.postings(term)
+            if len(docs) == 0:
+                continue
+            docs = docs.astype(np.int64) + seg_base
+            keep = self.live[docs]
+            all_docs.append(docs[keep])
+            all_tfs.append(tfs[keep])
+        if not all_docs:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+        return np.concatenate(all_docs), np.concatenate(all_tfs)
+
+    def positions(self, term: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Live doc ordinals, per-doc offsets into the positions array, and positions."""
+        if not self.has_positions:
+            raise ValueError("index has segments built without positions")
+        all_docs = []
+        all_counts = []
+        all_positions = []
+        for segment, seg_base in zip(self.segments, self.bases):
+            docs, offsets, positions = segment.positions(term)
+            if len(docs) == 0:
+                continue
+            docs = docs.astype(np.int64) + seg_base
+            keep = self.live[docs]
+            counts = np.diff(offsets)
+            all_docs.append(docs[keep])
+            all_counts.append(counts[keep])
+            all_positions.append(positions[np.repeat(keep, counts)])
+        if not all_docs:
+            return np.empty(0, dtype=np.int64), np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32)
+        offsets = np.zeros(sum(len(docs) for docs in all_docs) + 1, dtype=np.int64)
+        np.cumsum(np.concatenate(all_counts), out=offsets[1:])
+        return np.concatenate(all_docs), offsets, np.concatenate(all_positions)
+
+    def field_postings(self, term: str) -> tuple[np.ndarray, np.ndarray]:
+        """Live doc ordinals and their (postings x fields) term frequencies."""
+        if not self.fields:
+            raise ValueError("index has segments built without the same field statistics")
+        all_docs = []
+        all_field_tfs = []
+        for segment, seg_base in zip(self.segments, self.bases):
+            docs, field_tfs = segment.field_postings(term)
+            if len(docs) == 0:
+                continue
+            docs = docs.astype(np.int64) + seg_base
+            keep = self.live[docs]
+            all_docs.append(docs[keep])
+            all_field_tfs.append(field_tfs[keep])
+        if not all_docs:
+            return np.empty(0, dtype=np.int64), np.empty((0, len(self.fields)), dtype=np.int32)
+        return np.concatenate(all_docs), np.concatenate(all_field_tfs)
+
+    def doc_freq(self, term: str) -> int:
+        return len(self.postings(term)[0])
+
+    def idf(self, term: str) -> float | None:
+        term_doc_count = self.doc_freq(term)
+        if term_doc_count == 0:
+            return None
+        return math.log((self.num_docs - term_doc_count + 0.5) / (term_doc_count + 0.5) + 1)
+
+
+def merge_segments(reader: SegmentedIndex) -> bytes:
+    """Encode every live document of `reader` into a single compacted segment."""
+    index: dict[str, set[int]] = defaultdict(set)
+    term_frequencies: dict[int, Counter] = {}
+    doc_lengths: dict[int, int] = {}
+    positions: dict[int, dict[str, list[int]]] | None = {} if reader.has_positions else None
+    field_frequencies: dict[int, list[Counter]] | None = {} if reader.fields else None
+    for segment, seg_base in zip(reader.segments, reader.bases):
+        live = reader.live[seg_base : seg_base + segment.num_docs]
+        doc_ids = segment.doc_ids.tolist()
+        for ordinal in np.flatnonzero(live).tolist():
+            doc_lengths[doc_ids[ordinal]] = int(segment.doc_lengths[ordinal])
+            term_frequencies[doc_ids[ordinal]] = Counter()
+            if positions is not None:
+                positions[doc_ids[ordinal]] = {}
+            if field_frequencies is not None:
+                field_frequencies[doc_ids[ordinal]] = [Counter() for _ in reader.fields]
+        for term_id in range(len(segment.terms)):
+            term = segment.terms[term_id]
+            docs, tfs = segment.term_postings(term_id)
+            if positions is not None:
+                offsets, term_positions = segment.term_positions(term_id)
+                offsets = offsets.tolist()
+                term_positions = term_positions.tolist()
+            if field_frequencies is not None:
+                field_tfs = segment.term_field_tfs(term_id).tolist()
+            for i, (ordinal, tf) in enumerate(zip(docs.tolist(), tfs.tolist())):
+                if live[ordinal]:
+                    index[term].add(doc_ids[ordinal])
+                    term_frequencies[doc_ids[ordinal]][term] = tf
+                    if positions is not None:
+                        positions[doc_ids[ordinal]][term] = term_positions[offsets[i] : offsets[i + 1]]
+                    if field_frequencies is not None:
+                        for counts, field_tf in zip(field_frequencies[doc_ids[ordinal]], field_tfs[i]):
+                            if field_tf:
+                                counts[term] = field_tf
+    surface_forms = None
+    if all(segment.surface_terms is not None for segment in reader.segments):
+        surface_forms = {}
+        for segment in reader.segments:
+            surface_forms.update(segment.surface_forms())
+    compress = all(segment.compressed is not None for segment in reader.segments)
+    return encode_index(
+        index,
+        term_frequencies,
+        doc_lengths,
+        positions=positions,
+        compress=compress,
+        field_frequencies=field_frequencies,
+        fields=tuple(reader.fields) if reader.fields else INDEX_FIELDS,
+        surface_forms=surface_forms,
+    )
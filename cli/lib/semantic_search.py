@@ -1,145 +1,532 @@
-import json
 import os
 import re
-import heapq
+import time
 from typing import Any
 
 import numpy as np
-from constants import MOVIE_EMBEDDINGS_CACHE_PATH, CHUNK_EMBEDDINGS_CACHE_PATH, CHUNK_METADATA_CACHE_PATH
-from search_utils import load_movies, format_search_result
+from constants import (
+    CHUNK_EMBEDDINGS_CACHE_PATH,
+    CHUNK_HNSW_CACHE_PATH,
+    CHUNK_MAX_SENTENCES,
+    CHUNK_OVERLAP_SENTENCES,
+    CHUNK_IVFPQ_CACHE_PATH,
+    CHUNK_METADATA_CACHE_PATH,
+    CHUNK_VECTOR_INDEXES,
+    EMBEDDING_PRECISIONS,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    HNSW_M,
+    IVF_NPROBE,
+    IVF_RERANK,
+    MOVIE_EMBEDDINGS_CACHE_PATH,
+    MOVIE_HNSW_CACHE_PATH,
+    PQ_SUBSPACES,
+    QUANTIZED_RESCORE,
+    SEARCH_MULTIPLIER,
+    SEMANTIC_BATCH_MAX_CELLS,
+    VECTOR_INDEXES,
+)
+from search_utils import format_search_result
 from sentence_transformers import SentenceTransformer
 from custom_types import SearchResult
-from vector_utils import cosine_similarity
+from vector_utils import cosine_top_k, cosine_top_k_many, normalize_rows, top_k_indices, unit_rows
+from .chunk_metadata import ChunkMetadata
+from .doc_store import StoredDocuments, load_stored_movies
+from .embedding_pipeline import encode_bucketed
+from .embedding_cache import (
+    embedding_manifest,
+    load_embeddings,
+    load_reusable_embeddings,
+    reuse_or_encode,
+    save_embeddings,
+    text_hashes,
+)
+from .hnsw import HNSWIndex, load_or_build_hnsw
+from .ivfpq import IVFPQIndex, load_or_train_ivfpq
+from .query_embedding_cache import QueryEmbeddingCache, shared_query_cache
+from .quantization import BinaryEmbeddings, Int8Embeddings, load_or_quantize, quantized_top_k
+from .result_cache import ResultCache
 
 
 class SemanticSearch:
-    def __init__(self, model_name = "all-MiniLM-L6-v2"):
+    vector_indexes = VECTOR_INDEXES
+
+    def __init__(
+        self,
+        model_name = "all-MiniLM-L6-v2",
+        vector_index: str = "exact",
+        ef_search: int = HNSW_EF_SEARCH,
+        precision: str = "float32",
+        rescore: int = QUANTIZED_RESCORE,
+    ):
+        if vector_index not in self.vector_indexes:
+            raise ValueError(f"unknown vector index '{vector_index}', expected one of {self.vector_indexes}")
+        if precision not in EMBEDDING_PRECISIONS:
+            raise ValueError(f"unknown precision '{precision}', expected one of {EMBEDDING_PRECISIONS}")
+        if precision != "float32" and vector_index != "exact":
+            raise ValueError(f"precision '{precision}' only applies to the exact scan")
+        self.model_name = model_name
         self.model = SentenceTransformer(model_name)
+        self.query_cache: QueryEmbeddingCache = shared_query_cache
+        # "exact" scans every embedding; "hnsw" searches a graph built on first use.
+        self.vector_index = vector_index
+        self.ef_search = ef_search
+        # "int8" and "binary" scan a quantized copy and rescore the best `rescore` rows in float32.
+        self.precision = precision
+        self.rescore = rescore
         self.embeddings = None
+        # Unit-length `embeddings` (the array itself if already normalized, as
+        # cached embeddings are), so a query is scored with one matrix-vector
+        # product; not kept with a quantized precision.
+        self.normalized_embeddings = None
+        self.movie_hnsw_index: HNSWIndex | None = None
+        self.movie_quantized_embeddings: Int8Embeddings | BinaryEmbeddings | None = None
+        # The `load_movies()` list or its `StoredDocuments`, indexed by embedding row.
         self.documents = None
-        self.document_map = {}
+        # Texts the last build had to encode; unchanged texts reuse cached rows.
+        self.encoded_count = 0
+        # None encodes a build in one `model.encode` call; a worker count
+        # switches to the length-bucketed pipeline (1 runs it in-process).
+        self.embed_workers: int | None = None
+        # Throughput of the last build's encode, or None if every row was reused.
+        self.encode_stats: dict[str, Any] | None = None
+        # Bumped whenever the embeddings change, so cached results are dropped.
+        self.snapshot_version = 0
+        self.result_cache = ResultCache()
 
     def generate_embedding(self, text: str):
         if text.strip() == "":
             raise ValueError("text contains only empty string or whitespace")
 
-        embedding = self.model.encode([text])
-        return embedding[0]
+        return self.query_cache.get_or_encode(self.model_name, normalize_query(text), self.model.encode)
 
-    def build_embeddings(self, documents: list[dict[Any, Any]]):
+    def generate_embeddings(self, texts: list[str]) -> np.ndarray:
+        """Embeddings of `texts` as rows; the uncached ones are encoded in one batched forward pass."""
+        if any(text.strip() == "" for text in texts):
+            raise ValueError("text contains only empty string or whitespace")
+        texts = [normalize_query(text) for text in texts]
+        return np.stack(self.query_cache.get_or_encode_many(self.model_name, texts, self.model.encode))
+
+    def encode_documents(self, texts: list[str]) -> np.ndarray:
+        """Unit-length embeddings of texts being added to an embedding cache; sets `encode_stats`."""
+        if self.embed_workers is not None:
+            embeddings, self.encode_stats = encode_bucketed(self.model, self.model_name, texts, self.embed_workers)
+            return normalize_rows(embeddings)
+        start = time.perf_counter()
+        embeddings = self.model.encode(texts, show_progress_bar=True)
+        seconds = time.perf_counter() - start
+        self.encode_stats = {
+            "texts": len(texts),
+            "workers": 1,
+            "seconds": seconds,
+            "texts_per_second": len(texts) / seconds if seconds else 0.0,
+        }
+        return normalize_rows(embeddings)
+
+    def set_embeddings(self, embeddings: np.ndarray):
+        self.embeddings = embeddings
+        self.normalized_embeddings = unit_rows(embeddings) if self.precision == "float32" else None
+        self.movie_hnsw_index = None
+        self.movie_quantized_embeddings = None
+        self.snapshot_version += 1
+
+    def movie_hnsw(self, m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION) -> HNSWIndex:
+        """HNSW graph over the movie embeddings, loaded from the cache or built and saved."""
+        if self.movie_hnsw_index is None:
+            self.movie_hnsw_index = load_or_build_hnsw(
+                MOVIE_HNSW_CACHE_PATH,
+                MOVIE_EMBEDDINGS_CACHE_PATH,
+                self.normalized_embeddings,
+                m,
+                ef_construction,
+                self.ef_search,
+            )
+        return self.movie_hnsw_index
+
+    def movie_quantized(self) -> Int8Embeddings | BinaryEmbeddings:
+        """The movie embeddings at `precision`, loaded from the cache or quantized and saved."""
+        if self.movie_quantized_embeddings is None:
+            self.movie_quantized_embeddings = load_or_quantize(
+                MOVIE_EMBEDDINGS_CACHE_PATH, self.embeddings, self.precision
+            )
+        return self.movie_quantized_embeddings
+
+    def movie_cache_manifest(self, documents, hash_texts: bool = True) -> dict[str, Any]:
+        return corpus_manifest(self.model_name, documents, movie_text, hash_texts=hash_texts)
+
+    def build_embeddings(self, documents):
         self.documents = documents
-        repr = []
-        for document in documents:
-            self.document_map[document["id"]] = document
-            repr.append(f"{document['title']}: {document['description']}")
-        self.embeddings = self.model.encode(repr, show_progress_bar=True)
-        with open(MOVIE_EMBEDDINGS_CACHE_PATH, "wb") as m_embeddings:
-            np.save(m_embeddings, self.embeddings)
-
-        m_embeddings.close()
+        repr = [movie_text(document) for document in documents]
+        hashes = text_hashes(repr)
+        self.encode_stats = None
+        embeddings, self.encoded_count = reuse_or_encode(
+            repr,
+            hashes,
+            load_reusable_embeddings(MOVIE_EMBEDDINGS_CACHE_PATH, self.model_name),
+            self.encode_documents,
+        )
+        self.set_embeddings(
+            save_embeddings(MOVIE_EMBEDDINGS_CACHE_PATH, embeddings, self.movie_cache_manifest(documents), hashes)
+        )
         return self.embeddings
 
-    def load_or_create_embeddings(self, documents: list[dict[Any, Any]]):
+    def load_or_create_embeddings(self, documents):
         if not bool(self.documents) :
             self.documents = documents
-        if not bool(self.document_map):
-            for document in documents:
-                self.document_map[document["id"]] = document
 
-        if os.path.exists(MOVIE_EMBEDDINGS_CACHE_PATH):
-            self.embeddings = np.load(MOVIE_EMBEDDINGS_CACHE_PATH)
-            if len(self.embeddings) == len(documents):
-                return self.embeddings
+        embeddings = load_embeddings(
+            MOVIE_EMBEDDINGS_CACHE_PATH, self.movie_cache_manifest(documents, hash_texts=False)
+        )
+        if embeddings is not None:
+            self.set_embeddings(embeddings)
+            return self.embeddings
 
         return self.build_embeddings(documents)
 
     def search(self, query: str, limit) -> list[SearchResult]:
         if self.embeddings is None:
             raise ValueError("No embeddings loaded. Call `load_or_create_embeddings` first")
-        embedding = self.generate_embedding(query)
-        sim_scores = []
-        for i, document in enumerate(self.documents):
-            sim_scores.append((cosine_similarity(embedding, self.embeddings[i]), document))
-
-        sorted_scores = heapq.nlargest(limit, sim_scores, lambda x: x[0])
-
+        key = (
+            "search",
+            normalize_query(query),
+            limit,
+            self.vector_index,
+            self.ef_search,
+            self.precision,
+            self.rescore,
+        )
+        sorted_scores = self.result_cache.get_or_compute(
+            key, self.snapshot_version, lambda: self.__search_scores(self.generate_embedding(query), limit)
+        )
+        return self.__format_results(sorted_scores)
+
+    def search_many(self, queries: list[str], limit: int) -> list[list[SearchResult]]:
+        """`search` for every query, with one batched encode.
+
+        The exact float32 scan scores each batch of queries with one matrix
+        product. Results bypass the result cache.
+        """
+        if self.embeddings is None:
+            raise ValueError("No embeddings loaded. Call `load_or_create_embeddings` first")
+        if not queries:
+            return []
+        embeddings = self.generate_embeddings(queries)
+        if self.vector_index != "exact" or self.precision != "float32":
+            return [self.__format_results(self.__search_scores(embedding, limit)) for embedding in embeddings]
+        results = []
+        batch = max(1, SEMANTIC_BATCH_MAX_CELLS // max(len(self.normalized_embeddings), 1))
+        for start in range(0, len(embeddings), batch):
+            batch_results = cosine_top_k_many(self.normalized_embeddings, embeddings[start : start + batch], limit)
+            for indices, scores in batch_results:
+                sorted_scores = [(float(score), self.documents[i]) for i, score in zip(indices.tolist(), scores.tolist())]
+                results.append(self.__format_results(sorted_scores))
+        return results
+
+    def __format_results(self, sorted_scores: list[tuple[float, dict]]) -> list[SearchResult]:
         return list(map(lambda x: format_search_result(x[1]["id"], x[1]["title"], x[1]["description"], x[0]), sorted_scores))
 
+    def __search_scores(self, embedding: np.ndarray, limit: int) -> list[tuple[float, dict]]:
+        if self.vector_index == "hnsw":
+            indices, scores = self.movie_hnsw().search(normalize_rows(embedding), limit, self.ef_search)
+        elif self.precision != "float32":
+            indices, scores = quantized_top_k(self.movie_quantized(), self.embeddings, embedding, limit, self.rescore)
+        else:
+            indices, scores = cosine_top_k(self.normalized_embeddings, embedding, limit)
+        return [(float(score), self.documents[i]) for i, score in zip(indices.tolist(), scores.tolist())]
+
 class ChunkedSemanticSearch(SemanticSearch):
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2") -> None:
-        super().__init__(model_name)
+    # Chunks can also be searched through the compressed IVF-PQ index;
+    # movie-level `search` treats "ivfpq" as "exact".
+    vector_indexes = CHUNK_VECTOR_INDEXES
+
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        vector_index: str = "exact",
+        ef_search: int = HNSW_EF_SEARCH,
+        nprobe: int = IVF_NPROBE,
+        rerank: int = IVF_RERANK,
+        precision: str = "float32",
+        rescore: int = QUANTIZED_RESCORE,
+    ) -> None:
+        super().__init__(model_name, vector_index, ef_search, precision, rescore)
+        self.nprobe = nprobe
+        self.rerank = rerank
         self.chunk_embeddings = None
-        self.chunk_metadata = None
+        self.normalized_chunk_embeddings = None
+        self.chunk_hnsw_index: HNSWIndex | None = None
+        self.chunk_ivfpq_index: IVFPQIndex | None = None
+        self.chunk_quantized_embeddings: Int8Embeddings | BinaryEmbeddings | None = None
+        self.chunk_metadata: ChunkMetadata | None = None
+
+    def set_chunk_embeddings(self, chunk_embeddings: np.ndarray):
+        self.chunk_embeddings = chunk_embeddings
+        self.normalized_chunk_embeddings = unit_rows(chunk_embeddings) if self.precision == "float32" else None
+        self.chunk_hnsw_index = None
+        self.chunk_ivfpq_index = None
+        self.chunk_quantized_embeddings = None
+        self.snapshot_version += 1
+
+    def chunk_hnsw(self, m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION) -> HNSWIndex:
+        """HNSW graph over the chunk embeddings, loaded from the cache or built and saved."""
+        if self.chunk_hnsw_index is None:
+            self.chunk_hnsw_index = load_or_build_hnsw(
+                CHUNK_HNSW_CACHE_PATH,
+                CHUNK_EMBEDDINGS_CACHE_PATH,
+                self.normalized_chunk_embeddings,
+                m,
+                ef_construction,
+                self.ef_search,
+            )
+        return self.chunk_hnsw_index
+
+    def chunk_ivfpq(self, nlist: int | None = None, subspaces: int = PQ_SUBSPACES) -> IVFPQIndex:
+        """IVF-PQ index over the chunk embeddings, loaded from the cache or trained and saved."""
+        if self.chunk_ivfpq_index is None:
+            self.chunk_ivfpq_index = load_or_train_ivfpq(
+                CHUNK_IVFPQ_CACHE_PATH,
+                CHUNK_EMBEDDINGS_CACHE_PATH,
+                self.normalized_chunk_embeddings,
+                nlist,
+                subspaces,
+            )
+        return self.chunk_ivfpq_index
+
+    def chunk_quantized(self) -> Int8Embeddings | BinaryEmbeddings:
+        """The chunk embeddings at `precision`, loaded from the cache or quantized and saved."""
+        if self.chunk_quantized_embeddings is None:
+            self.chunk_quantized_embeddings = load_or_quantize(
+                CHUNK_EMBEDDINGS_CACHE_PATH, self.chunk_embeddings, self.precision
+            )
+        return self.chunk_quantized_embeddings
+
+    def chunk_cache_manifest(self, documents, hash_texts: bool = True) -> dict[str, Any]:
+        return corpus_manifest(
+            self.model_name,
+            documents,
+            lambda document: document["description"],
+            {"max_sentences": CHUNK_MAX_SENTENCES, "overlap": CHUNK_OVERLAP_SENTENCES},
+            hash_texts,
+        )
 
     def build_chunk_embeddings(self, documents):
         self.documents = documents
-        repr = []
-        for document in documents:
-            self.document_map[document["id"]] = document
         chunks = []
-        meta_chunks = []
-        for i, document in enumerate(self.documents):
-            if not document["description"]:
-                continue
-            sem_chunks = semantic_chunk_command(document["description"], 4, 1)
+        chunk_counts = []
+        for document in self.documents:
+            sem_chunks = []
+            if document["description"]:
+                sem_chunks = semantic_chunk_command(document["description"], CHUNK_MAX_SENTENCES, CHUNK_OVERLAP_SENTENCES)
             chunks.extend(sem_chunks)
-            for j, chunk in enumerate(sem_chunks):
-                meta_chunks.append({"movie_idx": i, "chunk_idx": j, "total_chunks": len(sem_chunks)})
-
-        self.chunk_embeddings = self.model.encode(chunks)
-        self.chunk_metadata = meta_chunks
-
-        with open(CHUNK_EMBEDDINGS_CACHE_PATH, "wb") as c_embeddings:
-            np.save(c_embeddings, self.chunk_embeddings)
-
-        with open(CHUNK_METADATA_CACHE_PATH, "w") as c_metadata:
-            json.dump({"chunks": meta_chunks, "total_chunks": len(chunks)}, c_metadata, indent=2)
-
-        c_embeddings.close()
-        c_metadata.close()
-
+            chunk_counts.append(len(sem_chunks))
+
+        self.chunk_metadata = ChunkMetadata.from_counts(chunk_counts)
+        hashes = text_hashes(chunks)
+        self.encode_stats = None
+        embeddings, self.encoded_count = reuse_or_encode(
+            chunks,
+            hashes,
+            load_reusable_embeddings(CHUNK_EMBEDDINGS_CACHE_PATH, self.model_name),
+            self.encode_documents,
+        )
+
+        # The metadata goes first: the embeddings manifest, written last,
+        # is what marks the whole chunk cache as valid.
+        self.chunk_metadata.save(CHUNK_METADATA_CACHE_PATH)
+
+        self.set_chunk_embeddings(
+            save_embeddings(CHUNK_EMBEDDINGS_CACHE_PATH, embeddings, self.chunk_cache_manifest(documents), hashes)
+        )
         return self.chunk_embeddings
 
-    def load_or_create_chunk_embeddings(self, documents: list[dict]) -> np.ndarray:
+    def load_or_create_chunk_embeddings(self, documents) -> np.ndarray:
         if not bool(self.documents) :
             self.documents = documents
-        if not bool(self.document_map):
-            for document in documents:
-                self.document_map[document["id"]] = document
-
-        if os.path.exists(CHUNK_EMBEDDINGS_CACHE_PATH):
-            self.chunk_embeddings = np.load(CHUNK_EMBEDDINGS_CACHE_PATH)
 
-        if os.path.exists(CHUNK_METADATA_CACHE_PATH):
-            with open(CHUNK_METADATA_CACHE_PATH, "r") as f:
-                self.chunk_metadata = json.load(f)["chunks"]
-
-        return self.chunk_embeddings if self.chunk_embeddings is not None else self.build_chunk_embeddings(documents)
-
-    def search_chunks(self, query: str, limit: int = 10) -> list[SearchResult]:
-        embedding = self.generate_embedding(query)
-        chunk_scores = []
-        for i, chunk_embed in enumerate(self.chunk_embeddings):
-            similarity = cosine_similarity(embedding, chunk_embed)
-            metadata = self.chunk_metadata[i]
-            movie_idx = metadata["movie_idx"]
-            chunk_idx = metadata["chunk_idx"]
-            chunk_scores.append({"chunk_idx": chunk_idx, "movie_idx": movie_idx, "score": similarity})
-        movie_scores = {}
-        for chunk_score in chunk_scores:
-            movie_idx = chunk_score["movie_idx"]
-            score = chunk_score["score"]
-            if movie_idx not in movie_scores or movie_scores[movie_idx]< score:
-                movie_scores[movie_idx] = score
-
-        sorted_scores = heapq.nlargest(limit, movie_scores.items(), key=lambda x: x[1])
-
-        return list(map(lambda x: format_search_result(self.documents[x[0]]["id"], self.documents[x[0]]["title"], self.documents[x[0]]["description"], x[1]), sorted_scores))
-
-
-def search_chunked_command(query: str, limit: int=5):
-    ss = ChunkedSemanticSearch()
-    documents = load_movies()
+        embeddings = load_embeddings(
+            CHUNK_EMBEDDINGS_CACHE_PATH, self.chunk_cache_manifest(documents, hash_texts=False)
+        )
+        if embeddings is not None and os.path.exists(CHUNK_METADATA_CACHE_PATH):
+            chunk_metadata = ChunkMetadata.load(CHUNK_METADATA_CACHE_PATH)
+            if len(chunk_metadata) == len(embeddings) and chunk_metadata.movie_count == len(documents):
+                self.chunk_metadata = chunk_metadata
+                self.set_chunk_embeddings(embeddings)
+                return self.chunk_embeddings
+
+        return self.build_chunk_embeddings(documents)
+
+    def search_chunks(
+        self, query: str, limit: int = 10, doc_ids: set[int] | None = None
+    ) -> list[SearchResult]:
+        """Best chunk score per movie; `doc_ids` limits scoring to those movies.
+
+        With the HNSW or IVF-PQ index, or a quantized precision, the
+        `limit * SEARCH_MULTIPLIER` nearest chunks are aggregated; IVF-PQ
+        and quantized scans rescore their best candidates against the float
+        embeddings. Neither index can honour `doc_ids`, so filtered searches
+        scan every chunk.
+        """
+        key = (
+            "chunks",
+            normalize_query(query),
+            limit,
+            None if doc_ids is None else frozenset(doc_ids),
+            self.vector_index,
+            self.ef_search,
+            self.nprobe,
+            self.rerank,
+            self.precision,
+            self.rescore,
+        )
+        sorted_scores = self.result_cache.get_or_compute(
+            key, self.snapshot_version, lambda: self.__chunk_scores(query, limit, doc_ids)
+        )
+        return self.__format_movie_scores(sorted_scores)
+
+    def search_many(
+        self, queries: list[str], limit: int = 10, doc_ids: set[int] | None = None
+    ) -> list[list[SearchResult]]:
+        """`search_chunks` for every query, with one batched encode.
+
+        The exact float32 scan scores each batch of queries against every
+        chunk with one matrix product, and each row is folded to its best
+        chunk per movie. Results bypass the result cache.
+        """
+        if not queries:
+            return []
+        query_vectors = normalize_rows(self.generate_embeddings(queries))
+        if self.vector_index != "exact" or self.precision != "float32":
+            return [
+                self.__format_movie_scores(
+                    self.__movie_scores(*self.__chunk_candidates(query_vector, limit, doc_ids), limit, doc_ids)
+                )
+                for query_vector in query_vectors
+            ]
+        results = []
+        batch = max(1, SEMANTIC_BATCH_MAX_CELLS // max(len(self.normalized_chunk_embeddings), 1))
+        for start in range(0, len(query_vectors), batch):
+            similarities = query_vectors[start : start + batch] @ self.normalized_chunk_embeddings.T
+            for movie_scores in self.chunk_metadata.movie_max(similarities):
+                results.append(self.__format_movie_scores(self.__top_movies(None, movie_scores, limit, doc_ids)))
+        return results
+
+    def __format_movie_scores(self, sorted_scores: list[tuple[int, float]]) -> list[SearchResult]:
+        results = []
+        for movie_idx, score in sorted_scores:
+            document = self.documents[movie_idx]
+            results.append(format_search_result(document["id"], document["title"], document["description"], score))
+        return results
+
+    def __chunk_scores(self, query: str, limit: int, doc_ids: set[int] | None) -> list[tuple[int, float]]:
+        query_vector = normalize_rows(self.generate_embedding(query))
+        return self.__movie_scores(*self.__chunk_candidates(query_vector, limit, doc_ids), limit, doc_ids)
+
+    def __chunk_candidates(
+        self, query_vector: np.ndarray, limit: int, doc_ids: set[int] | None
+    ) -> tuple[np.ndarray | None, np.ndarray]:
+        """(chunk ids, similarities) to aggregate for a unit-length query vector.
+
+        Chunk ids are None when every chunk was scored, in row order.
+        """
+        if self.vector_index == "hnsw" and doc_ids is None:
+            chunk_ids, similarities = self.chunk_hnsw().search(
+                query_vector, limit * SEARCH_MULTIPLIER, self.ef_search
+            )
+        elif self.vector_index == "ivfpq" and doc_ids is None:
+            chunk_ids, similarities = self.chunk_ivfpq().search(
+                query_vector, limit * SEARCH_MULTIPLIER, self.nprobe, self.rerank, self.chunk_embeddings
+            )
+        elif self.precision != "float32":
+            allowed = None
+            if doc_ids is not None:
+                allowed = self.__allowed_movies(doc_ids)[self.chunk_metadata.movie_idx]
+            chunk_ids, similarities = quantized_top_k(
+                self.chunk_quantized(),
+                self.chunk_embeddings,
+                query_vector,
+                limit * SEARCH_MULTIPLIER,
+                self.rescore,
+                allowed,
+            )
+        else:
+            chunk_ids, similarities = None, self.normalized_chunk_embeddings @ query_vector
+        return chunk_ids, similarities
+
+    def __movie_scores(
+        self, chunk_ids: np.ndarray | None, similarities: np.ndarray, limit: int, doc_ids: set[int] | None
+    ) -> list[tuple[int, float]]:
+        """(movie index, best chunk similarity) of the `limit` best movies among these chunks."""
+        if chunk_ids is None:
+            return self.__top_movies(None, self.chunk_metadata.movie_max(similarities), limit, doc_ids)
+        return self.__top_movies(*self.chunk_metadata.movie_max_at(chunk_ids, similarities), limit, doc_ids)
+
+    def __top_movies(
+        self, movies: np.ndarray | None, scores: np.ndarray, limit: int, doc_ids: set[int] | None
+    ) -> list[tuple[int, float]]:
+        """The `limit` best (movie index, score) pairs; `movies` None means `scores` covers every movie."""
+        if doc_ids is not None:
+            allowed = self.__allowed_movies(doc_ids)
+            scores = np.where(allowed if movies is None else allowed[movies], scores, -np.inf)
+        best = top_k_indices(scores, limit)
+        best = best[np.isfinite(scores[best])]
+        movie_ids = best if movies is None else movies[best]
+        return list(zip(movie_ids.tolist(), scores[best].tolist()))
+
+    def __allowed_movies(self, doc_ids: set[int]) -> np.ndarray:
+        if isinstance(self.documents, StoredDocuments):
+            return np.isin(self.documents.ids, np.fromiter(doc_ids, dtype=np.int64, count=len(doc_ids)))
+        return np.fromiter(
+            (document["id"] in doc_ids for document in self.documents), dtype=bool, count=len(self.documents)
+        )
+
+
+def corpus_manifest(
+    model_name: str,
+    documents,
+    text,
+    chunking: dict[str, Any] | None = None,
+    hash_texts: bool = True,
+) -> dict[str, Any]:
+    """`embedding_manifest` of the `text` of every document.
+
+    `StoredDocuments` also record the stamp of the file they came from.
+    With `hash_texts` False they are checked by that stamp alone, so a
+    cached run decodes none of them.
+    """
+    source = documents.source if isinstance(documents, StoredDocuments) else None
+    texts = map(text, documents) if hash_texts or source is None else None
+    return embedding_manifest(model_name, texts, chunking, source)
+
+
+def movie_text(document: dict[Any, Any]) -> str:
+    """The text a movie's embedding is computed from."""
+    return f"{document['title']}: {document['description']}"
+
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace so trivially different spellings share a cache entry."""
+    return " ".join(query.split())
+
+
+def search_chunked_command(
+    query: str,
+    limit: int=5,
+    vector_index: str = "exact",
+    ef_search: int = HNSW_EF_SEARCH,
+    nprobe: int = IVF_NPROBE,
+    rerank: int = IVF_RERANK,
+    precision: str = "float32",
+    rescore: int = QUANTIZED_RESCORE,
+):
+    ss = ChunkedSemanticSearch(
+        vector_index=vector_index,
+        ef_search=ef_search,
+        nprobe=nprobe,
+        rerank=rerank,
+        precision=precision,
+        rescore=rescore,
+    )
+    documents = load_stored_movies()
     embeddings = ss.load_or_create_chunk_embeddings(documents)
     results = ss.search_chunks(query, limit)
     for i, res in enumerate(results, 1):
@@ -149,11 +536,38 @@ def search_chunked_command(query: str, limit: int=5):
         print(f"\n{i}. {title} (score: {score:.4f})")
         print(f"   {description}...")
 
-def embed_chunks_command():
+def embed_chunks_command(workers: int | None = None):
     ss = ChunkedSemanticSearch()
-    documents = load_movies()
+    ss.embed_workers = workers
+    documents = load_stored_movies()
     embeddings = ss.load_or_create_chunk_embeddings(documents)
-    print(f"Generated {len(embeddings)} chunked embeddings")
+    print(f"Generated {len(embeddings)} chunked embeddings ({ss.encoded_count} encoded, the rest reused)")
+    if ss.encode_stats is not None:
+        stats = ss.encode_stats
+        line = (
+            f"Encoded {stats['texts']} chunks in {stats['seconds']:.1f}s: "
+            f"{stats['texts_per_second']:.1f} chunks/sec with {stats['workers']} worker(s)"
+        )
+        if "padding" in stats:
+            line += f", {stats['buckets']} length buckets, {stats['padding']:.1%} padding"
+        print(line)
+
+def build_hnsw_command(
+    chunks: bool = True, m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION
+) -> HNSWIndex:
+    documents = load_stored_movies()
+    if chunks:
+        ss = ChunkedSemanticSearch()
+        ss.load_or_create_chunk_embeddings(documents)
+        return ss.chunk_hnsw(m, ef_construction)
+    ss = SemanticSearch()
+    ss.load_or_create_embeddings(documents)
+    return ss.movie_hnsw(m, ef_construction)
+
+def build_ivfpq_command(nlist: int | None = None, subspaces: int = PQ_SUBSPACES) -> IVFPQIndex:
+    ss = ChunkedSemanticSearch()
+    ss.load_or_create_chunk_embeddings(load_stored_movies())
+    return ss.chunk_ivfpq(nlist, subspaces)
 
 def verify_model():
     ss = SemanticSearch()
@@ -173,7 +587,7 @@ def embed_text(text: str):
 
 def verify_embeddings():
     ss = SemanticSearch()
-    documents = load_movies()
+    documents = load_stored_movies()
     embeddings = ss.load_or_create_embeddings(documents)
     print(f"Number of docs:   {len(documents)}")
     print(
@@ -189,9 +603,16 @@ def embed_query_text(query: str):
     print(f"First 5 dimensions: {embedding[:5]}")
     print(f"Shape: {embedding.shape}")
 
-def search_command(query: str, limit: int=5):
-    ss = SemanticSearch()
-    documents = load_movies()
+def search_command(
+    query: str,
+    limit: int=5,
+    vector_index: str = "exact",
+    ef_search: int = HNSW_EF_SEARCH,
+    precision: str = "float32",
+    rescore: int = QUANTIZED_RESCORE,
+):
+    ss = SemanticSearch(vector_index=vector_index, ef_search=ef_search, precision=precision, rescore=rescore)
+    documents = load_stored_movies()
     embeddings = ss.load_or_create_embeddings(documents)
     resp = ss.search(query, limit)
     for i, r in enumerate(resp, 1):
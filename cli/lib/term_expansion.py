@@ -0,0 +1,73 @@
+from bisect import bisect_left
+
+from .index_format import TermDictionary
+
+# No UTF-8 sequence contains the byte 0xff, so `key + PREFIX_END` sorts after
+# every term that starts with `key` and before every term that does not.
+PREFIX_END = b"\xff"
+# The same bound for decoded terms: the largest code point.
+PREFIX_END_CHAR = chr(0x10FFFF)
+
+
+def prefix_range(terms: TermDictionary, prefix: str) -> tuple[int, int]:
+    """Term ids [start, end) of the dictionary terms starting with `prefix`."""
+    key = prefix.encode("utf-8")
+    return terms.lower_bound(key), terms.lower_bound(key + PREFIX_END)
+
+
+def auto_max_edits(term: str) -> int:
+    """Edits tolerated for a term of this length: none up to 2, one up to 5, else two."""
+    if len(term) <= 2:
+        return 0
+    return 1 if len(term) <= 5 else 2
+
+
+def fuzzy_terms(terms: TermDictionary, term: str, max_edits: int) -> list[tuple[int, int]]:
+    """(term id, edit distance) of every dictionary term within `max_edits` of `term`.
+
+    The sorted dictionary is walked as a trie. Row `d` of the Levenshtein
+    table depends only on the first `d` characters of a candidate, so
+    consecutive terms reuse the rows of their shared prefix, and distances
+    are capped at `max_edits + 1`. A row whose minimum exceeds `max_edits`
+    rules out every term under that prefix, and the whole subtree is
+    skipped with one binary search.
+    """
+    strings = terms.decoded()
+    width = len(term) + 1
+    cap = max_edits + 1
+    rows = [[min(j, cap) for j in range(width)]]
+    previous = ""
+    matches = []
+    i = 0
+    while i < len(strings):
+        candidate = strings[i]
+        common = 0
+        shared = min(len(previous), len(candidate), len(rows) - 1)
+        while common < shared and previous[common] == candidate[common]:
+            common += 1
+        del rows[common + 1 :]
+        previous = candidate
+
+        pruned_at = 0
+        for depth in range(common, len(candidate)):
+            char = candidate[depth]
+            above = rows[-1]
+            # Cells more than `max_edits` off the diagonal can never be within
+            # bound, so only the band around it is computed; the rest stay capped.
+            row = [cap] * width
+            if depth < max_edits:
+                row[0] = depth + 1
+            for j in range(max(1, depth + 1 - max_edits), min(width, depth + 2 + max_edits)):
+                row[j] = min(row[j - 1] + 1, above[j] + 1, above[j - 1] + (term[j - 1] != char), cap)
+            rows.append(row)
+            if min(row) > max_edits:
+                pruned_at = depth + 1
+                break
+
+        if pruned_at:
+            i = bisect_left(strings, candidate[:pruned_at] + PREFIX_END_CHAR, i)
+            continue
+        if rows[-1][-1] <= max_edits:
+            matches.append((i, rows[-1][-1]))
+        i += 1
+    return matches
@@ -1,9 +1,15 @@
 import argparse
 
-from lib.multimodal_search import verify_image_embedding, image_search_command
+from lib.multimodal_search import verify_image_embedding, image_search_command, text_search_command
+from lib.query_embedding_cache import shared_query_cache
 
 def main():
     parser = argparse.ArgumentParser(description="Multimodal Search CLI")
+    parser.add_argument(
+        "--disk-query-cache",
+        action="store_true",
+        help="Also cache query embeddings on disk, shared across runs",
+    )
     subparsers = parser.add_subparsers(
         dest="command",
         help="Available commands"
@@ -29,14 +35,29 @@ def main():
         help="The image path. Ex: data/image.jpg"
     )
 
+    text_search_parser = subparsers.add_parser(
+        "text_search",
+        help="Search the movies with a text query in the same embedding space"
+    )
+    text_search_parser.add_argument(
+        "query",
+        type=str,
+        help="The query to search for"
+    )
+
     args = parser.parse_args()
+    if args.disk_query_cache:
+        shared_query_cache.enable_disk()
 
     match args.command:
         case "verify_image_embedding":
             verify_image_embedding(args.image_path)
 
-        case "image_search":
-            results = image_search_command(args.image_path)
+        case "image_search" | "text_search":
+            if args.command == "image_search":
+                results = image_search_command(args.image_path)
+            else:
+                results = text_search_command(args.query)
             for i, res in enumerate(results, 1):
                 print(f"{i}. {res['title']} (similarity: {res['score']:.3f})")
                 print(f"\t{res['document'][:100]}...")
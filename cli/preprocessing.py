@@ -1,18 +1,111 @@
 import string
+from functools import lru_cache
+from typing import Callable, Iterable
 
 from nltk.stem import PorterStemmer
 from search_utils import load_stopwords
 
+from constants import STEM_CACHE_SIZE
 
-def preprocess_text(s: str) -> list[str]:
-    text = s.lower()
-    translator = str.maketrans("", "", string.punctuation)
+PUNCTUATION_TRANSLATOR = str.maketrans("", "", string.punctuation)
+
+
+class Analyzer:
+    """Reusable text analysis pipeline.
+
+    Stopwords, the stemmer and the punctuation table are set up once per
+    instance, and stems are memoized in a bounded LRU cache keyed by the
+    surface token. Stages can be switched off individually; the defaults
+    reproduce `preprocess_text`.
+    """
+
+    def __init__(
+        self,
+        lowercase: bool = True,
+        strip_punctuation: bool = True,
+        remove_stopwords: bool = True,
+        stem: bool = True,
+        stopwords: Iterable[str] | None = None,
+        stem_cache_size: int = STEM_CACHE_SIZE,
+    ):
+        self.lowercase = lowercase
+        self.strip_punctuation = strip_punctuation
+        self.remove_stopwords = remove_stopwords
+        self.stemming = stem
+        self.stopwords = frozenset(stopwords if stopwords is not None else load_stopwords())
+        self.stemmer = PorterStemmer()
+        self.stem = lru_cache(maxsize=stem_cache_size)(self.stemmer.stem)
+
+        self.token_stages: list[Callable[[list[str]], list[str]]] = []
+        if remove_stopwords:
+            self.token_stages.append(self.__remove_stopwords)
+        if stem:
+            self.token_stages.append(self.__stem)
+
+    def __remove_stopwords(self, tokens: list[str]) -> list[str]:
+        stopwords = self.stopwords
+        return [token for token in tokens if token not in stopwords]
+
+    def __stem(self, tokens: list[str]) -> list[str]:
+        stem = self.stem
+        return [stem(token) for token in tokens]
+
+    def split(self, text: str) -> list[str]:
+        """Words of `text` after case folding and punctuation stripping, before any token stage."""
+        if self.lowercase:
+            text = text.lower()
+        if self.strip_punctuation:
+            text = text.translate(PUNCTUATION_TRANSLATOR)
+        return text.split()
+
+    def analyze(self, text: str) -> list[str]:
+        tokens = self.split(text)
+        for stage in self.token_stages:
+            tokens = stage(tokens)
+        return tokens
+
+    def surface_tokens(self, text: str) -> list[str]:
+        """`analyze` without stemming: the indexed words as they are written."""
+        tokens = self.split(text)
+        if self.remove_stopwords:
+            tokens = self.__remove_stopwords(tokens)
+        return tokens
 
-    translated = text.translate(translator)
-    raw_tokens = tokenization(translated)
-    rsw_tokens = remove_stopwords(raw_tokens)
-    stemmed_tokens = stemming(rsw_tokens)
-    return stemmed_tokens
+    def analyze_positions(self, text: str) -> tuple[list[str], list[int]]:
+        """`analyze` plus the position of each token in the unfiltered stream.
+
+        Removed stopwords still take up a position, so "lord of the rings"
+        keeps a gap of three between "lord" and "ring".
+        """
+        tokens = self.split(text)
+        positions = list(range(len(tokens)))
+        if self.remove_stopwords:
+            stopwords = self.stopwords
+            positions = [p for p, token in zip(positions, tokens) if token not in stopwords]
+            tokens = [token for token in tokens if token not in stopwords]
+        if self.stemming:
+            tokens = self.__stem(tokens)
+        return tokens, positions
+
+    def analyze_many(self, texts: Iterable[str]) -> list[list[str]]:
+        return [self.analyze(text) for text in texts]
+
+    def stem_cache_info(self):
+        return self.stem.cache_info()
+
+
+_default_analyzer: Analyzer | None = None
+
+
+def get_analyzer() -> Analyzer:
+    global _default_analyzer
+    if _default_analyzer is None:
+        _default_analyzer = Analyzer()
+    return _default_analyzer
+
+
+def preprocess_text(s: str) -> list[str]:
+    return get_analyzer().analyze(s)
 
 
 def tokenization(s: str) -> list[str]:
@@ -21,13 +114,10 @@ def tokenization(s: str) -> list[str]:
 
 
 def remove_stopwords(tokens: list[str]) -> list[str]:
-    stopwords = load_stopwords()
+    stopwords = get_analyzer().stopwords
     return list(filter(lambda x: x not in stopwords, tokens))
 
 
 def stemming(tokens: list[str]) -> list[str]:
-    stemmer = PorterStemmer()
-    stemmed_tokens = []
-    for token in tokens:
-        stemmed_tokens.append(stemmer.stem(token))
-    return stemmed_tokens
+    stem = get_analyzer().stem
+    return [stem(token) for token in tokens]
@@ -2,7 +2,22 @@
 
 import argparse
 
+from constants import (
+    CHUNK_VECTOR_INDEXES,
+    EMBEDDING_PRECISIONS,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    HNSW_M,
+    IVF_NPROBE,
+    IVF_RERANK,
+    PQ_SUBSPACES,
+    QUANTIZED_RESCORE,
+    VECTOR_INDEXES,
+)
+from lib.query_embedding_cache import shared_query_cache
 from lib.semantic_search import (
+    build_hnsw_command,
+    build_ivfpq_command,
     embed_query_text,
     embed_text,
     verify_embeddings,
@@ -15,8 +30,28 @@ from lib.semantic_search import (
 )
 
 
+def add_precision_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--precision",
+        choices=EMBEDDING_PRECISIONS,
+        default="float32",
+        help="Scan float32 embeddings, or an int8 / 1-bit copy rescored in float32, default: float32",
+    )
+    parser.add_argument(
+        "--rescore",
+        default=QUANTIZED_RESCORE,
+        type=int,
+        help=f"Quantized candidates rescored in float32, default: {QUANTIZED_RESCORE}",
+    )
+
+
 def main():
     parser = argparse.ArgumentParser(description="Semantic Search CLI")
+    parser.add_argument(
+        "--disk-query-cache",
+        action="store_true",
+        help="Also cache query embeddings on disk, shared across runs",
+    )
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
     verify_parser = subparsers.add_parser("verify", help="Verify the model used")
@@ -47,6 +82,14 @@ def main():
     search_parser.add_argument(
         "--limit", required=False, default=5, type=int, help="Limit for the results. default: 5"
     )
+    search_parser.add_argument(
+        "--index", choices=VECTOR_INDEXES, default="exact", help="Exact scan or approximate HNSW search, default: exact"
+    )
+    search_parser.add_argument(
+        "--ef-search", default=HNSW_EF_SEARCH, type=int, help=f"HNSW candidate list size, default: {HNSW_EF_SEARCH}"
+    )
+
+    add_precision_arguments(search_parser)
 
     chunk_parser = subparsers.add_parser(
         "chunk", help="Chunk the long text to smaller pieces for embedding"
@@ -83,6 +126,10 @@ def main():
     embed_chunks_parser = subparsers.add_parser(
         "embed_chunks", help="Generate chunk embeddings"
     )
+    embed_chunks_parser.add_argument(
+        "--workers", required=False, default=None, type=int,
+        help="Encode chunks bucketed by token length across this many processes, default: one plain encode",
+    )
 
     search_chunked_parser = subparsers.add_parser(
         "search_chunked", help="Search the data for the query"
@@ -95,8 +142,59 @@ def main():
     search_chunked_parser.add_argument(
         "--limit", required=False, default=5, type=int, help="The limit of the results to return"
     )
+    search_chunked_parser.add_argument(
+        "--index",
+        choices=CHUNK_VECTOR_INDEXES,
+        default="exact",
+        help="Exact scan, approximate HNSW search or compressed IVF-PQ search, default: exact",
+    )
+    search_chunked_parser.add_argument(
+        "--ef-search", default=HNSW_EF_SEARCH, type=int, help=f"HNSW candidate list size, default: {HNSW_EF_SEARCH}"
+    )
+    search_chunked_parser.add_argument(
+        "--nprobe", default=IVF_NPROBE, type=int, help=f"IVF lists to scan, default: {IVF_NPROBE}"
+    )
+    search_chunked_parser.add_argument(
+        "--rerank",
+        default=IVF_RERANK,
+        type=int,
+        help=f"IVF-PQ candidates rescored with the float embeddings (0 to skip), default: {IVF_RERANK}",
+    )
+
+    add_precision_arguments(search_chunked_parser)
+
+    build_hnsw_parser = subparsers.add_parser(
+        "build_hnsw", help="Build the HNSW graph over the chunk (or movie) embeddings"
+    )
+    build_hnsw_parser.add_argument(
+        "--movies", action="store_true", help="Index whole-movie embeddings instead of chunks"
+    )
+    build_hnsw_parser.add_argument(
+        "--m", default=HNSW_M, type=int, help=f"Neighbours per node, default: {HNSW_M}"
+    )
+    build_hnsw_parser.add_argument(
+        "--ef-construction",
+        default=HNSW_EF_CONSTRUCTION,
+        type=int,
+        help=f"Candidate list size while building, default: {HNSW_EF_CONSTRUCTION}",
+    )
+
+    build_ivfpq_parser = subparsers.add_parser(
+        "build_ivfpq", help="Train the IVF-PQ index over the chunk embeddings"
+    )
+    build_ivfpq_parser.add_argument(
+        "--nlist", default=None, type=int, help="Coarse lists, default: about 4 * sqrt(chunks)"
+    )
+    build_ivfpq_parser.add_argument(
+        "--subspaces",
+        default=PQ_SUBSPACES,
+        type=int,
+        help=f"PQ subspaces, i.e. code bytes per vector, default: {PQ_SUBSPACES}",
+    )
 
     args = parser.parse_args()
+    if args.disk_query_cache:
+        shared_query_cache.enable_disk()
     match args.command:
         case "verify":
             verify_model()
@@ -111,7 +209,7 @@ def main():
             embed_query_text(args.query)
 
         case "search":
-            search_command(args.query, args.limit)
+            search_command(args.query, args.limit, args.index, args.ef_search, args.precision, args.rescore)
 
         case "chunk":
             chunk_command(args.text, args.chunk_size, args.overlap)
@@ -123,10 +221,33 @@ def main():
                 print(f"{i+1}. {chunks[i]}")
 
         case "embed_chunks":
-            embed_chunks_command()
+            embed_chunks_command(args.workers)
 
         case "search_chunked":
-            search_chunked_command(args.query, args.limit)
+            search_chunked_command(
+                args.query,
+                args.limit,
+                args.index,
+                args.ef_search,
+                args.nprobe,
+                args.rerank,
+                args.precision,
+                args.rescore,
+            )
+
+        case "build_hnsw":
+            index = build_hnsw_command(not args.movies, args.m, args.ef_construction)
+            print(f"HNSW graph over {len(index.levels)} vectors with {len(index.graphs)} layers")
+
+        case "build_ivfpq":
+            index = build_ivfpq_command(args.nlist, args.subspaces)
+            report = index.memory_report()
+            print(f"IVF-PQ index over {report['vectors']} vectors: {index.nlist} lists, {index.subspaces} subspaces")
+            print(
+                f"{report['bytes_per_vector']} bytes per vector "
+                f"({report['amortized_bytes_per_vector']:.1f} with centroids and codebooks), "
+                f"vs {report['float32_bytes_per_vector']} as float32"
+            )
 
         case _:
             parser.print_help()
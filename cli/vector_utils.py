@@ -9,3 +9,65 @@ def cosine_similarity(vec1, vec2):
         return 0.0
 
     return dot_product / (norm1 * norm2)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """`matrix` as float32 with every row scaled to unit length; zero rows stay zero.
+
+    With normalized rows, cosine similarity against a normalized query is a
+    plain dot product, so the norms are paid once instead of per query.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def unit_rows(matrix: np.ndarray) -> np.ndarray:
+    """`matrix` itself if its rows are already unit length (or zero), else `normalize_rows(matrix)`.
+
+    Pre-normalized embeddings, e.g. a memory-mapped cache, are then scored
+    in place instead of being copied into private memory.
+    """
+    if matrix.dtype == np.float32:
+        norms = np.einsum("ij,ij->i", matrix, matrix)
+        if np.all((np.abs(norms - 1) < 1e-4) | (norms == 0)):
+            return matrix
+    return normalize_rows(matrix)
+
+
+def top_k_indices(scores: np.ndarray, limit: int) -> np.ndarray:
+    """Indices of the `limit` highest scores, best first, lower index first on ties."""
+    limit = min(limit, len(scores))
+    if limit <= 0:
+        return np.empty(0, dtype=np.int64)
+    if limit < len(scores):
+        # Everything tied with the k-th score is kept so ties resolve by index.
+        kth = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+        candidates = np.flatnonzero(scores >= kth)
+    else:
+        candidates = np.arange(len(scores))
+    order = np.lexsort((candidates, -scores[candidates]))[:limit]
+    return candidates[order]
+
+
+def cosine_top_k(normalized: np.ndarray, query: np.ndarray, limit: int) -> tuple[np.ndarray, np.ndarray]:
+    """Row indices and cosine similarities of the `limit` rows most similar to `query`.
+
+    `normalized` comes from `normalize_rows`; the whole scan is one
+    matrix-vector product.
+    """
+    scores = normalized @ normalize_rows(query)
+    indices = top_k_indices(scores, limit)
+    return indices, scores[indices]
+
+
+def cosine_top_k_many(
+    normalized: np.ndarray, queries: np.ndarray, limit: int
+) -> list[tuple[np.ndarray, np.ndarray]]:
+    """`cosine_top_k` for each row of `queries`, scored with one matrix product."""
+    scores = normalize_rows(queries) @ normalized.T
+    results = []
+    for row in scores:
+        indices = top_k_indices(row, limit)
+        results.append((indices, row[indices]))
+    return results
@@ -0,0 +1,33 @@
+import random
+
+import pytest
+
+from lib import inverted_index, segments
+
+WORDS = [
+    "space", "pirates", "ship", "treasure", "island", "robot", "galaxy", "ocean",
+    "storm", "captain", "hunter", "forest", "dragon", "castle", "river", "night",
+]
+STOPWORDS = ["the", "of", "and", "a"]
+
+
+def make_movies(count: int, seed: int = 0) -> list[dict]:
+    """`count` movies of random words, with ids neither contiguous nor in order."""
+    rng = random.Random(seed)
+    movies = []
+    for doc_id in rng.sample(range(1, count * 10), count):
+        title = " ".join(rng.choices(WORDS, k=rng.randint(1, 3))).title()
+        description = " ".join(rng.choices(WORDS + STOPWORDS, k=rng.randint(5, 30)))
+        movies.append({"id": doc_id, "title": title, "description": f"{description}."})
+    return movies
+
+
+@pytest.fixture
+def index_cache(tmp_path, monkeypatch):
+    """Point the index manifest, segments and document store at `tmp_path`."""
+    for module in (inverted_index, segments):
+        monkeypatch.setattr(module, "INDEX_CACHE_PATH", str(tmp_path / "index.json"))
+        monkeypatch.setattr(module, "INDEX_SEGMENTS_PATH", str(tmp_path / "segments"))
+    monkeypatch.setattr(inverted_index, "DOCSTORE_CACHE_PATH", str(tmp_path / "docstore.bin"))
+    monkeypatch.setattr(inverted_index, "IMPACTS_CACHE_PATH", str(tmp_path / "impacts.bin"))
+    return tmp_path
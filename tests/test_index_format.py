@@ -0,0 +1,99 @@
+import math
+from collections import Counter, defaultdict
+
+import pytest
+
+from lib.index_format import MappedIndex, concat_indexes, encode_index
+from lib.inverted_index import InvertedIndex, build_shard
+
+from .conftest import make_movies
+
+# (title tokens, description tokens) per doc id, already analyzed.
+DOCS = {
+    7: (["robot"], ["space", "robot", "robot"]),
+    3: (["space", "pirat"], ["pirat", "ship", "pirat"]),
+    12: ([], ["ship"]),
+}
+
+
+def encode_docs(compress: bool) -> bytes:
+    index = defaultdict(set)
+    term_frequencies = {}
+    doc_lengths = {}
+    positions = {}
+    field_frequencies = {}
+    for doc_id, (title, description) in DOCS.items():
+        tokens = title + description
+        for token in tokens:
+            index[token].add(doc_id)
+        term_frequencies[doc_id] = Counter(tokens)
+        doc_lengths[doc_id] = len(tokens)
+        positions[doc_id] = defaultdict(list)
+        for position, token in enumerate(tokens):
+            positions[doc_id][token].append(position)
+        field_frequencies[doc_id] = [Counter(title), Counter(description)]
+    return encode_index(
+        index,
+        term_frequencies,
+        doc_lengths,
+        positions=positions,
+        compress=compress,
+        field_frequencies=field_frequencies,
+        surface_forms={"pirates": "pirat", "space": "space", "unindexed": "nowhere"},
+    )
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_encode_index_round_trip(compress):
+    reader = MappedIndex(encode_docs(compress))
+
+    assert (reader.compressed is not None) == compress
+    assert reader.doc_ids.tolist() == [3, 7, 12]
+    assert reader.num_docs == 3
+    assert reader.doc_lengths.tolist() == [5, 4, 1]
+    assert reader.avg_doc_length == pytest.approx(10 / 3)
+    assert reader.terms.decoded() == ["pirat", "robot", "ship", "space"]
+    assert reader.ordinal(7) == 1
+    with pytest.raises(KeyError):
+        reader.ordinal(5)
+
+    for term in reader.terms.decoded():
+        ordinals, tfs = reader.postings(term)
+        doc_ids = reader.doc_ids[ordinals].tolist()
+        assert doc_ids == sorted(doc_id for doc_id, fields in DOCS.items() if term in fields[0] + fields[1])
+        assert tfs.tolist() == [Counter(sum(DOCS[doc_id], []))[term] for doc_id in doc_ids]
+        assert reader.doc_freq(term) == len(doc_ids)
+
+        _, field_tfs = reader.field_postings(term)
+        assert field_tfs.tolist() == [[fields.count(term) for fields in DOCS[doc_id]] for doc_id in doc_ids]
+
+        _, offsets, positions = reader.positions(term)
+        for i, doc_id in enumerate(doc_ids):
+            tokens = sum(DOCS[doc_id], [])
+            expected = [position for position, token in enumerate(tokens) if token == term]
+            assert positions[offsets[i] : offsets[i + 1]].tolist() == expected
+
+    assert reader.fields == ["title", "description"]
+    assert reader.field_lengths.tolist() == [[2, 3], [1, 3], [0, 1]]
+    for term, doc_freq in (("ship", 2), ("robot", 1)):
+        assert reader.idf(term) == pytest.approx(math.log((3 - doc_freq + 0.5) / (doc_freq + 0.5) + 1))
+    assert reader.idf("missing") is None
+    assert len(reader.postings("missing")[0]) == 0
+    assert reader.surface_forms() == {"pirates": "pirat", "space": "space"}
+
+
+@pytest.mark.parametrize("compress", [False, True])
+@pytest.mark.parametrize("shard_size", [1, 17, 200])
+def test_concat_indexes_matches_serial_build(compress, shard_size):
+    movies = make_movies(120)
+    serial = InvertedIndex()
+    serial.build(movies, compress=compress)
+
+    shards = [
+        MappedIndex(build_shard(movies[i : i + shard_size], positions=True))
+        for i in range(0, len(movies), shard_size)
+    ]
+    merged = concat_indexes(shards, compress=compress)
+
+    assert bytes(merged) == bytes(serial.reader.buffer)
+
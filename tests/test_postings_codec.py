@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from lib.postings_codec import CompressedPostings, encode_postings, pack_bits, packed_size, unpack_bits
+
+
+@pytest.mark.parametrize("width", [0, 1, 3, 8, 13, 31])
+def test_pack_bits_round_trip(width):
+    rng = np.random.default_rng(width)
+    values = rng.integers(0, 2**width, size=101)
+    packed = pack_bits(values, width)
+
+    assert len(packed) == packed_size(len(values), width)
+    np.testing.assert_array_equal(unpack_bits(packed, len(values), width), values)
+
+
+@pytest.mark.parametrize("block_size", [1, 4, 128])
+def test_encode_postings_round_trip(block_size):
+    rng = np.random.default_rng(block_size)
+    docs = []
+    tfs = []
+    offsets = [0]
+    # Lengths cover empty terms, single postings and partial last blocks.
+    for length in [0, 1, 5, 130, 300, 0, 2]:
+        term_docs = np.sort(rng.choice(100_000, size=length, replace=False))
+        term_tfs = rng.integers(1, 40, size=length)
+        if length:
+            term_tfs[rng.integers(length)] = 70_000
+        docs.append(term_docs)
+        tfs.append(term_tfs)
+        offsets.append(offsets[-1] + length)
+    postings_offsets = np.array(offsets, dtype=np.int64)
+    all_docs = np.concatenate(docs).astype(np.int32)
+    all_tfs = np.concatenate(tfs).astype(np.int32)
+
+    postings = CompressedPostings(
+        encode_postings(postings_offsets, all_docs, all_tfs, block_size), postings_offsets, block_size
+    )
+
+    for term_id, (term_docs, term_tfs) in enumerate(zip(docs, tfs)):
+        decoded_docs, decoded_tfs = postings.term_postings(term_id)
+        np.testing.assert_array_equal(decoded_docs, term_docs)
+        np.testing.assert_array_equal(decoded_tfs, term_tfs)
+        blocks = list(postings.blocks(term_id))
+        assert len(blocks) == -(-len(term_docs) // block_size)
+        if blocks:
+            np.testing.assert_array_equal(np.concatenate([block_docs for block_docs, _ in blocks]), term_docs)
+            np.testing.assert_array_equal(np.concatenate([block_tfs for _, block_tfs in blocks]), term_tfs)
+    decoded_docs, decoded_tfs = postings.decode_all()
+    np.testing.assert_array_equal(decoded_docs, all_docs)
+    np.testing.assert_array_equal(decoded_tfs, all_tfs)
@@ -0,0 +1,86 @@
+import pytest
+
+from lib.boolean_query import parse_boolean_query
+from lib.inverted_index import InvertedIndex
+from preprocessing import preprocess_text
+
+MOVIES = [
+    {"id": 1, "title": "Space Pirates", "description": "Pirates of the Caribbean sail into space."},
+    {"id": 2, "title": "Ocean Robot", "description": "A lonely robot explores the ocean."},
+    {"id": 3, "title": "Robot Pirates", "description": "Space robot fights pirates and the Caribbean storm."},
+    {"id": 4, "title": "Dragon Castle", "description": "A dragon guards the castle by the ocean."},
+    {"id": 5, "title": "Pirates Caribbean", "description": "Treasure hunt."},
+]
+
+
+@pytest.fixture(scope="module")
+def index():
+    index = InvertedIndex()
+    index.build(MOVIES)
+    return index
+
+
+def matched_ids(index: InvertedIndex, ordinals) -> list[int]:
+    return sorted(index.reader.doc_ids[ordinals].tolist())
+
+
+def having(*words: str) -> set[int]:
+    """Ids of the movies containing every word, compared as analyzed tokens."""
+    tokens = [token for word in words for token in preprocess_text(word)]
+    return {
+        movie["id"]
+        for movie in MOVIES
+        if set(tokens) <= set(preprocess_text(f"{movie['title']} {movie['description']}"))
+    }
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("pirates", having("pirates")),
+        ("space pirates", having("space", "pirates")),
+        ("space AND pirates", having("space", "pirates")),
+        ("robot OR dragon", having("robot") | having("dragon")),
+        ("pirates NOT caribbean", having("pirates") - having("caribbean")),
+        ("NOT pirates", {1, 2, 3, 4, 5} - having("pirates")),
+        # NOT binds tighter than AND, which binds tighter than OR.
+        ("dragon OR robot NOT ocean", having("dragon") | (having("robot") - having("ocean"))),
+        ("(dragon OR robot) NOT ocean", (having("dragon") | having("robot")) - having("ocean")),
+        ("PIRATE", having("pirates")),
+        ('"pirates caribbean" OR dragon', {4, 5}),
+        ("the pirates", having("pirates")),
+    ],
+)
+def test_match_boolean(index, query, expected):
+    assert matched_ids(index, index.match_boolean(query)) == sorted(expected)
+
+
+@pytest.mark.parametrize("query", ["", "(robot", "robot OR", "robot )", "AND"])
+def test_malformed_boolean_query(query):
+    with pytest.raises(ValueError):
+        parse_boolean_query(query)
+
+
+def test_boolean_search_ranks_only_matches(index):
+    results = index.boolean_search("pirates NOT caribbean", 10)
+
+    assert {result["id"] for result in results} == having("pirates") - having("caribbean")
+    with pytest.raises(ValueError):
+        index.boolean_search("NOT pirates")
+
+
+@pytest.mark.parametrize(
+    "phrase, expected",
+    [
+        ("space pirates", [1]),
+        ("Pirates caribbean", [5]),
+        # Stopwords keep their positions, so any stopword fills the same gap.
+        ("pirates of the caribbean", [1, 3]),
+        ("pirates the caribbean", []),
+        ("robot", sorted(having("robot"))),
+        ("robot space", []),
+        ("of the", []),
+    ],
+)
+def test_match_phrase(index, phrase, expected):
+    assert matched_ids(index, index.match_phrase(phrase)) == expected
@@ -0,0 +1,78 @@
+import copy
+
+from lib.inverted_index import InvertedIndex
+from lib.segments import SegmentedIndex
+
+from .conftest import make_movies
+
+QUERIES = ["space pirates", "dragon castle", "robot ocean storm", "treasure"]
+BOOLEAN_QUERIES = ["pirates AND NOT ocean", "(dragon OR robot) ship", '"space pirates" OR castle']
+
+
+def matched_ids(index: InvertedIndex, ordinals) -> list[int]:
+    return sorted(index.reader.doc_ids[ordinals].tolist())
+
+
+def assert_same_results(index: InvertedIndex, fresh: InvertedIndex):
+    for query in QUERIES:
+        assert index.bm25_search(query, 10) == fresh.bm25_search(query, 10)
+        assert index.bm25f_search(query, 10) == fresh.bm25f_search(query, 10)
+        assert index.bm25_search_many([query], 10) == fresh.bm25_search_many([query], 10)
+        assert matched_ids(index, index.match_phrase(query)) == matched_ids(fresh, fresh.match_phrase(query))
+    for query in BOOLEAN_QUERIES:
+        assert matched_ids(index, index.match_boolean(query)) == matched_ids(fresh, fresh.match_boolean(query))
+
+
+def test_add_delete_and_merge_match_fresh_build(index_cache):
+    movies = make_movies(150)
+    base, added = movies[:100], movies[100:130]
+    updated = copy.deepcopy(base[10:15])
+    for movie in updated:
+        movie["description"] = f"space pirates {movie['description']}"
+    deleted = [base[0]["id"], added[0]["id"], 999_999]
+
+    index = InvertedIndex()
+    index.build(base)
+    index.save()
+    index = InvertedIndex()
+    index.load()
+    index.add_documents(added)
+    index.add_documents(updated)
+    assert index.delete_documents(deleted) == 2
+
+    corpus = {movie["id"]: movie for movie in base + added + updated}
+    for doc_id in deleted:
+        corpus.pop(doc_id, None)
+    fresh = InvertedIndex()
+    fresh.build(list(corpus.values()))
+
+    assert isinstance(index.reader, SegmentedIndex)
+    assert len(index.manifest["segments"]) == 3
+    assert_same_results(index, fresh)
+
+    index.merge()
+
+    assert len(index.manifest["segments"]) == 1
+    assert bytes(index.reader.buffer) == bytes(fresh.reader.buffer)
+    assert_same_results(index, fresh)
+    assert index.docmap[updated[0]["id"]] == updated[0]
+    assert base[0]["id"] not in index.docmap
+    assert len(list((index_cache / "segments").iterdir())) == 1
+
+
+def test_ties_rank_by_doc_id_across_segments(index_cache):
+    def movie(doc_id, description):
+        return {"id": doc_id, "title": "", "description": description}
+
+    index = InvertedIndex()
+    index.build([movie(10, "space pirates"), movie(30, "space pirates"), movie(40, "dragon castle")])
+    index.save()
+    index = InvertedIndex()
+    index.load()
+    index.add_documents([movie(20, "space pirates"), movie(5, "space pirates")])
+
+    before = [result["id"] for result in index.bm25_search("pirates", 10)]
+    index.merge()
+
+    assert before == [5, 10, 20, 30]
+    assert [result["id"] for result in index.bm25_search("pirates", 10)] == before
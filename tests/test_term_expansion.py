@@ -0,0 +1,46 @@
+import random
+
+import pytest
+
+from lib.index_format import TermDictionary, encode_term_dictionary
+from lib.term_expansion import fuzzy_terms, prefix_range
+
+
+def levenshtein(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        current = [i]
+        for j, y in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (x != y)))
+        previous = current
+    return previous[-1]
+
+
+def make_terms(count: int, seed: int = 0) -> list[str]:
+    # A small alphabet makes near neighbours and shared prefixes common.
+    rng = random.Random(seed)
+    return sorted({"".join(rng.choices("abcde", k=rng.randint(1, 7))) for _ in range(count)} | {"café", "cafe"})
+
+
+@pytest.fixture(scope="module")
+def terms():
+    return make_terms(2000)
+
+
+@pytest.fixture(scope="module")
+def dictionary(terms):
+    return TermDictionary(*encode_term_dictionary(terms))
+
+
+@pytest.mark.parametrize("max_edits", [0, 1, 2])
+@pytest.mark.parametrize("query", ["abcde", "a", "bad", "eeeeeee", "zzz", "", "cafe", "cafè", "abcdeabcd"])
+def test_fuzzy_terms_matches_brute_force(terms, dictionary, query, max_edits):
+    expected = [(i, levenshtein(query, term)) for i, term in enumerate(terms) if levenshtein(query, term) <= max_edits]
+
+    assert sorted(fuzzy_terms(dictionary, query, max_edits)) == expected
+
+
+def test_prefix_range(terms, dictionary):
+    for prefix in ["", "a", "abc", "e", "caf", "zz"]:
+        start, end = prefix_range(dictionary, prefix)
+        assert terms[start:end] == [term for term in terms if term.startswith(prefix)]